@@ -40,12 +40,16 @@ setup(
     python_requires=">=3.8",
     install_requires=[
         "openai>=1.0.0",
+        "httpx",
         "soundfile>=0.12.0",
         "requests>=2.25.0",
         "jsonschema",
+        "orjson",
+        "pyyaml",
         "replicate",
         "soundfile",
-        "pillow"
+        "pillow",
+        "numpy"
     ],
     extras_require={
         "dev": [
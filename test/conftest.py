@@ -0,0 +1,11 @@
+"""
+pytest configuration for the AI Manager tests.
+"""
+
+import sys
+from pathlib import Path
+
+# Make the package importable from a source checkout, once per session
+_REPO_ROOT = str(Path(__file__).parent.parent)
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
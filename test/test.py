@@ -2,34 +2,67 @@
 Unit tests for AI Manager using JSON test data
 """
 
+import asyncio
+import copy
+import io
 import unittest
-import json
+import orjson
 import yaml
 from pathlib import Path
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
 import sys
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from types import SimpleNamespace
+from jsonschema.validators import validator_for
 
-sys.path.insert(0, str(Path(__file__).parent.parent))
-
-from ai_manager import AIManager
-from ai_manager import AIManager
-from ai_manager.schema_validator import SchemaValidator
+from wl_ai_manager import AIManager
+from wl_ai_manager import ai_manager as ai_manager_module
+from wl_ai_manager.schema_validator import SchemaValidator
+from wl_ai_manager.autobatch import ChatBatcher
+from wl_ai_manager.cache import DiskCache, FileCache, ResponseCache, copy_file
+from wl_ai_manager.semantic_cache import SemanticCache
+from wl_ai_manager.chat import chat, prompt_cache_key
+from wl_ai_manager.openai import init_openai_client
+from wl_ai_manager.prompts import format_template, get_prompt_required_keys, load_prompts, parse_template
+from wl_ai_manager.text_to_speech import generate_speech
+from wl_ai_manager.image_generation import create_flux_pro_image
+from wl_ai_manager.music_generation import (create_music, create_music_async, create_music_continuation_chain,
+                                            create_music_variations, create_music_variations_async)
+from wl_ai_manager.video_generation import (create_veo_video, create_veo_video_async, create_veo_video_from_image,
+                                            create_veo_videos_batch, init_replicate_client_for_video)
+from wl_ai_manager.downloads import download_to_file, get_session
+from wl_ai_manager.rate_limit import RateLimitedClient, TokenBucket
+from wl_ai_manager.replicate_client import HTTP2_AVAILABLE, get_replicate_client, get_replicate_client_from_config
 from test_config import get_test_config
 
 
+TEST_DIR = Path(__file__).parent
+TEST_DATA_DIR = TEST_DIR / "test_data"
+TEST_DATA_FILE = TEST_DATA_DIR / "test_data.json"
+GENERATOR_SCRIPT = TEST_DIR.parent / "generate_test_files.sh"
+
+# Parsed once per process and shared by every test
+_TEST_DATA = orjson.loads(TEST_DATA_FILE.read_bytes()) if TEST_DATA_FILE.exists() else None
+
+
 class TestDataLoader:
-    """Helper class to load and manage test data from JSON"""
+    """Helper class to access test data loaded from JSON"""
     
-    def __init__(self, data_file="./test_data/test_data.json"):
-        self.data_file = Path(data_file)
-        self._data = None
+    __slots__ = ('data_file', '_data')
+    
+    def __init__(self, data_file=TEST_DATA_FILE):
+        self.data_file = data_file if isinstance(data_file, Path) else Path(data_file)
+        self._data = _TEST_DATA if self.data_file == TEST_DATA_FILE else None
     
     @property
     def data(self):
         if self._data is None:
             if self.data_file.exists():
-                with open(self.data_file, 'r') as f:
-                    self._data = json.load(f)
+                self._data = orjson.loads(self.data_file.read_bytes())
             else:
                 raise FileNotFoundError(f"Test data file not found: {self.data_file}")
         return self._data
@@ -58,13 +91,73 @@ class TestDataLoader:
 test_data_loader = TestDataLoader()
 
 
-class TestSchemaValidator(unittest.TestCase):
+@contextmanager
+def swap_attr(obj, name, value):
+    """Temporarily replace an attribute without the mock.patch machinery."""
+    old = getattr(obj, name)
+    setattr(obj, name, value)
+    try:
+        yield value
+    finally:
+        setattr(obj, name, old)
+
+
+def copy_ai_manager(template):
+    """
+    Copy a fully loaded AIManager for one test.
+
+    Prompts and schemas are shared read-only; per-test state (client,
+    caches, rate limiter, event loop, output dirs) is replaced so tests
+    cannot affect each other. The client is an inert stub, chat() is
+    swapped out by the tests. Tests that need a disk or semantic cache
+    install their own.
+    """
+    ai_manager = copy.copy(template)
+    ai_manager.client = SimpleNamespace()
+    ai_manager._async_clients = weakref.WeakKeyDictionary()
+    ai_manager._batchers = weakref.WeakKeyDictionary()
+    ai_manager._loop = None
+    ai_manager._loop_lock = threading.Lock()
+    ai_manager._response_cache = ResponseCache()
+    ai_manager._disk_cache = None
+    ai_manager._semantic_cache = None
+    ai_manager._validation_prompts = {}
+    ai_manager._structured_rejected = {}
+    ai_manager._output_dirs = {}
+    limiter = template._openai_limiter
+    ai_manager._openai_limiter = TokenBucket(limiter.max_rate, limiter.time_period)
+    return ai_manager
+
+
+class _SharedConfig:
+    """Load the test configuration once per test class."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.config = get_test_config()
+        cls.test_data = test_data_loader
+
+
+class _SharedAIManager(_SharedConfig):
+    """Build one AIManager per test class, tests work on cheap copies."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Load prompts and schemas once
+        with patch('wl_ai_manager.ai_manager.init_openai_client', return_value=SimpleNamespace()):
+            cls._ai_manager_template = AIManager(cls.config)
+
+    def new_ai_manager(self):
+        return copy_ai_manager(self._ai_manager_template)
+
+
+class TestSchemaValidator(_SharedConfig, unittest.TestCase):
     """Test cases for SchemaValidator"""
     
     def setUp(self):
-        self.config = get_test_config()
         self.validator = SchemaValidator(self.config)
-        self.test_data = test_data_loader
         
     def test_sanitize_response(self):
         """Test response sanitization"""
@@ -85,7 +178,46 @@ Here's the result:
         expected = '{"data": "clean"}'
         result = self.validator.sanitize_response(response)
         self.assertEqual(result, expected)
-    
+
+    def test_sanitize_response_keeps_yaml_keys(self):
+        """Test sanitization does not strip YAML mapping keys"""
+        response = """```yaml
+person:
+  name: Bob
+  tags:
+    - admin
+```"""
+        expected = 'person:\n  name: Bob\n  tags:\n    - admin'
+        self.assertEqual(self.validator.sanitize_response(response), expected)
+
+    def test_sanitize_response_keeps_leading_key_with_space(self):
+        """Test a top-level YAML key containing a space is not taken for a lead-in"""
+        for response in ('user info:\n  name: bob\n  age: 3',
+                         'Sure, the data:\n```yaml\nuser info:\n  name: bob\n  age: 3\n```'):
+            with self.subTest(response=response):
+                result = self.validator.sanitize_response(response)
+                self.assertEqual(yaml.safe_load(result), {'user info': {'name': 'bob', 'age': 3}})
+
+    def test_sanitize_response_keeps_data_that_looks_like_lead_in(self):
+        """Test values and keys starting like a lead-in sentence are kept"""
+        cases = (
+            ('{\n"note":\n"Here we go: fast"}', {'note': 'Here we go: fast'}),
+            ('Here we go:\n  [1, 2]', {'Here we go': [1, 2]}),
+            ('Here we go:\n  - 1\n  - 2', {'Here we go': [1, 2]}),
+            ('note: >\n  Here we go:\n  fast', {'note': 'Here we go: fast'}),
+        )
+        for response, expected in cases:
+            with self.subTest(response=response):
+                result = self.validator.sanitize_response(response)
+                self.assertEqual(yaml.safe_load(result), expected)
+
+    def test_sanitize_response_splits_on_line_feeds_only(self):
+        """Test sanitization keeps CRLF endings and separators inside strings intact"""
+        response = 'Here is the JSON:\r\n{"text": "a\u2028b"}\r\n\r\n```'
+        result = self.validator.sanitize_response(response)
+        self.assertEqual(result, '{"text": "a\u2028b"}')
+        self.assertEqual(orjson.loads(result), {'text': 'a\u2028b'})
+
     def test_validate_structured_response_json(self):
         """Test JSON validation"""
         response = '{"name": "Alice", "age": 30}'
@@ -108,7 +240,26 @@ active: true"""
         self.assertEqual(result['data']['name'], 'Bob')
         self.assertEqual(result['data']['age'], 25)
         self.assertTrue(result['data']['active'])
-    
+
+    def test_yaml_parsing_uses_c_loader(self):
+        """Test YAML responses are parsed with libyaml when it is available"""
+        expected_loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+        with patch('wl_ai_manager.schema_validator.yaml.load', wraps=yaml.load) as mock_load:
+            result = self.validator.validate_structured_response("name: Bob")
+
+        self.assertEqual(result['data'], {'name': 'Bob'})
+        self.assertIs(mock_load.call_args.kwargs['Loader'], expected_loader)
+
+    def test_yaml_response_skips_json_parse(self):
+        """Test responses that cannot start a JSON document go straight to YAML"""
+        with patch('wl_ai_manager.schema_validator.orjson.loads') as mock_loads:
+            result = self.validator.validate_structured_response("name: Bob\nage: 25")
+
+        mock_loads.assert_not_called()
+        self.assertEqual(result['format'], 'yaml')
+        self.assertEqual(result['data'], {'name': 'Bob', 'age': 25})
+
     def test_validate_structured_response_invalid(self):
         """Test invalid response validation"""
         response = "This is not JSON or YAML {invalid"
@@ -122,37 +273,445 @@ active: true"""
     def test_has_schema_for_prompts_from_data(self):
         """Test schema availability checking using test data"""
         # Get prompts that should have schemas
-        structured_prompts = self.test_data.get_structured_prompts()
-        system_user_prompts = self.test_data.get_system_user_prompts()
-        
-        for prompt_name in structured_prompts:
-            self.assertTrue(self.validator.has_schema_for_prompt(prompt_name),
-                          f"Should have schema for {prompt_name}")
+        expected = set(self.test_data.get_structured_prompts())
+        expected.update(name for name, info in self.test_data.get_system_user_prompts().items()
+                        if 'schema_yaml' in info)
         
-        # Check system/user prompts with schemas
-        for prompt_name, info in system_user_prompts.items():
-            if 'schema_yaml' in info:
-                self.assertTrue(self.validator.has_schema_for_prompt(prompt_name),
-                              f"Should have schema for {prompt_name}")
+        missing = {name for name in expected if not self.validator.has_schema_for_prompt(name)}
+        self.assertFalse(missing, f"Should have schema for {missing}")
         
         # Should not have schema for simple prompts
-        simple_prompts = self.test_data.get_simple_prompts()
-        for prompt_name in simple_prompts:
-            self.assertFalse(self.validator.has_schema_for_prompt(prompt_name),
-                           f"Should not have schema for {prompt_name}")
+        unexpected = {name for name in self.test_data.get_simple_prompts()
+                      if self.validator.has_schema_for_prompt(name)}
+        self.assertFalse(unexpected, f"Should not have schema for {unexpected}")
+
+    def test_add_schema_validates_with_compiled_validator(self):
+        """Test programmatic schemas are compiled once and reused"""
+        schema = {
+            'type': 'object',
+            'properties': {'age': {'type': 'integer'}},
+            'required': ['age']
+        }
+        self.validator.add_schema('person', schema)
+
+        with patch('wl_ai_manager.schema_validator.validator_for') as mock_validator_for:
+            valid = self.validator.validate_data({'age': 30}, 'person')
+            invalid = self.validator.validate_data({'age': 'old'}, 'person')
+            mock_validator_for.assert_not_called()
+
+        self.assertTrue(valid['valid'])
+        self.assertFalse(invalid['valid'])
+        self.assertEqual(invalid['errors'][0]['path'], ['age'])
+
+    def test_create_schema_prompt_matches_format(self):
+        """Test pre-split and pre-parsed templates give the same text as str.format"""
+        from wl_ai_manager.schema_validator import _DEFAULT_SCHEMA_TEMPLATE
+
+        templates = (
+            (None, _DEFAULT_SCHEMA_TEMPLATE),
+            ("{schema_example}\n---\n{base_prompt}", None),
+            ("{base_prompt!r}: {schema_example}", None),
+        )
+        for template, reference in templates:
+            with self.subTest(template=template):
+                expected = (reference or template).format(base_prompt="List cities",
+                                                          schema_example='{"cities": []}')
+                self.assertEqual(
+                    self.validator.create_schema_prompt("List cities", '{"cities": []}', template),
+                    expected)
+
+    def test_schema_cache_reused_until_folder_changes(self):
+        """Test schemas are read from one cache file until a schema file changes"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            schema_dir = Path(temp_dir) / "schemas"
+            schema_dir.mkdir()
+            (schema_dir / "person.schema.txt").write_text('{"name": "Bob"}\n')
+            (schema_dir / "city.schema.txt").write_text('{"city": "Paris"}\n')
+            config = SimpleNamespace(schema_folder=str(schema_dir), prompt_cache=True,
+                                     cache_dir=str(Path(temp_dir) / "cache"))
+
+            SchemaValidator(config)
+            with patch('wl_ai_manager.schema_validator.open', wraps=open, create=True) as mock_open:
+                cached = SchemaValidator(config)
+            opened = [str(call.args[0]) for call in mock_open.call_args_list]
+            self.assertFalse([path for path in opened if path.endswith('.schema.txt')])
+            self.assertEqual(cached.schemas, {'person': '{"name": "Bob"}', 'city': '{"city": "Paris"}'})
+
+            (schema_dir / "city.schema.txt").write_text('{"city": "Rome"}\n')
+            self.assertEqual(SchemaValidator(config).schemas['city'], '{"city": "Rome"}')
+
+    def test_schema_files_loaded_concurrently(self):
+        """Test larger schema folders are read in a thread pool and keep every schema"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for i in range(6):
+                Path(temp_dir, f"s{i}.schema.txt").write_text(f'{{"n": {i}}}\n' if i else "  \n")
+            Path(temp_dir, "notes.txt").write_text("ignored")
+
+            with patch('wl_ai_manager.schema_validator.ThreadPoolExecutor',
+                       wraps=ThreadPoolExecutor) as mock_executor:
+                validator = SchemaValidator(SimpleNamespace(schema_folder=temp_dir))
+
+        mock_executor.assert_called_once()
+        self.assertEqual(validator.schemas, {f"s{i}": f'{{"n": {i}}}' for i in range(1, 6)})
+
+    def test_adhoc_schema_compiled_once(self):
+        """Test validate_data_with_schema reuses the validator for the same schema object"""
+        schema = {'type': 'object', 'required': ['age']}
+
+        with patch('wl_ai_manager.schema_validator.validator_for', wraps=validator_for) as mock_validator_for:
+            first = self.validator.validate_data_with_schema({'age': 30}, schema)
+            second = self.validator.validate_data_with_schema({}, schema)
+            self.assertEqual(mock_validator_for.call_count, 1)
+
+        self.assertTrue(first['valid'])
+        self.assertFalse(second['valid'])
+
+    def test_classify_errors(self):
+        """Test structural errors are not retriable and content errors carry hints"""
+        validator = SchemaValidator()
+        cases = (
+            ([{'message': "'x' is a required property", 'path': [], 'validator': 'required'}], True),
+            ([{'message': "5 is not of type 'string'", 'path': ['a', 0], 'validator': 'type'}], True),
+            (["JSON error: bad", "YAML error: bad"], True),
+            ([{'message': "Additional properties", 'path': [], 'validator': 'additionalProperties'}], False),
+            ([{'message': "[] is not of type 'object'", 'path': [], 'validator': 'type'}], False),
+            (["Schema validation failed: broken"], False),
+        )
+        for errors, retriable in cases:
+            with self.subTest(errors=errors):
+                result = validator.classify_errors(errors)
+                self.assertEqual(result['retriable'], retriable)
+                self.assertEqual(bool(result['hints']), retriable)
+
+        hints = validator.classify_errors(cases[1][0])['hints']
+        self.assertEqual(hints, ["a/0: 5 is not of type 'string'"])
+
+    def test_structured_response_checked_against_validator(self):
+        """Test parsed responses are checked with a compiled validator"""
+        self.validator.add_schema('person', {
+            'type': 'object',
+            'properties': {'age': {'type': 'integer'}},
+            'required': ['age']
+        })
+        validator = self.validator.get_validator('person')
+
+        valid = self.validator.validate_structured_response('{"age": 30}', validator)
+        invalid = self.validator.validate_structured_response('age: old', validator)
+
+        self.assertEqual(valid['data'], {'age': 30})
+        self.assertFalse(invalid['valid'])
+        self.assertEqual(invalid['format'], 'yaml')
+        self.assertEqual(invalid['errors'][0]['path'], ['age'])
+
+
+class TestSemanticCache(unittest.TestCase):
+    """Test cases for SemanticCache"""
+
+    def _embedding_client(self, vectors):
+        client = Mock()
+        client.embeddings.create.side_effect = [
+            Mock(data=[Mock(embedding=vector)]) for vector in vectors
+        ]
+        return client
+
+    def test_similar_request_hits(self):
+        """Test near-duplicate embeddings return the cached response"""
+        cache = SemanticCache(self._embedding_client([[1.0, 0.0], [0.99, 0.05]]), threshold=0.95)
+
+        stored = cache.embed("I want an email inbox")
+        cache.add("bucket", stored, "cached answer")
+        query = cache.embed("I need an email client")
+
+        self.assertEqual(cache.lookup("bucket", query), "cached answer")
+        self.assertIsNone(cache.lookup("other_bucket", query))
+
+    def test_dissimilar_request_misses(self):
+        """Test unrelated embeddings do not hit the cache"""
+        cache = SemanticCache(self._embedding_client([[1.0, 0.0], [0.0, 1.0]]), threshold=0.95)
+
+        cache.add("bucket", cache.embed("email inbox"), "cached answer")
+
+        self.assertIsNone(cache.lookup("bucket", cache.embed("weather in Boston")))
+
+
+    def test_structured_responses_copied_and_persisted(self):
+        """Test callers get private copies and the cache round-trips through its file"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "semantic.json"
+            cache = SemanticCache(self._embedding_client([[1.0, 0.0], [1.0, 0.0], [1.0, 0.0]]), path=path)
+            embedding = cache.embed("user record")
+            stored = {'name': 'Bob', 'tags': ['admin']}
+            cache.add("bucket", embedding, stored)
+            stored['tags'].append("mutated after add")
+
+            first = cache.lookup("bucket", cache.embed("user record"))
+            first['tags'].append("mutated by caller")
+            self.assertEqual(cache.lookup("bucket", embedding), {'name': 'Bob', 'tags': ['admin']})
+
+            cache.save()
+            reloaded = SemanticCache(Mock(), path=path)
+            self.assertEqual(reloaded.lookup("bucket", embedding), {'name': 'Bob', 'tags': ['admin']})
+
+    def test_numpy_loaded_only_when_enabled(self):
+        """Test importing AIManager does not pull in numpy for the opt-in semantic cache"""
+        import subprocess
+
+        code = "import sys, wl_ai_manager.ai_manager; print('numpy' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent.parent)
+        self.assertEqual(result.stdout.strip(), "False", result.stderr)
+
+class TestChatFunction(unittest.TestCase):
+    """Test the module-level chat function"""
+
+    def setUp(self):
+        self.client = Mock()
+        self.client.chat.completions.create.return_value = Mock(
+            choices=[Mock(message=Mock(content=" Hello Alice "))]
+        )
+
+    def test_system_prompt_first_with_cache_key(self):
+        """Test the static system prefix is sent first with a prompt cache key"""
+        prompts = {'greet': {'system': 'You are friendly.', 'user': 'Say hello to {name}'}}
+
+        result = chat('greet', {'name': 'Alice'}, model='gpt-test', client=self.client, prompts=prompts)
+
+        self.assertEqual(result, "Hello Alice")
+        kwargs = self.client.chat.completions.create.call_args.kwargs
+        self.assertEqual(kwargs['messages'][0], {'role': 'system', 'content': 'You are friendly.'})
+        self.assertEqual(kwargs['messages'][1], {'role': 'user', 'content': 'Say hello to Alice'})
+        self.assertEqual(kwargs['extra_body'], {'prompt_cache_key': prompt_cache_key('greet')})
+
+    def test_missing_data_keys(self):
+        """Test missing placeholder data returns None without calling the API"""
+        prompts = {'greet': 'Say hello to {name}'}
+
+        self.assertIsNone(chat('greet', {}, model='gpt-test', client=self.client, prompts=prompts))
+        self.client.chat.completions.create.assert_not_called()
+
+    def test_n_candidates_returns_all_choices(self):
+        """Test n_candidates requests n completions and returns each text"""
+        client = MagicMock()
+        client.chat.completions.create.return_value = SimpleNamespace(choices=[
+            SimpleNamespace(message=SimpleNamespace(content=" one ")),
+            SimpleNamespace(message=SimpleNamespace(content="two"))
+        ])
+
+        result = chat("greet", {}, "gpt-4", client, {"greet": "Hello"}, n_candidates=2)
+
+        self.assertEqual(result, ["one", "two"])
+        self.assertEqual(client.chat.completions.create.call_args.kwargs['n'], 2)
+
+    def test_stream_yields_chunks(self):
+        """Test stream=True returns the completion text as it arrives"""
+        self.client.chat.completions.create.return_value = iter([
+            Mock(choices=[Mock(delta=Mock(content="Hello "))]),
+            Mock(choices=[Mock(delta=Mock(content=None))]),
+            Mock(choices=[Mock(delta=Mock(content="Alice"))]),
+        ])
+        prompts = {'greet': 'Say hello to {name}'}
+
+        result = chat('greet', {'name': 'Alice'}, model='gpt-test', client=self.client,
+                      prompts=prompts, stream=True)
+
+        self.assertEqual("".join(result), "Hello Alice")
+        self.assertTrue(self.client.chat.completions.create.call_args.kwargs['stream'])
+
+    def test_precomputed_required_keys(self):
+        """Test required keys are computed at load and used by chat"""
+        prompts = {
+            'greet': {'system': 'Use {braces} freely.', 'user': 'Say hello to {name} from {place}'},
+            'plain': 'No placeholders here'
+        }
+
+        required_keys = get_prompt_required_keys(prompts)
+
+        self.assertEqual(required_keys['greet'], frozenset({'name', 'place'}))
+        self.assertEqual(required_keys['plain'], frozenset())
+        result = chat('greet', {'name': 'Alice', 'place': 'Paris'}, model='gpt-test',
+                      client=self.client, prompts=prompts, required_keys=required_keys['greet'])
+        self.assertEqual(result, "Hello Alice")
+
+    def test_parsed_template_matches_str_format(self):
+        """Test pre-parsed templates format like str.format"""
+        text = "Rate {name} at {score:.1f}/10 {{not a field}}"
+        data = {'name': 'Alice', 'score': 8.25}
+
+        parsed = parse_template(text)
+
+        self.assertEqual(format_template(parsed, data), text.format(**data))
+        self.assertIsNone(parse_template("Uses {item[0]} and {obj.attr}"))
+
+
+class TestChatBatcher(unittest.TestCase):
+    """Test micro-batching of concurrent async chat requests"""
+
+    def setUp(self):
+        self.prompts = {'greet': {'system': 'You are friendly.', 'user': 'Say hello to {name}'}}
+        self.client = Mock()
+        self.client.chat.completions.create = AsyncMock()
+
+    def _respond(self, *contents):
+        self.client.chat.completions.create.side_effect = [
+            Mock(choices=[Mock(message=Mock(content=content))]) for content in contents
+        ]
+
+    def _submit_all(self, names):
+        batcher = ChatBatcher(self.client, self.prompts, max_batch=8, max_wait_ms=1)
+
+        async def submit():
+            return await asyncio.gather(*(
+                batcher.submit('greet', {'name': name}, 'gpt-test') for name in names
+            ))
+
+        return asyncio.run(submit())
+
+    def test_concurrent_requests_share_one_call(self):
+        """Test concurrent requests are answered from one batched call"""
+        self._respond('["Hello Alice", "Hello Bob", "Hello Carol"]')
+
+        results = self._submit_all(['Alice', 'Bob', 'Carol'])
+
+        self.assertEqual(results, ["Hello Alice", "Hello Bob", "Hello Carol"])
+        self.client.chat.completions.create.assert_awaited_once()
+        messages = self.client.chat.completions.create.call_args.kwargs['messages']
+        self.assertEqual(messages[0], {'role': 'system', 'content': 'You are friendly.'})
+        self.assertIn('Request 3:\nSay hello to Carol', messages[1]['content'])
+
+    def test_unsplittable_response_falls_back_to_single_calls(self):
+        """Test a batched answer of the wrong shape is retried per request"""
+        self._respond('Hello everyone', ' Hello Alice ', ' Hello Bob ')
+
+        results = self._submit_all(['Alice', 'Bob'])
+
+        self.assertEqual(results, ["Hello Alice", "Hello Bob"])
+        self.assertEqual(self.client.chat.completions.create.await_count, 3)
+
+
+class TestDiskCache(unittest.TestCase):
+    """Test the persistent SQLite response cache"""
 
+    def test_values_survive_reopen(self):
+        """Test cached responses are read back by a new cache instance"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "cache" / "responses.sqlite3"
+            cache = DiskCache(path)
+            cache.put("text", "Hello")
+            cache.put("data", {"name": "Alice", "tags": ["a", "b"]})
+            cache.close()
 
-class TestAIManagerInit(unittest.TestCase):
+            reopened = DiskCache(path)
+            self.assertEqual(reopened.get("text"), "Hello")
+            self.assertEqual(reopened.get("data"), {"name": "Alice", "tags": ["a", "b"]})
+            self.assertIsNone(reopened.get("missing"))
+
+            reopened.clear()
+            self.assertEqual(len(reopened), 0)
+            reopened.close()
+
+
+class TestFileCache(unittest.TestCase):
+    """Test the content-addressed media file cache"""
+
+    def test_least_recently_used_files_evicted(self):
+        """Test files beyond max_bytes are evicted oldest-use first"""
+        import os
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = Path(temp_dir) / "source.wav"
+            source.write_bytes(b"x" * 100)
+            cache = FileCache(Path(temp_dir) / "cache", max_bytes=250)
+
+            for age, key in enumerate(("old", "used", "new")):
+                path = cache.put(key, source, ".wav")
+                os.utime(path, (1000 + age, 1000 + age))
+                if key == "used":
+                    # A hit makes this the most recently used entry
+                    cache.get("used", ".wav")
+
+            cache._evict()
+            self.assertIsNone(cache.get("old", ".wav"))
+            self.assertIsNotNone(cache.get("used", ".wav"))
+            self.assertEqual(cache.get("new", ".wav").read_bytes(), b"x" * 100)
+
+
+    def test_concurrent_puts_of_same_key(self):
+        """Test threads caching the same key each write their own temp file"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = Path(temp_dir) / "source.mp4"
+            source.write_bytes(b"v" * 100000)
+            cache = FileCache(Path(temp_dir) / "cache")
+
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                paths = list(executor.map(lambda _: cache.put("same", source, ".mp4"), range(16)))
+
+            self.assertTrue(all(paths))
+            self.assertEqual(cache.get("same", ".mp4").read_bytes(), source.read_bytes())
+            self.assertEqual([path.name for path in (Path(temp_dir) / "cache").iterdir()], ["same.mp4"])
+
+    def test_copy_file_in_kernel_and_fallback(self):
+        """Test copy_file copies the bytes, falling back to copyfile across filesystems"""
+        import errno
+        import os
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = Path(temp_dir) / "source.mp4"
+            source.write_bytes(b"v" * 300000)
+
+            copy_file(source, Path(temp_dir) / "copy.mp4")
+            self.assertEqual((Path(temp_dir) / "copy.mp4").read_bytes(), source.read_bytes())
+
+            with patch.object(os, 'copy_file_range', create=True,
+                              side_effect=OSError(errno.EXDEV, "Invalid cross-device link")):
+                copy_file(source, Path(temp_dir) / "fallback.mp4")
+            self.assertEqual((Path(temp_dir) / "fallback.mp4").read_bytes(), source.read_bytes())
+
+            # A filesystem that reports 0 before EOF must not leave a truncated copy
+            with patch.object(os, 'copy_file_range', create=True, return_value=0):
+                copy_file(source, Path(temp_dir) / "short.mp4")
+            self.assertEqual((Path(temp_dir) / "short.mp4").read_bytes(), source.read_bytes())
+
+class TestPromptCache(unittest.TestCase):
+    """Test the on-disk prompt cache"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.prompt_dir = Path(self.temp_dir.name) / "prompts"
+        self.prompt_dir.mkdir()
+        (self.prompt_dir / "greet.txt").write_text("Say hello to {name}")
+        self.config = SimpleNamespace(
+            prompt_folder=str(self.prompt_dir),
+            prompt_cache=True,
+            cache_dir=str(Path(self.temp_dir.name) / "cache")
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_cached_prompts_reused_until_files_change(self):
+        """Test the second load is served from cache and edits invalidate it"""
+        prompts, required_keys, _ = load_prompts(self.config)
+        self.assertEqual(prompts, {'greet': 'Say hello to {name}'})
+        self.assertEqual(required_keys, {'greet': frozenset({'name'})})
+
+        with patch('wl_ai_manager.prompts.get_prompts') as mock_get_prompts:
+            cached_prompts, cached_keys, _ = load_prompts(self.config)
+            mock_get_prompts.assert_not_called()
+        self.assertEqual(cached_prompts, prompts)
+        self.assertEqual(cached_keys, required_keys)
+
+        (self.prompt_dir / "farewell.txt").write_text("Say goodbye to {name}")
+        prompts, _, _ = load_prompts(self.config)
+        self.assertIn('farewell', prompts)
+
+
+class TestAIManagerInit(_SharedConfig, unittest.TestCase):
     """Test AIManager initialization"""
     
-    def setUp(self):
-        self.config = get_test_config()
-        self.test_data = test_data_loader
-        
-    @patch('ai_manager.ai_manager.init_openai_client')
+    @patch('wl_ai_manager.ai_manager.init_openai_client')
     def test_ai_manager_init(self, mock_init_client):
         """Test AIManager initialization"""
-        mock_client = Mock()
+        mock_client = SimpleNamespace()
         mock_init_client.return_value = mock_client
         
         ai_manager = AIManager(self.config)
@@ -163,30 +722,68 @@ class TestAIManagerInit(unittest.TestCase):
         self.assertIsInstance(ai_manager.prompts, dict)
         mock_init_client.assert_called_once_with(self.config)
     
-    @patch('ai_manager.ai_manager.init_openai_client')
+    @patch('wl_ai_manager.ai_manager.init_openai_client')
+    def test_get_or_create_reuses_instance(self, mock_init_client):
+        """Test get_or_create returns one shared instance per config"""
+        mock_init_client.return_value = SimpleNamespace()
+        self.addCleanup(AIManager._instances.pop, id(self.config), None)
+
+        first = AIManager.get_or_create(self.config)
+        second = AIManager.get_or_create(self.config)
+
+        self.assertIs(first, second)
+        mock_init_client.assert_called_once_with(self.config)
+
+    @patch('wl_ai_manager.ai_manager.init_openai_client')
+    def test_output_dirs_created_once(self, mock_init_client):
+        """Test default output folders are created on first use and memoized"""
+        mock_init_client.return_value = SimpleNamespace()
+        ai_manager = AIManager(self.config)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            ai_manager.config = copy.copy(self.config)
+            ai_manager.config.output_dir = temp_dir
+            images = ai_manager._output_dir('images')
+
+            self.assertEqual(images, Path(temp_dir) / 'images')
+            self.assertTrue(images.is_dir())
+            with patch.object(Path, 'mkdir') as mock_mkdir:
+                self.assertIs(ai_manager._output_dir('images'), images)
+            mock_mkdir.assert_not_called()
+
+    def test_openai_client_keeps_sdk_defaults(self):
+        """Test the pooled OpenAI client keeps the SDK timeout and redirects unless configured"""
+        import openai
+
+        for settings, expected in (({}, openai.DEFAULT_TIMEOUT.read), ({'timeout': 30}, 30)):
+            with self.subTest(settings=settings):
+                config = SimpleNamespace(openai=SimpleNamespace(api_key="sk-test", organization_id=None, **settings))
+                client = init_openai_client(config)
+                self.assertEqual(client._client.timeout.read, expected)
+                self.assertTrue(client._client.follow_redirects)
+
+    @patch('wl_ai_manager.ai_manager.init_openai_client')
     def test_prompts_loaded_from_data(self, mock_init_client):
         """Test that prompts are loaded correctly based on test data"""
-        mock_init_client.return_value = Mock()
+        mock_init_client.return_value = SimpleNamespace()
         
         ai_manager = AIManager(self.config)
         
+        loaded = ai_manager.prompts.keys()
+        
         # Check simple prompts
-        simple_prompts = self.test_data.get_simple_prompts()
-        for prompt_name in simple_prompts:
-            self.assertIn(prompt_name, ai_manager.prompts,
-                         f"Simple prompt {prompt_name} should be loaded")
+        missing = set(self.test_data.get_simple_prompts()) - loaded
+        self.assertFalse(missing, f"Simple prompts should be loaded: {missing}")
         
         # Check structured prompts
-        structured_prompts = self.test_data.get_structured_prompts()
-        for prompt_name in structured_prompts:
-            self.assertIn(prompt_name, ai_manager.prompts,
-                         f"Structured prompt {prompt_name} should be loaded")
+        missing = set(self.test_data.get_structured_prompts()) - loaded
+        self.assertFalse(missing, f"Structured prompts should be loaded: {missing}")
         
         # Check system/user prompts
         system_user_prompts = self.test_data.get_system_user_prompts()
+        missing = set(system_user_prompts) - loaded
+        self.assertFalse(missing, f"System/user prompts should be loaded: {missing}")
         for prompt_name in system_user_prompts:
-            self.assertIn(prompt_name, ai_manager.prompts,
-                         f"System/user prompt {prompt_name} should be loaded")
             # Check structure
             prompt = ai_manager.prompts[prompt_name]
             self.assertIsInstance(prompt, dict)
@@ -194,162 +791,930 @@ class TestAIManagerInit(unittest.TestCase):
             self.assertIn('user', prompt)
 
 
-class TestAIManagerChat(unittest.TestCase):
+class TestAIManagerChat(_SharedAIManager, unittest.TestCase):
     """Test AIManager chat functionality with test data"""
     
     def setUp(self):
-        self.config = get_test_config()
-        self.test_data = test_data_loader
+        # Swap the chat function directly, cheaper than mock.patch per test
+        self.mock_chat_func = Mock()
+        stack = ExitStack()
+        stack.enter_context(swap_attr(ai_manager_module, 'chat', self.mock_chat_func))
+        self.addCleanup(stack.close)
         
-    @patch('ai_manager.ai_manager.chat')
-    @patch('ai_manager.ai_manager.init_openai_client')
-    def test_chat_simple_prompts(self, mock_init_client, mock_chat_func):
+    def test_chat_simple_prompts(self):
         """Test chat with simple prompts from test data"""
-        mock_client = Mock()
-        mock_init_client.return_value = mock_client
-        
-        ai_manager = AIManager(self.config)
+        ai_manager = self.new_ai_manager()
         
         simple_prompts = self.test_data.get_simple_prompts()
         
         for prompt_name, info in simple_prompts.items():
-            mock_chat_func.return_value = f"Response for {prompt_name}"
-            
-            result = ai_manager.chat(prompt_name, info['test_data'])
-            
-            self.assertEqual(result, f"Response for {prompt_name}")
-            # Verify the chat function was called with correct parameters
-            args, kwargs = mock_chat_func.call_args
-            self.assertEqual(kwargs['prompt_name'], prompt_name)
-            self.assertEqual(kwargs['data'], info['test_data'])
-    
-    @patch('ai_manager.ai_manager.chat')
-    @patch('ai_manager.ai_manager.init_openai_client')
-    def test_chat_structured_validation_success(self, mock_init_client, mock_chat_func):
+            with self.subTest(prompt_name=prompt_name):
+                self.mock_chat_func.return_value = f"Response for {prompt_name}"
+                
+                result = ai_manager.chat(prompt_name, info['test_data'])
+                
+                self.assertEqual(result, f"Response for {prompt_name}")
+                # Verify the chat function was called with correct parameters
+                args, kwargs = self.mock_chat_func.call_args
+                self.assertEqual(kwargs['prompt_name'], prompt_name)
+                self.assertEqual(kwargs['data'], info['test_data'])
+    
+    def test_chat_structured_validation_success(self):
         """Test validated chat with structured prompts"""
-        mock_client = Mock()
-        mock_init_client.return_value = mock_client
-        
-        ai_manager = AIManager(self.config)
+        ai_manager = self.new_ai_manager()
         
         structured_prompts = self.test_data.get_structured_prompts()
         
         for prompt_name, info in structured_prompts.items():
-            # Use the mock response from test data
-            mock_chat_func.return_value = info['mock_response']
-            
-            result = ai_manager.chat(prompt_name, info['test_data'], validate=True)
-            
-            # Should return parsed data
-            self.assertIsInstance(result, dict)
-            
-            # Check expected fields are present
-            for field in info['expected_fields']:
-                self.assertIn(field, result, f"Missing field {field} in {prompt_name} response")
-    
-    @patch('ai_manager.ai_manager.chat')
-    @patch('ai_manager.ai_manager.init_openai_client')
-    def test_chat_yaml_validation(self, mock_init_client, mock_chat_func):
-        """Test YAML validation with system/user prompts"""
-        mock_client = Mock()
-        mock_init_client.return_value = mock_client
-        
-        ai_manager = AIManager(self.config)
-        
-        system_user_prompts = self.test_data.get_system_user_prompts()
-        
-        for prompt_name, info in system_user_prompts.items():
-            if 'mock_response' in info:  # Only test prompts with mock responses
-                mock_chat_func.return_value = info['mock_response']
+            with self.subTest(prompt_name=prompt_name):
+                # Use the mock response from test data
+                self.mock_chat_func.return_value = info['mock_response']
                 
                 result = ai_manager.chat(prompt_name, info['test_data'], validate=True)
                 
-                # Should return parsed YAML data
+                # Should return parsed data
                 self.assertIsInstance(result, dict)
                 
-                # Check expected fields
-                if 'expected_fields' in info:
-                    for field in info['expected_fields']:
-                        self.assertIn(field, result, f"Missing field {field} in {prompt_name} response")
+                # Check expected fields are present
+                missing = set(info['expected_fields']) - result.keys()
+                self.assertFalse(missing, f"{prompt_name} response missing fields: {missing}")
     
-    def test_validation_scenarios(self):
-        """Test specific validation scenarios from test data"""
-        scenarios = self.test_data.get_test_scenarios()
-        
-        with patch('ai_manager.ai_manager.init_openai_client') as mock_init_client:
-            mock_init_client.return_value = Mock()
-            ai_manager = AIManager(self.config)
-            
-            # Test missing schema scenario
-            missing_schema = scenarios['missing_schema']
-            result = ai_manager.chat(
-                missing_schema['prompt'], 
-                missing_schema['data'], 
-                validate=missing_schema['validate']
-            )
-            
-            self.assertIsInstance(result, dict)
-            self.assertIn('error', result)
-            self.assertIn('No schema available', result['error'])
-    
-    @patch('ai_manager.ai_manager.chat')
-    @patch('ai_manager.ai_manager.init_openai_client')
-    def test_validation_failure_retries(self, mock_init_client, mock_chat_func):
-        """Test validation failure with retries"""
-        mock_client = Mock()
-        mock_init_client.return_value = mock_client
-        
-        scenarios = self.test_data.get_test_scenarios()
-        failure_scenario = scenarios['validation_failure']
+    def test_chat_yaml_validation(self):
+        """Test YAML validation with system/user prompts"""
+        ai_manager = self.new_ai_manager()
         
-        # Always return invalid response
-        mock_chat_func.return_value = failure_scenario['mock_invalid_response']
+        system_user_prompts = self.test_data.get_system_user_prompts()
         
-        ai_manager = AIManager(self.config)
-        result = ai_manager.chat(
-            failure_scenario['prompt'], 
-            failure_scenario['data'], 
-            validate=True
+        for prompt_name, info in system_user_prompts.items():
+            with self.subTest(prompt_name=prompt_name):
+                if 'mock_response' in info:  # Only test prompts with mock responses
+                    self.mock_chat_func.return_value = info['mock_response']
+                    
+                    result = ai_manager.chat(prompt_name, info['test_data'], validate=True)
+                    
+                    # Should return parsed YAML data
+                    self.assertIsInstance(result, dict)
+                    
+                    # Check expected fields
+                    if 'expected_fields' in info:
+                        missing = set(info['expected_fields']) - result.keys()
+                        self.assertFalse(missing, f"{prompt_name} response missing fields: {missing}")
+    
+    def test_chat_structured_outputs_for_json_schema(self):
+        """Test dict schemas use one structured-output request"""
+        self.mock_chat_func.return_value = '{"answer": "42"}'
+
+        ai_manager = self.new_ai_manager()
+        # add_schema mutates the validator, keep it private to this test
+        ai_manager.schema_validator = SchemaValidator(self.config)
+        prompt_name = next(iter(self.test_data.get_simple_prompts()))
+        ai_manager.add_schema(prompt_name, {
+            'type': 'object',
+            'properties': {'answer': {'type': 'string'}},
+            'required': ['answer'],
+            'additionalProperties': False
+        })
+
+        result = ai_manager.chat(prompt_name, {'text': 'x'}, validate=True, use_cache=False)
+
+        self.assertEqual(result, {'answer': '42'})
+        self.mock_chat_func.assert_called_once()
+        response_format = self.mock_chat_func.call_args.kwargs['response_format']
+        self.assertEqual(response_format['type'], 'json_schema')
+        self.assertTrue(response_format['json_schema']['strict'])
+
+    def test_rejected_strict_schema_not_retried(self):
+        """Test only a strict-mode schema rejection turns structured outputs off for later calls"""
+        import openai
+
+        def bad_request(message, param):
+            response = Mock(status_code=400, headers={})
+            return openai.BadRequestError(message, response=response, body={'param': param})
+
+        cases = (
+            ('schema rejected', bad_request("Invalid schema for response_format", 'response_format'), 1),
+            ('other bad request', bad_request("Invalid value for 'model'", 'model'), 2),
+            ('transient failure', None, 2),
         )
-        
-        # Should return error dict after max retries
+        prompt_name = next(iter(self.test_data.get_simple_prompts()))
+
+        for name, failure, expected_structured_calls in cases:
+            with self.subTest(case=name):
+                def fake_chat(**kwargs):
+                    if not kwargs.get('response_format'):
+                        return '{"answer": "42"}'
+                    if failure is None:
+                        return None
+                    self.assertTrue(kwargs['raise_bad_request'])
+                    raise failure
+
+                self.mock_chat_func.reset_mock()
+                self.mock_chat_func.side_effect = fake_chat
+                ai_manager = self.new_ai_manager()
+                ai_manager.schema_validator = SchemaValidator(self.config)
+                # Not strict-compatible: additionalProperties is not false
+                ai_manager.add_schema(prompt_name, {'type': 'object', 'properties': {'answer': {'type': 'string'}}})
+
+                for _ in range(2):
+                    result = ai_manager.chat(prompt_name, {'text': 'x'}, validate=True, use_cache=False)
+                    self.assertEqual(result, {'answer': '42'})
+
+                structured_calls = [call for call in self.mock_chat_func.call_args_list
+                                    if call.kwargs.get('response_format')]
+                self.assertEqual(len(structured_calls), expected_structured_calls)
+
+    def test_validation_prompts_built_at_init(self):
+        """Test schema prompts are prebuilt and JSON schema braces survive formatting"""
+        with patch('wl_ai_manager.ai_manager.init_openai_client', return_value=SimpleNamespace()):
+            ai_manager = AIManager(self.config)
+
+        self.assertEqual(set(ai_manager._validation_prompts), set(ai_manager.get_schema_prompts()))
+
+        prompt_name, info = next(iter(self.test_data.get_structured_prompts().items()))
+        ai_manager.schema_validator = SchemaValidator(self.config)
+        ai_manager.add_schema(prompt_name, {'type': 'object', 'properties': {'answer': {'type': 'string'}}})
+        self.assertNotIn(prompt_name, ai_manager._validation_prompts)
+
+        prompt, required_keys, error = ai_manager._get_validation_prompt(prompt_name)
+        self.assertIsNone(error)
+        user_prompt = prompt['user'] if isinstance(prompt, dict) else prompt
+        self.assertIn("{'type': 'object'", user_prompt.format(**info['test_data']))
+        self.assertLessEqual(required_keys, info['test_data'].keys())
+
+    def test_validation_retries_stop_early(self):
+        """Test which failures are retried (with hints) and which stop the loop"""
+        import itertools
+
+        prompt_name = next(iter(self.test_data.get_simple_prompts()))
+        max_retries = getattr(self.config, 'max_validation_retries', 3)
+        cases = (
+            ('structural', lambda n: '{"answer": "42", "extra": 1}', False, 1, 'non-retriable'),
+            ('content', lambda n: f'{{"other": "{n}"}}', True, max_retries + 1, 'after all retries'),
+            ('repeated', lambda n: '{"other": "x"}', True, 2, 'repeated'),
+            ('empty', lambda n: None, True, 2, 'empty'),
+        )
+
+        for name, make_response, additional_properties, expected_calls, error in cases:
+            with self.subTest(case=name):
+                counter = itertools.count()
+                self.mock_chat_func.reset_mock()
+                self.mock_chat_func.side_effect = lambda **kwargs: make_response(next(counter))
+
+                ai_manager = self.new_ai_manager()
+                ai_manager.schema_validator = SchemaValidator(self.config)
+                ai_manager.add_schema(prompt_name, {
+                    'type': 'object',
+                    'properties': {'answer': {'type': 'string'}},
+                    'required': ['answer'],
+                    'additionalProperties': additional_properties
+                })
+                result = ai_manager.chat(prompt_name, {'text': 'x'}, validate=True, use_cache=False)
+
+                # The structured-output request carries no prompt override
+                overrides = [call.kwargs['prompt_override'] for call in self.mock_chat_func.call_args_list
+                             if call.kwargs.get('prompt_override')]
+                self.assertEqual(len(overrides), expected_calls)
+                self.assertEqual(result['attempts'], expected_calls)
+                self.assertIn(error, result['error'])
+                if name == 'content':
+                    self.assertIn("'answer' is a required property", str(overrides[1]))
+
+    def test_validation_candidates_in_one_call(self):
+        """Test validation_candidates requests n completions and keeps the first valid one"""
+        prompt_name, info = next(iter(self.test_data.get_structured_prompts().items()))
+        self.mock_chat_func.return_value = ["Not structured at all", info['mock_response']]
+
+        ai_manager = self.new_ai_manager()
+        ai_manager.config = copy.copy(self.config)
+        ai_manager.config.validation_candidates = 2
+        result = ai_manager.chat(prompt_name, info['test_data'], validate=True, use_cache=False)
+
         self.assertIsInstance(result, dict)
-        self.assertIn('error', result)
-        self.assertIn('attempts', result)
-    
-    @patch('ai_manager.ai_manager.init_openai_client')
-    def test_get_schema_prompts_from_data(self, mock_init_client):
+        self.assertFalse(set(info['expected_fields']) - result.keys())
+        self.mock_chat_func.assert_called_once()
+        self.assertEqual(self.mock_chat_func.call_args.kwargs['n_candidates'], 2)
+
+    def test_validation_prompt_built_once(self):
+        """Test the schema-augmented prompt is reused across validated calls"""
+        prompt_name, info = next(iter(self.test_data.get_structured_prompts().items()))
+        self.mock_chat_func.return_value = info['mock_response']
+
+        ai_manager = self.new_ai_manager()
+        with patch.object(ai_manager, '_build_validation_prompt',
+                          wraps=ai_manager._build_validation_prompt) as mock_build:
+            for _ in range(2):
+                result = ai_manager.chat(prompt_name, info['test_data'], validate=True, use_cache=False)
+                self.assertIsInstance(result, dict)
+
+        mock_build.assert_called_once_with(prompt_name)
+
+    def test_chat_disk_cache_survives_restart(self):
+        """Test responses stored on disk are reused by a fresh manager"""
+        self.mock_chat_func.return_value = "Persisted response"
+        prompt_name, info = next(iter(self.test_data.get_simple_prompts().items()))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "responses.sqlite3"
+            for _ in range(2):
+                # Each copy starts with an empty memory cache
+                ai_manager = self.new_ai_manager()
+                ai_manager._disk_cache = DiskCache(path)
+                result = ai_manager.chat(prompt_name, info['test_data'])
+                ai_manager.close()
+
+        self.assertEqual(result, "Persisted response")
+        self.assertEqual(self.mock_chat_func.call_count, 1)
+
+    def test_disk_cache_misses_after_prompt_edit(self):
+        """Test editing a prompt's text invalidates its cached answers across restarts"""
+        self.mock_chat_func.side_effect = ["Old answer", "New answer"]
+        prompt_name, info = next(iter(self.test_data.get_simple_prompts().items()))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "responses.sqlite3"
+            results = []
+            for suffix in ("", " Answer briefly."):
+                ai_manager = self.new_ai_manager()
+                ai_manager._disk_cache = DiskCache(path)
+                ai_manager.prompts = dict(ai_manager.prompts)
+                prompt = ai_manager.prompts[prompt_name]
+                if isinstance(prompt, dict):
+                    prompt = {**prompt, 'user': prompt['user'] + suffix}
+                else:
+                    prompt = prompt + suffix
+                ai_manager.prompts[prompt_name] = prompt
+                results.append(ai_manager.chat(prompt_name, info['test_data']))
+                ai_manager.close()
+
+        self.assertEqual(results, ["Old answer", "New answer"])
+
+    @patch('wl_ai_manager.image_generation.create_flux_pro_image')
+    def test_image_cache_keyed_on_model(self, mock_create_image):
+        """Test changing the image model is not served the old model's cached image"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            mock_create_image.side_effect = lambda **kwargs: str(Path(temp_dir) / f"{kwargs['file_name']}.webp")
+            ai_manager = self.new_ai_manager()
+            ai_manager.replicate_client = Mock()
+            ai_manager._disk_cache = DiskCache(Path(temp_dir) / "responses.sqlite3")
+
+            for model in ("black-forest-labs/flux-pro", "black-forest-labs/flux-dev", "black-forest-labs/flux-dev"):
+                ai_manager.config = {'replicate': {'image_model': model}}
+                Path(ai_manager.generate_image("A cat", file_name=model[-3:], folder=temp_dir)).touch()
+            ai_manager.close()
+
+        self.assertEqual(mock_create_image.call_count, 2)
+
+    @patch('wl_ai_manager.ai_manager.achat', new_callable=AsyncMock)
+    @patch('wl_ai_manager.ai_manager.init_async_openai_client')
+    def test_chat_batch(self, mock_init_async_client, mock_achat_func):
+        """Test batched requests run concurrently and keep their order"""
+        mock_init_async_client.return_value = SimpleNamespace()
+        mock_achat_func.side_effect = lambda **kwargs: f"Response for {kwargs['data']['n']}"
+
+        ai_manager = self.new_ai_manager()
+        prompt_name = next(iter(self.test_data.get_simple_prompts()))
+        requests = [{'prompt_name': prompt_name, 'data': {'n': n}} for n in range(5)]
+
+        results = ai_manager.chat_batch(requests)
+
+        self.assertEqual(results, [f"Response for {n}" for n in range(5)])
+        self.assertEqual(mock_achat_func.await_count, 5)
+
+    @patch('wl_ai_manager.ai_manager.achat', new_callable=AsyncMock)
+    @patch('wl_ai_manager.ai_manager.init_async_openai_client')
+    def test_chat_batch_from_threads_and_own_loop(self, mock_init_async_client, mock_achat_func):
+        """Test sync batches from several threads share one loop safely and async callers get their own client"""
+        mock_init_async_client.side_effect = lambda config: Mock(close=AsyncMock())
+
+        async def respond(**kwargs):
+            await asyncio.sleep(0.01)
+            return f"Response for {kwargs['data']['n']}"
+
+        mock_achat_func.side_effect = respond
+        ai_manager = self.new_ai_manager()
+        prompt_name = next(iter(self.test_data.get_simple_prompts()))
+        requests = [{'prompt_name': prompt_name, 'data': {'n': n}} for n in range(3)]
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            batches = list(executor.map(lambda _: ai_manager.chat_batch(requests), range(4)))
+        self.assertEqual(batches, [[f"Response for {n}" for n in range(3)]] * 4)
+
+        async def own_loop():
+            return await ai_manager.achat(prompt_name, {'n': 7}, use_cache=False)
+
+        self.assertEqual(asyncio.run(own_loop()), "Response for 7")
+        # One client for the private loop, one for asyncio.run's loop
+        self.assertEqual(mock_init_async_client.call_count, 2)
+        private_loop = ai_manager._loop
+
+        private_client = ai_manager._async_clients[private_loop]
+        ai_manager.close()
+        private_client.close.assert_awaited_once()
+        self.assertTrue(private_loop.is_closed())
+
+    def test_chat_response_cache(self):
+        """Test identical chat requests are served from the response cache"""
+        self.mock_chat_func.return_value = "Cached response"
+
+        ai_manager = self.new_ai_manager()
+
+        prompt_name, info = next(iter(self.test_data.get_simple_prompts().items()))
+        first = ai_manager.chat(prompt_name, info['test_data'])
+        second = ai_manager.chat(prompt_name, info['test_data'])
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.mock_chat_func.call_count, 1)
+
+        # Bypassing and clearing the cache both hit the API again
+        ai_manager.chat(prompt_name, info['test_data'], use_cache=False)
+        self.assertEqual(self.mock_chat_func.call_count, 2)
+
+        ai_manager.clear_cache()
+        ai_manager.chat(prompt_name, info['test_data'])
+        self.assertEqual(self.mock_chat_func.call_count, 3)
+
+    def test_chat_failures_not_cached(self):
+        """Test failed chat requests are not cached"""
+        self.mock_chat_func.return_value = None
+
+        ai_manager = self.new_ai_manager()
+
+        prompt_name, info = next(iter(self.test_data.get_simple_prompts().items()))
+        ai_manager.chat(prompt_name, info['test_data'])
+        ai_manager.chat(prompt_name, info['test_data'])
+
+        self.assertEqual(self.mock_chat_func.call_count, 2)
+
+    @patch('wl_ai_manager.ai_manager.achat', new_callable=AsyncMock)
+    @patch('wl_ai_manager.ai_manager.init_async_openai_client')
+    def test_chat_speculative_validation(self, mock_init_async, mock_achat):
+        """Test speculative validation returns the first valid attempt"""
+        mock_init_async.return_value = SimpleNamespace()
+
+        prompt_name, info = next(iter(self.test_data.get_structured_prompts().items()))
+        mock_achat.side_effect = ["```\n```", info['mock_response'], None]
+
+        ai_manager = self.new_ai_manager()
+        result = ai_manager.chat_speculative(prompt_name, info['test_data'], attempts=3)
+
+        self.assertIsInstance(result, dict)
+        self.assertNotIn('error', result)
+        self.assertEqual(mock_achat.call_count, 3)
+
+    def test_get_schema_prompts_from_data(self):
         """Test getting schema prompts based on test data"""
-        mock_init_client.return_value = Mock()
-        ai_manager = AIManager(self.config)
+        ai_manager = self.new_ai_manager()
         
-        schema_prompts = ai_manager.get_schema_prompts()
+        schema_prompts = set(ai_manager.get_schema_prompts())
         
         # Should include all structured prompts
-        structured_prompts = self.test_data.get_structured_prompts()
-        for prompt_name in structured_prompts:
-            self.assertIn(prompt_name, schema_prompts)
+        structured_prompts = set(self.test_data.get_structured_prompts())
+        self.assertLessEqual(structured_prompts, schema_prompts)
         
         # Should include system/user prompts with schemas
-        system_user_prompts = self.test_data.get_system_user_prompts()
-        for prompt_name, info in system_user_prompts.items():
-            if 'schema_yaml' in info:
-                self.assertIn(prompt_name, schema_prompts)
+        system_user_prompts = {name for name, info in self.test_data.get_system_user_prompts().items()
+                               if 'schema_yaml' in info}
+        self.assertLessEqual(system_user_prompts, schema_prompts)
         
         # Should not include simple prompts
-        simple_prompts = self.test_data.get_simple_prompts()
-        for prompt_name in simple_prompts:
-            self.assertNotIn(prompt_name, schema_prompts)
+        self.assertTrue(schema_prompts.isdisjoint(self.test_data.get_simple_prompts()))
+
+
+class TestDownloads(unittest.TestCase):
+    """Test the shared download session"""
+
+    def test_session_is_shared_and_retries(self):
+        """Test one pooled session with retries serves every download"""
+        session = get_session()
+
+        self.assertIs(get_session(), session)
+        self.assertEqual(session.get_adapter('https://replicate.delivery/x').max_retries.total, 3)
+
+
+class TestRateLimit(unittest.TestCase):
+    """Test the token bucket rate limiter"""
+
+    def test_burst_then_paced(self):
+        """Test the bucket allows a burst and then spaces sync and async requests"""
+        import time
+
+        for mode in ('sync', 'async'):
+            with self.subTest(mode=mode):
+                bucket = TokenBucket(2, 0.1)
+
+                async def acquire_async(count):
+                    for _ in range(count):
+                        async with bucket:
+                            pass
+
+                start = time.monotonic()
+                if mode == 'sync':
+                    for _ in range(4):
+                        with bucket:
+                            pass
+                else:
+                    asyncio.run(acquire_async(4))
+
+                # Two immediate tokens, then one every 50ms
+                self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_client_proxy_takes_token_per_run(self):
+        """Test the Replicate proxy rate-limits run() and passes other attributes through"""
+        client = Mock()
+        limiter = MagicMock()
+        proxy = RateLimitedClient(client, limiter)
+
+        self.assertIs(proxy.run("model", input={}), client.run.return_value)
+        limiter.__enter__.assert_called_once()
+        self.assertIs(proxy.predictions, client.predictions)
+
+    def test_client_proxy_caps_in_flight_runs(self):
+        """Test max_in_flight bounds concurrent run() calls"""
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+
+        lock = threading.Lock()
+        state = {'active': 0, 'peak': 0}
+
+        def run(*args, **kwargs):
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            time.sleep(0.02)
+            with lock:
+                state['active'] -= 1
+
+        proxy = RateLimitedClient(Mock(run=run), TokenBucket(100, 1), max_in_flight=2)
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            list(executor.map(lambda _: proxy.run("model"), range(6)))
+
+        self.assertEqual(state['peak'], 2)
+
+    def test_music_client_throttled_once_per_key(self):
+        """Test create_music reuses one throttled client per API key"""
+        from wl_ai_manager.music_generation import _throttle_client
+
+        client = Mock()
+        replicate_config = SimpleNamespace(api_key='r8_music', qpm=30, max_in_flight=2)
+        throttled = _throttle_client(client, replicate_config)
+
+        self.assertIsInstance(throttled, RateLimitedClient)
+        self.assertIs(_throttle_client(client, replicate_config), throttled)
+        self.assertIs(_throttle_client(throttled, replicate_config), throttled)
+        self.assertEqual(throttled._limiter.max_rate, 30)
+
+
+class TestReplicateClient(unittest.TestCase):
+    """Test the shared Replicate client"""
+
+    def test_client_shared_per_api_key(self):
+        """Test one pooled client is reused for the same API key"""
+        client = get_replicate_client_from_config({'replicate': {'api_key': 'r8_test'}})
+
+        self.assertIs(get_replicate_client('r8_test'), client)
+        self.assertIsNot(get_replicate_client('r8_other'), client)
+        self.assertIsNone(get_replicate_client_from_config({'replicate': {}}))
+
+        http_client = client._client
+        self.assertIs(client._client, http_client)
+        self.assertEqual(http_client.headers['Authorization'], "Bearer r8_test")
+        transport = http_client._transport._wrapped_transport
+        self.assertIs(client._async_client._transport._wrapped_transport, transport)
+        for pool in (transport._sync._pool, transport._async._pool):
+            self.assertEqual(pool._max_connections, 32)
+            self.assertEqual(pool._http2, HTTP2_AVAILABLE)
+
+
+class TestResumableDownload(unittest.TestCase):
+    """Test downloads resume from a partial file"""
+
+    def _session(self, *responses):
+        session = MagicMock()
+        session.get.return_value.__enter__.side_effect = list(responses)
+        return session
+
+    def test_stale_partial_file_overwritten(self):
+        """Test a .part file left by an earlier call is replaced, not resumed"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = Path(temp_dir) / "music_chain_000.wav"
+            Path(str(output_path) + ".part").write_bytes(b"old take ")
+            session = self._session(SimpleNamespace(status_code=200, raw=io.BytesIO(b"new take"),
+                                                    raise_for_status=lambda: None))
+
+            with patch('wl_ai_manager.downloads.get_session', return_value=session):
+                download_to_file("https://replicate.delivery/b.wav", output_path)
+
+            self.assertEqual(output_path.read_bytes(), b"new take")
+            self.assertFalse(Path(str(output_path) + ".part").exists())
+        self.assertNotIn('Range', session.get.call_args.kwargs['headers'])
+
+    def test_interrupted_download_resumes(self):
+        """Test a dropped connection continues from the bytes already written"""
+        import requests
+
+        class DroppingStream(io.BytesIO):
+            def read(self, *args):
+                data = super().read(*args)
+                if not data:
+                    raise requests.exceptions.ChunkedEncodingError("connection dropped")
+                return data
+
+        # A 206 appends to the bytes already written, a 200 starts over
+        for status, body, expected in ((206, b"world", b"hello world"), (200, b"fresh", b"fresh")):
+            with self.subTest(status=status):
+                first = SimpleNamespace(status_code=200, raw=DroppingStream(b"hello "),
+                                        raise_for_status=lambda: None)
+                second = SimpleNamespace(status_code=status, raw=io.BytesIO(body), raise_for_status=lambda: None)
+                session = self._session(first, second)
+
+                with tempfile.TemporaryDirectory() as temp_dir, \
+                        patch('wl_ai_manager.downloads.get_session', return_value=session):
+                    output_path = Path(temp_dir) / "audio.wav"
+                    download_to_file("https://replicate.delivery/a.wav", output_path)
+
+                    self.assertEqual(output_path.read_bytes(), expected)
+                self.assertEqual(session.get.call_args.kwargs['headers']['Range'], "bytes=6-")
+
+
+class TestImageGeneration(unittest.TestCase):
+    """Test FLUX PRO image post-processing with a stubbed Replicate client"""
+
+    def _client(self, size=(64, 32)):
+        from PIL import Image
+
+        png = io.BytesIO()
+        Image.new('RGB', size, 'red').save(png, 'PNG')
+        png.seek(0)
+        client = Mock()
+        client.run.return_value = png
+        return client
+
+    def test_file_output_saved_in_requested_format(self):
+        """Test file-like Replicate output is decoded and saved"""
+        from PIL import Image
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = create_flux_pro_image("cat.png", temp_dir, "A cat", file_type="webp",
+                                         target_width=64, target_height=32, client=self._client())
+
+            self.assertEqual(path, str(Path(temp_dir) / "cat.webp"))
+            with Image.open(path) as image:
+                self.assertEqual((image.format, image.size), ('WEBP', (64, 32)))
+
+    def test_matching_format_written_without_reencoding(self):
+        """Test output in the requested format is copied byte-for-byte"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            client = self._client()
+            expected = client.run.return_value.getvalue()
+
+            with patch('PIL.Image.open') as mock_open:
+                path = create_flux_pro_image("cat", temp_dir, "A cat", file_type="png", client=client)
+
+            mock_open.assert_not_called()
+            self.assertEqual(Path(path).read_bytes(), expected)
+
+    @patch('wl_ai_manager.image_generation.get_session')
+    def test_url_output_decoded_in_chunks(self, mock_get_session):
+        """Test a URL result is decoded from the streamed chunks before re-encoding"""
+        from PIL import Image
+
+        png = self._client((64, 32)).run.return_value.getvalue()
+        response = mock_get_session.return_value.get.return_value.__enter__.return_value
+        response.iter_content.return_value = [png[i:i + 100] for i in range(0, len(png), 100)]
+        client = Mock()
+        client.run.return_value = "https://replicate.delivery/cat.png"
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = create_flux_pro_image("cat", temp_dir, "A cat", file_type="webp",
+                                         target_width=64, target_height=32, client=client)
+
+            with Image.open(path) as image:
+                self.assertEqual((image.format, image.size), ('WEBP', (64, 32)))
+        response.iter_content.assert_called_once()
+
+    def test_aspect_ratio_name_from_dimensions(self):
+        """Test reduced dimensions map to FLUX aspect ratio names"""
+        for (width, height), expected in {(1024, 576): "16:9", (512, 512): "1:1", (640, 320): "custom"}.items():
+            with self.subTest(size=(width, height)), tempfile.TemporaryDirectory() as temp_dir:
+                client = self._client()
+                create_flux_pro_image("img", temp_dir, "A cat", file_type="png",
+                                      target_width=width, target_height=height, client=client)
+                self.assertEqual(client.run.call_args.kwargs['input']['aspect_ratio'], expected)
+
+    def test_resize_and_crop_fit_target(self):
+        """Test resize+crop produces exactly the target size"""
+        from PIL import Image
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = create_flux_pro_image("cat", temp_dir, "A cat", file_type="png",
+                                         target_width=30, target_height=30, crop=True, resize=True,
+                                         client=self._client((64, 32)))
+
+            with Image.open(path) as image:
+                self.assertEqual(image.size, (30, 30))
+
+    def test_resize_keeps_aspect_ratio(self):
+        """Test resize-only downscales and upscales to the target height"""
+        from PIL import Image
+
+        for target, expected in (((16, 16), (32, 16)), ((128, 128), (256, 128))):
+            with self.subTest(target=target), tempfile.TemporaryDirectory() as temp_dir:
+                path = create_flux_pro_image("cat", temp_dir, "A cat", file_type="jpg",
+                                             target_width=target[0], target_height=target[1],
+                                             resize=True, client=self._client((64, 32)))
+
+                with Image.open(path) as image:
+                    self.assertEqual(image.format, 'JPEG')
+                    self.assertEqual(image.size, expected)
+
+
+class TestMusicGeneration(unittest.TestCase):
+    """Test music generation helpers"""
+
+    @patch('wl_ai_manager.downloads.get_session')
+    def test_create_music_downloads_and_caches(self, mock_get_session):
+        """Test generated audio is downloaded once and then served from the media cache"""
+        response = mock_get_session.return_value.get.return_value.__enter__.return_value
+        response.status_code = 200
+        response.raw = io.BytesIO(b"RIFF" + b"\0" * 1024)
+        client = Mock()
+        client.run.return_value = ["https://replicate.delivery/music.wav"]
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config = SimpleNamespace(cache_enabled=True, cache_dir=str(Path(temp_dir) / "cache"))
+            for name in ("first", "second"):
+                path = create_music("calm piano", name, temp_dir, client=client, config=config)
+                self.assertEqual(Path(path).read_bytes(), b"RIFF" + b"\0" * 1024)
+
+        client.run.assert_called_once()
+        mock_get_session.return_value.get.assert_called_once()
+        self.assertEqual(mock_get_session.return_value.get.call_args.args,
+                         ("https://replicate.delivery/music.wav",))
+
+    @patch('wl_ai_manager.music_generation.download_to_file')
+    def test_url_continuation_not_served_plain_cache_entry(self, mock_download):
+        """Test a continuation from a URL gets its own cache key, not the plain request's"""
+        def download(url, output_path, **kwargs):
+            Path(output_path).write_bytes(url.encode())
+            return str(output_path)
+
+        mock_download.side_effect = download
+        client = Mock()
+        client.run.side_effect = [["https://replicate.delivery/plain.wav"],
+                                  ["https://replicate.delivery/continued.wav"]]
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config = SimpleNamespace(cache_enabled=True, cache_dir=str(Path(temp_dir) / "cache"))
+            create_music("calm piano", "plain", temp_dir, client=client, config=config)
+            path = create_music("calm piano", "continued", temp_dir, client=client, config=config,
+                                continuation_audio="https://replicate.delivery/previous.wav")
+
+            self.assertEqual(Path(path).read_bytes(), b"https://replicate.delivery/continued.wav")
+        self.assertEqual(client.run.call_count, 2)
+
+    @patch('wl_ai_manager.music_generation.download_to_file')
+    def test_chain_continues_from_url_while_downloading(self, mock_download):
+        """Test each segment continues from the previous output URL and downloads run behind"""
+        import threading
+
+        first_download_started = threading.Event()
+        release_download = threading.Event()
+        inputs = []
+
+        def run(model, input):
+            inputs.append(input.get('input_audio'))
+            if len(inputs) == 2:
+                # Segment 2 is generating while segment 1 is still downloading
+                self.assertTrue(first_download_started.wait(5))
+                release_download.set()
+            return [f"https://replicate.delivery/segment{len(inputs)}.wav"]
+
+        def download(url, output_path, **kwargs):
+            first_download_started.set()
+            release_download.wait(5)
+            Path(output_path).write_bytes(url.encode())
+
+        mock_download.side_effect = download
+        client = Mock()
+        client.run.side_effect = run
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files = create_music_continuation_chain(["intro", "verse"], temp_dir, client=client)
+            self.assertEqual([Path(path).name for path in files], ["music_000.wav", "music_001.wav"])
+            self.assertEqual(Path(files[0]).read_bytes(), b"https://replicate.delivery/segment1.wav")
+
+        self.assertEqual(inputs, [None, "https://replicate.delivery/segment1.wav"])
+
+    def test_music_reuses_pooled_client_per_key(self):
+        """Test calls without a client share the pooled Replicate client for the key"""
+        from wl_ai_manager.music_generation import _resolve_client
+
+        config = SimpleNamespace(replicate=SimpleNamespace(api_key="r8_music_test"))
+        first = _resolve_client(None, config)
+        second = _resolve_client(None, config)
+
+        self.assertIs(first, second)
+        self.assertIs(first._client, get_replicate_client("r8_music_test"))
+
+    @patch('wl_ai_manager.music_generation.create_music_async')
+    def test_variations_async_bounded_and_ordered(self, mock_create_music):
+        """Test variations run concurrently up to the limit and keep their order"""
+        state = {'active': 0, 'peak': 0}
+
+        async def create_music(**kwargs):
+            state['active'] += 1
+            state['peak'] = max(state['peak'], state['active'])
+            await asyncio.sleep(0.02)
+            state['active'] -= 1
+            return None if kwargs['file_name'].endswith('_002') else f"{kwargs['file_name']}.wav"
+
+        mock_create_music.side_effect = create_music
+
+        result = asyncio.run(create_music_variations_async(
+            "base", ["a", "b", "c", "d", "e"], "/music", max_concurrency=2))
+
+        self.assertEqual(result, ["variation_000.wav", "variation_001.wav",
+                                  "variation_003.wav", "variation_004.wav"])
+        self.assertEqual(state['peak'], 2)
+        self.assertEqual(mock_create_music.call_args_list[0].kwargs['prompt'], "base, a")
+
+    def test_create_music_async_streams_download(self):
+        """Test async generation uses async_run and streams the audio with httpx"""
+        import httpx
+
+        body = b"RIFF" + b"\0" * 1024
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body))
+        client = Mock()
+        client.async_run = AsyncMock(return_value=["https://replicate.delivery/music.wav"])
+
+        async def generate(output_dir):
+            async with httpx.AsyncClient(transport=transport) as http_client:
+                return await create_music_async("calm piano", "song", output_dir, client=client,
+                                                http_client=http_client)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = asyncio.run(generate(temp_dir))
+            self.assertEqual(Path(path).read_bytes(), body)
+
+        client.run.assert_not_called()
+        client.async_run.assert_awaited_once()
+
+    @patch('wl_ai_manager.music_generation.create_music')
+    def test_variations_run_in_thread_pool(self, mock_create_music):
+        """Test sync variations run concurrently without the fixed delay"""
+        import threading
+
+        barrier = threading.Barrier(3, timeout=5)
+
+        def create_music(**kwargs):
+            # Only returns once three variations are in flight together
+            barrier.wait()
+            return f"{kwargs['file_name']}.wav"
+
+        mock_create_music.side_effect = create_music
+        config = SimpleNamespace(replicate=SimpleNamespace(max_concurrency=3))
+
+        result = create_music_variations("base", ["a", "b", "c"], "/music", config=config)
+
+        self.assertEqual(result, ["variation_000.wav", "variation_001.wav", "variation_002.wav"])
+
+
+class TestVideoGeneration(unittest.TestCase):
+    """Test video generation helpers"""
+
+    @patch('wl_ai_manager.downloads.get_session')
+    def test_create_video_downloads_with_shared_session(self, mock_get_session):
+        """Test the generated video is fetched over the pooled session in large blocks"""
+        body = b"\0\0\0\x18ftypmp42" + b"\0" * (3 * 1024 * 1024)
+        response = mock_get_session.return_value.get.return_value.__enter__.return_value
+        response.status_code = 200
+        response.raw = io.BytesIO(body)
+        client = Mock()
+        client.run.return_value = ["https://replicate.delivery/video.mp4"]
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = create_veo_video("waves at dusk", "clip", temp_dir, client=client)
+            self.assertEqual(Path(path).read_bytes(), body)
+
+        call = mock_get_session.return_value.get.call_args
+        self.assertEqual(call.args, ("https://replicate.delivery/video.mp4",))
+        self.assertEqual(call.kwargs['timeout'], (10, 300))
+
+    def test_create_video_streams_file_output(self):
+        """Test a FileOutput result is streamed to disk instead of read whole"""
+        class FileOutput:
+            def read(self):
+                raise AssertionError("read() buffers the whole video")
+
+            def __iter__(self):
+                yield b"chunk1"
+                yield b"chunk2"
+
+        # Newer clients return the FileOutput directly, some models a list of them
+        for output in (FileOutput(), [FileOutput()]):
+            with self.subTest(output=type(output).__name__):
+                client = Mock()
+                client.run.return_value = output
+
+                with tempfile.TemporaryDirectory() as temp_dir:
+                    path = create_veo_video("waves", "clip", temp_dir, client=client)
+                    self.assertEqual(Path(path).read_bytes(), b"chunk1chunk2")
+
+    @patch('wl_ai_manager.downloads.get_session')
+    def test_create_video_cached_by_request(self, mock_get_session):
+        """Test an identical video request is served from the media cache"""
+        response = mock_get_session.return_value.get.return_value.__enter__.return_value
+        response.status_code = 200
+        response.raw = io.BytesIO(b"mp4 data")
+        client = Mock()
+        client.run.return_value = ["https://replicate.delivery/video.mp4"]
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config = SimpleNamespace(cache_enabled=True, cache_dir=str(Path(temp_dir) / "cache"))
+            first = create_veo_video("waves", "first", temp_dir, client=client, config=config)
+            second = create_veo_video("waves", "second", temp_dir, client=client, config=config)
+            self.assertEqual(Path(second).read_bytes(), b"mp4 data")
+            client.run.assert_called_once()
+
+            response.raw = io.BytesIO(b"fresh")
+            create_veo_video("waves", "third", temp_dir, client=client, config=config, use_cache=False)
+            self.assertEqual(client.run.call_count, 2)
+            self.assertEqual(Path(first).read_bytes(), b"mp4 data")
+
+    @patch('wl_ai_manager.video_generation.create_veo_video')
+    def test_video_batch_runs_concurrently_in_order(self, mock_create_video):
+        """Test batch videos are generated together and returned in spec order"""
+        import threading
+
+        barrier = threading.Barrier(3, timeout=5)
+
+        def create_video(**kwargs):
+            # Only returns once all three videos are in flight together
+            barrier.wait()
+            return None if kwargs['file_name'] == "b" else f"{kwargs['file_name']}.mp4"
+
+        mock_create_video.side_effect = create_video
+        client = Mock()
+
+        result = create_veo_videos_batch([("one", "a"), ("two", "b"), ("three", "c")], "/videos",
+                                         client=client, max_workers=3)
+
+        self.assertEqual(result, ["a.mp4", None, "c.mp4"])
+        self.assertTrue(all(call.kwargs['client'] is client for call in mock_create_video.call_args_list))
+
+    @patch('wl_ai_manager.video_generation.create_veo_video')
+    def test_video_from_image_validation_optional(self, mock_create_video):
+        """Test a missing image is rejected unless the caller skips validation"""
+        mock_create_video.return_value = "/videos/clip.mp4"
+
+        self.assertIsNone(create_veo_video_from_image("/missing/image.png", "a fox", "clip", "/videos"))
+        mock_create_video.assert_not_called()
+
+        result = create_veo_video_from_image("/missing/image.png", "a fox", "clip", "/videos", validate=False)
+        self.assertEqual(result, "/videos/clip.mp4")
+        mock_create_video.assert_called_once()
+
+    def test_video_client_shared_per_key(self):
+        """Test video calls without a client reuse the pooled Replicate client for the key"""
+        config = SimpleNamespace(replicate=SimpleNamespace(api_key="r8_video_test"))
+
+        client = init_replicate_client_for_video(config)
+
+        self.assertIs(client, get_replicate_client("r8_video_test"))
+        self.assertIs(init_replicate_client_for_video(config), client)
+
+    def test_create_video_async_streams_download(self):
+        """Test async video generation uses async_run and streams the file with httpx"""
+        import httpx
+
+        body = b"\0\0\0\x18ftypmp42" + b"\0" * 1024
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body))
+        client = Mock()
+        client.async_run = AsyncMock(return_value="https://replicate.delivery/video.mp4")
+
+        async def generate(output_dir):
+            async with httpx.AsyncClient(transport=transport) as http_client:
+                return await create_veo_video_async("a red fox", "fox", output_dir, client=client,
+                                                    http_client=http_client)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = asyncio.run(generate(temp_dir))
+            self.assertEqual(path, str(Path(temp_dir) / "fox.mp4"))
+            self.assertEqual(Path(path).read_bytes(), body)
+
+        client.run.assert_not_called()
+        client.async_run.assert_awaited_once()
 
 
 class TestAIManagerTTS(unittest.TestCase):
     """Test AIManager text-to-speech functionality"""
     
-    @patch('ai_manager.ai_manager.generate_speech')
-    @patch('ai_manager.ai_manager.init_openai_client')
+    @patch('wl_ai_manager.text_to_speech.generate_speech')
+    @patch('wl_ai_manager.ai_manager.init_openai_client')
     def test_generate_speech_with_defaults(self, mock_init_client, mock_generate_speech):
         """Test TTS generation with default parameters"""
-        mock_client = Mock()
+        mock_client = SimpleNamespace()
         mock_init_client.return_value = mock_client
         mock_generate_speech.return_value = "/test/output.wav"
         
@@ -363,15 +1728,61 @@ class TestAIManagerTTS(unittest.TestCase):
         self.assertEqual(kwargs['text'], "Hello world")
         self.assertEqual(kwargs['client'], mock_client)
 
+    @patch('wl_ai_manager.text_to_speech.generate_speech')
+    @patch('wl_ai_manager.ai_manager.init_openai_client')
+    def test_agenerate_speech_gathers(self, mock_init_client, mock_generate_speech):
+        """Test async TTS requests can be gathered concurrently"""
+        mock_init_client.return_value = SimpleNamespace()
+        mock_generate_speech.side_effect = lambda **kwargs: kwargs['output_path']
+
+        ai_manager = AIManager(get_test_config())
+
+        async def generate():
+            return await asyncio.gather(
+                ai_manager.agenerate_speech("One", output_path="/test/one.wav"),
+                ai_manager.agenerate_speech("Two", output_path="/test/two.wav")
+            )
+
+        self.assertEqual(asyncio.run(generate()), ["/test/one.wav", "/test/two.wav"])
+        self.assertEqual(mock_generate_speech.call_count, 2)
+
+    def test_generate_speech_streams_to_file(self):
+        """Test TTS audio is streamed to the output file"""
+        client = MagicMock()
+        response = client.audio.speech.with_streaming_response.create.return_value.__enter__.return_value
+        response.stream_to_file.side_effect = lambda path: Path(path).write_bytes(b"RIFF")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = str(Path(temp_dir) / "output.wav")
+            result = generate_speech("Hello world", "alloy", "tts-1", output_path, client=client)
+
+            self.assertEqual(result, output_path)
+            self.assertEqual(Path(output_path).read_bytes(), b"RIFF")
+            self.assertEqual(len(list(Path(temp_dir).iterdir())), 1)
+        client.audio.speech.create.assert_not_called()
+
+    def test_generate_speech_reuses_existing_file(self):
+        """Test content-addressed output is not regenerated"""
+        client = MagicMock()
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = str(Path(temp_dir) / "speech_abc.wav")
+            Path(output_path).write_bytes(b"RIFF")
+            result = generate_speech("Hello world", "alloy", "tts-1", output_path,
+                                     client=client, overwrite=False)
+
+        self.assertEqual(result, output_path)
+        client.audio.speech.with_streaming_response.create.assert_not_called()
+
 
 class TestAIManagerTranscription(unittest.TestCase):
     """Test AIManager transcription functionality"""
     
-    @patch('ai_manager.ai_manager.transcribe_audio')
-    @patch('ai_manager.ai_manager.init_openai_client')
+    @patch('wl_ai_manager.transcribe.transcribe_audio')
+    @patch('wl_ai_manager.ai_manager.init_openai_client')
     def test_transcribe_audio_from_path(self, mock_init_client, mock_transcribe):
         """Test audio transcription from file path"""
-        mock_client = Mock()
+        mock_client = SimpleNamespace()
         mock_init_client.return_value = mock_client
         mock_transcribe.return_value = "Hello world transcription"
         
@@ -382,160 +1793,214 @@ class TestAIManagerTranscription(unittest.TestCase):
         self.assertEqual(result, "Hello world transcription")
         mock_transcribe.assert_called_once()
 
+    def test_transcribe_bytes_uploads_from_memory(self):
+        """Test raw audio bytes are uploaded without a temporary file"""
+        from wl_ai_manager.transcribe import transcribe_audio
+
+        uploads = []
+
+        def create(model, file):
+            uploads.append((model, file.name, file.read()))
+            return SimpleNamespace(text="hello")
+
+        client = SimpleNamespace(audio=SimpleNamespace(transcriptions=SimpleNamespace(create=create)))
+        config = SimpleNamespace(openai=SimpleNamespace(whisper_model="whisper-test"))
+
+        with patch('builtins.open', side_effect=AssertionError("file opened")):
+            result = transcribe_audio(audio_data=b"RIFFdata", config=config, client=client)
+
+        self.assertEqual(result, "hello")
+        self.assertEqual(uploads, [("whisper-test", "audio.wav", b"RIFFdata")])
+
+    def test_transcribe_int16_skips_soundfile(self):
+        """Test int16 PCM arrays are framed as WAV without libsndfile"""
+        import numpy as np
+        import soundfile as sf
+        from wl_ai_manager.transcribe import transcribe_audio
 
-class TestIntegrationWithTestData(unittest.TestCase):
+        samples = (np.arange(800) % 200 - 100).astype(np.int16)
+        uploads = []
+
+        def create(model, file):
+            uploads.append(file.read())
+            return SimpleNamespace(text="hello")
+
+        client = SimpleNamespace(audio=SimpleNamespace(transcriptions=SimpleNamespace(create=create)))
+        config = SimpleNamespace(sample_rate=16000)
+
+        with patch('wl_ai_manager.transcribe.sf.write') as mock_write:
+            self.assertEqual(transcribe_audio(audio_data=samples, config=config, client=client), "hello")
+            mock_write.assert_not_called()
+
+        data, sample_rate = sf.read(io.BytesIO(uploads[0]), dtype='int16')
+        self.assertEqual(sample_rate, 16000)
+        self.assertTrue((data == samples).all())
+
+
+class TestIntegrationWithTestData(_SharedAIManager, unittest.TestCase):
     """Integration tests using test data"""
     
-    def setUp(self):
-        self.config = get_test_config()
-        self.test_data = test_data_loader
-        
-    @patch('ai_manager.ai_manager.init_openai_client')
-    def test_full_workflow_all_structured_prompts(self, mock_init_client):
+    def test_full_workflow_all_structured_prompts(self):
         """Test complete workflow with all structured prompts from test data"""
-        mock_client = Mock()
-        mock_init_client.return_value = mock_client
         
         structured_prompts = self.test_data.get_structured_prompts()
         
-        for prompt_name, info in structured_prompts.items():
-            with patch('ai_manager.chat.chat') as mock_chat:
-                mock_chat.return_value = info['mock_response']
-                
-                ai_manager = AIManager(self.config)
-                result = ai_manager.chat(
-                    prompt_name,
-                    info['test_data'],
-                    validate=True
-                )
-                
-                self.assertIsInstance(result, dict, f"Failed for prompt: {prompt_name}")
-                
-                # Verify expected fields
-                for field in info['expected_fields']:
-                    self.assertIn(field, result, 
-                                f"Missing field {field} in {prompt_name} response")
+        # Patch the name AIManager calls, once for every prompt
+        with patch('wl_ai_manager.ai_manager.chat') as mock_chat:
+            for prompt_name, info in structured_prompts.items():
+                with self.subTest(prompt_name=prompt_name):
+                    mock_chat.return_value = info['mock_response']
+                    
+                    ai_manager = self.new_ai_manager()
+                    result = ai_manager.chat(
+                        prompt_name,
+                        info['test_data'],
+                        validate=True
+                    )
+                    
+                    self.assertIsInstance(result, dict, f"Failed for prompt: {prompt_name}")
+                    
+                    # Verify expected fields
+                    missing = set(info['expected_fields']) - result.keys()
+                    self.assertFalse(missing, f"{prompt_name} response missing fields: {missing}")
     
-    @patch('ai_manager.ai_manager.init_openai_client')
-    def test_prompt_content_matches_data(self, mock_init_client):
+    def test_prompt_content_matches_data(self):
         """Test that loaded prompts match test data content"""
-        mock_init_client.return_value = Mock()
-        
-        ai_manager = AIManager(self.config)
+        ai_manager = self.new_ai_manager()
         
         # Test simple prompts
         simple_prompts = self.test_data.get_simple_prompts()
         for prompt_name, info in simple_prompts.items():
-            self.assertIn(prompt_name, ai_manager.prompts)
-            self.assertEqual(ai_manager.prompts[prompt_name], info['content'])
+            with self.subTest(prompt_name=prompt_name):
+                self.assertIn(prompt_name, ai_manager.prompts)
+                self.assertEqual(ai_manager.prompts[prompt_name], info['content'])
         
         # Test structured prompts
         structured_prompts = self.test_data.get_structured_prompts()
         for prompt_name, info in structured_prompts.items():
-            self.assertIn(prompt_name, ai_manager.prompts)
-            self.assertEqual(ai_manager.prompts[prompt_name], info['content'])
+            with self.subTest(prompt_name=prompt_name):
+                self.assertIn(prompt_name, ai_manager.prompts)
+                self.assertEqual(ai_manager.prompts[prompt_name], info['content'])
         
         # Test system/user prompts
         system_user_prompts = self.test_data.get_system_user_prompts()
         for prompt_name, info in system_user_prompts.items():
-            self.assertIn(prompt_name, ai_manager.prompts)
-            prompt = ai_manager.prompts[prompt_name]
-            self.assertEqual(prompt['system'], info['system'])
-            self.assertEqual(prompt['user'], info['user'])
+            with self.subTest(prompt_name=prompt_name):
+                self.assertIn(prompt_name, ai_manager.prompts)
+                prompt = ai_manager.prompts[prompt_name]
+                self.assertEqual(prompt['system'], info['system'])
+                self.assertEqual(prompt['user'], info['user'])
     
-    @patch('ai_manager.ai_manager.init_openai_client')
-    def test_schema_content_matches_data(self, mock_init_client):
+    def test_schema_content_matches_data(self):
         """Test that loaded schemas match test data"""
-        mock_init_client.return_value = Mock()
-        
-        ai_manager = AIManager(self.config)
+        ai_manager = self.new_ai_manager()
         
         # Test structured prompt schemas
         structured_prompts = self.test_data.get_structured_prompts()
         for prompt_name, info in structured_prompts.items():
-            schema_content = ai_manager.schema_validator.get_schema_content(prompt_name)
-            self.assertIsNotNone(schema_content)
-            
-            # Parse and compare schema content
-            loaded_schema = json.loads(schema_content)
-            expected_schema = info['schema']
-            self.assertEqual(loaded_schema, expected_schema)
+            with self.subTest(prompt_name=prompt_name):
+                schema_content = ai_manager.schema_validator.get_schema_content(prompt_name)
+                self.assertIsNotNone(schema_content)
+                
+                # Parse and compare schema content
+                self.assertEqual(orjson.loads(schema_content), info['schema'])
         
         # Test system/user prompt schemas (YAML)
         system_user_prompts = self.test_data.get_system_user_prompts()
         for prompt_name, info in system_user_prompts.items():
-            if 'schema_yaml' in info:
-                schema_content = ai_manager.schema_validator.get_schema_content(prompt_name)
-                self.assertIsNotNone(schema_content)
-                self.assertEqual(schema_content, info['schema_yaml'])
+            with self.subTest(prompt_name=prompt_name):
+                if 'schema_yaml' in info:
+                    schema_content = ai_manager.schema_validator.get_schema_content(prompt_name)
+                    self.assertIsNotNone(schema_content)
+                    self.assertEqual(schema_content, info['schema_yaml'])
 
 
-class TestErrorHandlingWithData(unittest.TestCase):
+class TestErrorHandlingWithData(_SharedAIManager, unittest.TestCase):
     """Test error handling scenarios using test data"""
     
-    def setUp(self):
-        self.config = get_test_config()
-        self.test_data = test_data_loader
-    
-    @patch('ai_manager.ai_manager.init_openai_client')
-    def test_error_scenarios_from_data(self, mock_init_client):
+    def test_error_scenarios_from_data(self):
         """Test error scenarios defined in test data"""
-        mock_init_client.return_value = Mock()
         
         scenarios = self.test_data.get_test_scenarios()
-        ai_manager = AIManager(self.config)
+        ai_manager = self.new_ai_manager()
+        mock_chat = Mock()
         
-        # Test missing schema scenario
-        missing_schema = scenarios['missing_schema']
-        with patch('ai_manager.chat.chat') as mock_chat:
-            mock_chat.return_value = "Some response"
-            result = ai_manager.chat(
-                missing_schema['prompt'],
-                missing_schema['data'],
-                validate=missing_schema['validate']
-            )
+        # One manager and one chat swap shared by every scenario
+        with swap_attr(ai_manager_module, 'chat', mock_chat):
+            with self.subTest(scenario='missing_schema'):
+                missing_schema = scenarios['missing_schema']
+                mock_chat.return_value = "Some response"
+                result = ai_manager.chat(
+                    missing_schema['prompt'],
+                    missing_schema['data'],
+                    validate=missing_schema['validate']
+                )
+                
+                self.assertIsInstance(result, dict)
+                self.assertIn('error', result)
+                self.assertIn('No schema available', result['error'])
             
-            self.assertIsInstance(result, dict)
-            self.assertIn('error', result)
-        
-        # Test missing data keys scenario
-        missing_keys = scenarios['missing_data_keys']
-        with patch('ai_manager.chat.chat') as mock_chat:
-            mock_chat.return_value = None  # Simulate missing keys error
-            result = ai_manager.chat(missing_keys['prompt'], missing_keys['data'])
+            with self.subTest(scenario='validation_failure'):
+                failure_scenario = scenarios['validation_failure']
+                # Always return invalid response
+                mock_chat.return_value = failure_scenario['mock_invalid_response']
+                result = ai_manager.chat(
+                    failure_scenario['prompt'],
+                    failure_scenario['data'],
+                    validate=True
+                )
+                
+                # Should return error dict after max retries
+                self.assertIsInstance(result, dict)
+                self.assertIn('error', result)
+                self.assertIn('attempts', result)
             
-            self.assertIsNone(result)
+            with self.subTest(scenario='missing_data_keys'):
+                missing_keys = scenarios['missing_data_keys']
+                mock_chat.return_value = None  # Simulate missing keys error
+                result = ai_manager.chat(missing_keys['prompt'], missing_keys['data'])
+                
+                self.assertIsNone(result)
 
 
 def setup_test_environment():
     """Setup test environment by generating files from JSON data"""
+    import hashlib
     import subprocess
     import sys
     
-    test_dir = Path(__file__).parent / "test_data"
-    
-    # Check if test data exists
-    if not (test_dir / "test_data.json").exists():
-        print("Test data not found. Generating test files...")
-        
-        # Run the generation script
-        script_path = Path(__file__).parent.parent / "generate_test_files.sh"
-        if script_path.exists():
-            result = subprocess.run([
-                "bash", str(script_path),
-                str(test_dir / "prompts"),
-                str(test_dir / "schemas"),
-                str(test_dir / "test_data.json")
-            ], capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                print(f"Error generating test files: {result.stderr}")
-                sys.exit(1)
-            else:
-                print("Test files generated successfully!")
-        else:
-            print(f"Generation script not found: {script_path}")
-            sys.exit(1)
+    test_dir = TEST_DATA_DIR
+    data_file = TEST_DATA_FILE
+    stamp_file = TEST_DATA_DIR / ".stamp"
+    script_path = GENERATOR_SCRIPT
+    
+    if not script_path.exists():
+        if data_file.exists():
+            return
+        print(f"Generation script not found: {script_path}")
+        sys.exit(1)
+    
+    # Only regenerate when test data is missing or the script has changed
+    signature = hashlib.sha256(script_path.read_bytes()).hexdigest()
+    if data_file.exists() and stamp_file.exists() and stamp_file.read_text().strip() == signature:
+        return
+    
+    print("Test data missing or outdated. Generating test files...")
+    
+    # Run the generation script
+    result = subprocess.run([
+        "bash", str(script_path),
+        str(test_dir / "prompts"),
+        str(test_dir / "schemas"),
+        str(data_file)
+    ], capture_output=True, text=True)
+    
+    if result.returncode != 0:
+        print(f"Error generating test files: {result.stderr}")
+        sys.exit(1)
+    
+    stamp_file.write_text(signature)
+    print("Test files generated successfully!")
 
 
 if __name__ == '__main__':
@@ -2,12 +2,14 @@
 Test configuration for AI Manager using config.yaml
 """
 
+import functools
 import tempfile
 import os
 from pathlib import Path
 
+@functools.lru_cache(maxsize=1)
 def get_test_config():
-    """Load configuration from config.yaml using WL_CONFIG_MANAGER"""
+    """Load configuration from config.yaml using WL_CONFIG_MANAGER (once per process)"""
     try:
         from wl_config_manager import ConfigManager
     except ImportError:
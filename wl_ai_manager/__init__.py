@@ -1,8 +1,40 @@
-from .transcribe import transcribe_audio
-from .text_to_speech import generate_speech
+import importlib
+
+# chat is imported eagerly: the package attribute must be the function, not
+# the wl_ai_manager.chat submodule that importing it would otherwise expose.
 from .chat import chat
-from .prompts import get_prompts
-from .ai_manager import AIManager
-from .image_generation import create_flux_pro_image, init_replicate_client
-from .video_generation import create_veo_video, create_veo_video_from_image
-from .music_generation import create_music, create_music_continuation_chain, create_music_variations
\ No newline at end of file
+
+# Everything else is imported on first access (PEP 562) so importing the
+# package does not pull in the OpenAI SDK, replicate, PIL, soundfile, ...
+_LAZY = {
+    'transcribe_audio': 'transcribe',
+    'generate_speech': 'text_to_speech',
+    'get_prompts': 'prompts',
+    'AIManager': 'ai_manager',
+    'create_flux_pro_image': 'image_generation',
+    'init_replicate_client': 'image_generation',
+    'get_replicate_client': 'replicate_client',
+    'create_veo_video': 'video_generation',
+    'create_veo_video_async': 'video_generation',
+    'create_veo_video_from_image': 'video_generation',
+    'create_veo_videos_batch': 'video_generation',
+    'create_music': 'music_generation',
+    'create_music_async': 'music_generation',
+    'create_music_continuation_chain': 'music_generation',
+    'create_music_variations': 'music_generation',
+}
+
+__all__ = ['chat', *_LAZY]
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        module = importlib.import_module(f".{_LAZY[name]}", __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
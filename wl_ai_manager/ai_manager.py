@@ -1,16 +1,55 @@
+import asyncio
+import functools
+import hashlib
+import itertools
 import logging
 import os
+import re
+import secrets
+import threading
+import weakref
 from pathlib import Path
 
-from .chat import chat
-from .openai import init_openai_client
-from .prompts import get_prompts
-from .text_to_speech import generate_speech
-from .transcribe import transcribe_audio
+from openai import BadRequestError
+
+from .autobatch import ChatBatcher
+from .cache import DiskCache, ResponseCache, copy_file, get_cache_dir, make_cache_key
+from .chat import achat, chat
+from .openai import init_async_openai_client, init_openai_client
+from .prompts import get_required_keys, load_prompts
+from .rate_limit import RateLimitedClient, TokenBucket
 from .schema_validator import SchemaValidator
-from .image_generation import create_flux_pro_image, init_replicate_client
-from .video_generation import create_veo_video, create_veo_video_from_image
-from .music_generation import create_music, create_music_continuation_chain, create_music_variations
+
+# OpenAI json_schema names allow letters, digits, underscores and dashes
+_SCHEMA_NAME_RE = re.compile(r'[^a-zA-Z0-9_-]')
+
+def _is_schema_rejection(error):
+    """
+    Check whether a 400 from the API is about the response_format schema.
+
+    Args:
+        error: openai.BadRequestError
+
+    Returns:
+        True if strict structured outputs refused the schema itself
+    """
+    return error.param == 'response_format' or 'schema' in str(error).lower()
+
+
+# Generated file names: random per-process prefix plus a counter, unique without a syscall per call
+_NONCE = secrets.token_hex(4)
+_COUNTER = itertools.count()
+
+
+def _unique_suffix():
+    """
+    Get a process-unique suffix for generated file names.
+
+    Returns:
+        str: Nonce and counter, e.g. "1a2b3c4d_1f"
+    """
+    return f"{_NONCE}_{next(_COUNTER):x}"
+
 
 class AIManager:
     """
@@ -18,6 +57,10 @@ class AIManager:
     Initializes OpenAI client and provides access to all functions.
     """
 
+    # Instances shared through get_or_create, keyed by id(config)
+    _instances = {}
+    _instances_lock = threading.Lock()
+
     def __init__(self, config):
         """
         Initialize the AI Manager with configuration.
@@ -27,21 +70,105 @@ class AIManager:
         """
         self.config = config
         self.client = init_openai_client(config)
-        self.prompts = get_prompts(config)
+        self.prompts, self.prompt_required_keys, self.prompt_templates = load_prompts(config)
         self.schema_validator = SchemaValidator(config)
+        self._schema_prompts = self._find_schema_prompts()
         self.logger = logging.getLogger(__name__)
+        self._validation_prompts = {}
+        # Schemas the API refused in strict mode, so later calls skip straight to retries
+        self._structured_rejected = {}
+        # Schemas rarely change at runtime, so build their prompts up front
+        for name in self._schema_prompts:
+            self._get_validation_prompt(name)
+        # Async clients and batchers bind to the event loop they first run on,
+        # so each loop gets its own
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._batchers = weakref.WeakKeyDictionary()
+        self._output_dirs = {}
+        # Private loop for the sync wrappers, one caller at a time
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        self._response_cache = ResponseCache(getattr(config, 'response_cache_size', 256))
+        self._disk_cache = self._init_disk_cache(config)
+
+        # Semantic cache is opt-in, enabled by configuring a similarity threshold
+        self._semantic_cache = None
+        threshold = getattr(config, 'semantic_cache_threshold', None)
+        if threshold and self.client:
+            # Imported here so numpy is only loaded when the cache is enabled
+            from .semantic_cache import SemanticCache
+            self._semantic_cache = SemanticCache(
+                self.client,
+                threshold=threshold,
+                model=getattr(config.openai, 'embedding_model', 'text-embedding-3-small'),
+                path=getattr(config, 'semantic_cache_path', None)
+            )
 
         if not self.client:
             self.logger.error("Failed to initialize OpenAI client")
         
+        # Pace API calls below the account rate limits instead of retrying 429s
+        self._openai_limiter = TokenBucket(getattr(config.openai, 'qpm', 500), 60)
+        self._replicate_limiter = None
+
         # Initialize Replicate client if configuration exists
         self.replicate_client = None
         if hasattr(config, 'replicate'):
+            from .image_generation import init_replicate_client
             self.replicate_client = init_replicate_client(config)
-            if not self.replicate_client:
+            if self.replicate_client:
+                self._replicate_limiter = TokenBucket(config.replicate.get('qpm', 60), 60)
+                self.replicate_client = RateLimitedClient(
+                    self.replicate_client,
+                    self._replicate_limiter,
+                    max_in_flight=config.replicate.get('max_in_flight', 8)
+                )
+            else:
                 self.logger.warning("Failed to initialize Replicate client")
 
-    def chat(self, prompt_name, data={}, model=None, validate=False):
+    def _init_disk_cache(self, config):
+        """
+        Open the persistent response cache when config.cache_enabled is set.
+
+        Args:
+            config: Configuration object
+
+        Returns:
+            DiskCache or None if disabled or unavailable
+        """
+        if not getattr(config, 'cache_enabled', False):
+            return None
+        path = getattr(config, 'cache_path', None) or get_cache_dir(config) / "responses.sqlite3"
+        try:
+            return DiskCache(path)
+        except Exception as e:
+            logging.getLogger(__name__).error("Failed to open disk cache %s: %s", path, e)
+            return None
+
+    @classmethod
+    def get_or_create(cls, config):
+        """
+        Get the shared AIManager for a configuration, creating it on first use.
+
+        Reusing one instance per process avoids re-initializing the API
+        clients and reloading prompts and schemas for every caller.
+
+        Args:
+            config: Configuration object with OpenAI settings
+
+        Returns:
+            AIManager instance shared by all callers passing the same config
+        """
+        key = id(config)
+        with cls._instances_lock:
+            entry = cls._instances.get(key)
+            # The config is kept alongside so its id cannot be reused
+            if entry is None or entry[0] is not config:
+                entry = (config, cls(config))
+                cls._instances[key] = entry
+            return entry[1]
+
+    def chat(self, prompt_name, data=None, model=None, validate=False, use_cache=True, stream=False):
         """
         Generate chat completion with optional validation and retry logic.
 
@@ -50,51 +177,231 @@ class AIManager:
             data: Dictionary of data to format the prompt with
             model: OpenAI model to use (defaults to config value)
             validate: Whether to use schema validation with retries (defaults to False)
+            use_cache: Whether to serve identical requests from the response cache
+            stream: Return a generator of text chunks instead of the full text.
+                Streamed responses bypass the cache; ignored when validate=True
+                since validation needs the complete response.
 
         Returns:
             Generated text, structured data if validate=True, or error dict on failure
         """
+        if data is None:
+            data = {}
+
         if not model:
             model = self.config.openai.chat_model
 
         # Check if validation requested and schema available
         if validate and not self.schema_validator.has_schema_for_prompt(prompt_name):
-            self.logger.error(f"Validation requested but no schema found for prompt '{prompt_name}'")
+            self.logger.error("Validation requested but no schema found for prompt '%s'", prompt_name)
             return {
                 'error': f"No schema available for prompt '{prompt_name}'",
                 'prompt_name': prompt_name
             }
 
+        if stream and not validate:
+            return self._chat(
+                prompt_name=prompt_name,
+                data=data,
+                model=model,
+                client=self.client,
+                prompts=self.prompts,
+                required_keys=self.prompt_required_keys.get(prompt_name),
+                template=self.prompt_templates.get(prompt_name),
+                stream=True
+            )
+
+        cache_key = None
+        if use_cache:
+            cache_key = self._request_cache_key(prompt_name, data, model, validate)
+            cached = self._cache_get(cache_key, prompt_name)
+            if cached is not None:
+                return cached
+
+        # Fall back to a similarity match against rephrased requests
+        embedding = None
+        if use_cache and self._semantic_cache:
+            bucket = make_cache_key(prompt_name=prompt_name, model=model, validate=validate)
+            embedding = self._semantic_cache.embed(self._semantic_text(data))
+            if embedding is not None:
+                cached = self._semantic_cache.lookup(bucket, embedding)
+                if cached is not None:
+                    self.logger.debug("Semantic cache hit for prompt '%s'", prompt_name)
+                    return cached
+
         max_retries = getattr(self.config, 'max_validation_retries', 3)
 
         if validate:
-            return self._chat_with_validation(prompt_name, data, model, max_retries)
+            result = self._chat_with_validation(prompt_name, data, model, max_retries)
         else:
             # Normal chat without validation
-            return chat(
+            result = self._chat(
                 prompt_name=prompt_name,
                 data=data,
                 model=model,
                 client=self.client,
-                prompts=self.prompts
+                prompts=self.prompts,
+                required_keys=self.prompt_required_keys.get(prompt_name),
+                template=self.prompt_templates.get(prompt_name)
             )
 
-    def _chat_with_validation(self, prompt_name, data, model, max_retries):
+        if cache_key and not self._is_error_result(result):
+            self._cache_put(cache_key, result)
+            if embedding is not None:
+                self._semantic_cache.add(bucket, embedding, result)
+
+        return result
+
+    def _request_cache_key(self, prompt_name, data, model, validate):
         """
-        Internal method to handle validated chat with retries.
+        Build the response cache key for a chat request.
+
+        The prompt text (and the schema when validating) is part of the key,
+        so editing a prompt or schema file stops old answers being served
+        from the disk cache after a restart. Together with the data, the
+        prompt text determines the formatted messages.
 
         Args:
             prompt_name: Name of the prompt
-            data: Data for prompt formatting
+            data: Dictionary of data to format the prompt with
             model: OpenAI model
-            max_retries: Maximum retry attempts
+            validate: Whether the response is schema-validated
 
         Returns:
-            Structured data or error dict
+            str: Cache key
+        """
+        schema = self.schema_validator.get_schema(prompt_name) if validate else None
+        return make_cache_key(prompt_name=prompt_name, prompt=self.prompts.get(prompt_name),
+                              schema=schema, data=data, model=model, validate=validate)
+
+    def _cache_get(self, cache_key, prompt_name):
+        """
+        Look up a response in the memory cache, then the disk cache.
+
+        Args:
+            cache_key: Key from make_cache_key
+            prompt_name: Name of the prompt (for logging purposes)
+
+        Returns:
+            Cached response or None if not cached
+        """
+        cached = self._response_cache.get(cache_key)
+        if cached is not None:
+            self.logger.debug("Response cache hit for prompt '%s'", prompt_name)
+            return cached
+
+        if self._disk_cache is not None:
+            cached = self._disk_cache.get(cache_key)
+            if cached is not None:
+                self.logger.debug("Disk cache hit for prompt '%s'", prompt_name)
+                self._response_cache.put(cache_key, cached)
+                return cached
+
+        return None
+
+    def _cache_put(self, cache_key, result):
+        """
+        Store a response in the memory cache and the disk cache.
+
+        Args:
+            cache_key: Key from make_cache_key
+            result: Successful response to cache
+        """
+        self._response_cache.put(cache_key, result)
+        if self._disk_cache is not None:
+            self._disk_cache.put(cache_key, result)
+
+    def clear_cache(self):
+        """
+        Clear all cached chat responses.
+        """
+        self._response_cache.clear()
+        if self._disk_cache is not None:
+            self._disk_cache.clear()
+        if self._semantic_cache:
+            self._semantic_cache.clear()
+
+    def close(self):
+        """
+        Persist caches that are configured to survive the process and
+        release the async clients and the private event loop.
+        """
+        if self._semantic_cache:
+            self._semantic_cache.save()
+        if self._disk_cache is not None:
+            self._disk_cache.close()
+            self._disk_cache = None
+        self._close_async_clients()
+
+    def _close_async_clients(self):
+        """
+        Close the async client of every event loop, then the private loop.
+
+        Clients on a loop that is running elsewhere are closed on that loop;
+        clients whose loop is already closed have nothing left to release.
+        """
+        with self._loop_lock:
+            clients = list(self._async_clients.items())
+            self._async_clients.clear()
+            self._batchers.clear()
+            for loop, client in clients:
+                if loop.is_closed():
+                    continue
+                try:
+                    if loop.is_running():
+                        asyncio.run_coroutine_threadsafe(client.close(), loop)
+                    else:
+                        loop.run_until_complete(client.close())
+                except Exception as e:
+                    self.logger.warning("Failed to close async OpenAI client: %s", e)
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.close()
+            self._loop = None
+
+    @staticmethod
+    def _semantic_text(data):
+        """
+        Render prompt data as text for embedding.
+
+        Only the data is embedded since the prompt template is identical for
+        every request in a cache bucket and would dilute the similarity.
+
+        Args:
+            data: Dictionary of prompt data
+
+        Returns:
+            Text representation of the data
+        """
+        return "\n".join(f"{key}: {data[key]}" for key in sorted(data or {}))
+
+    @staticmethod
+    def _is_error_result(result):
+        """
+        Check whether a chat result is a failure that must not be cached.
+
+        Args:
+            result: Value returned by chat or _chat_with_validation
+
+        Returns:
+            True if the result is None or an error dict
+        """
+        if result is None:
+            return True
+        return isinstance(result, dict) and 'error' in result and 'prompt_name' in result
+
+    def _build_validation_prompt(self, prompt_name):
+        """
+        Build the schema-augmented prompt used for validated chat.
+
+        Args:
+            prompt_name: Name of the prompt
+
+        Returns:
+            Tuple of (modified prompt, error dict); one of them is None
         """
         schema_content = self.schema_validator.get_schema_content(prompt_name)
         if not schema_content:
-            return {
+            return None, {
                 'error': f"Schema content not found for prompt '{prompt_name}'",
                 'prompt_name': prompt_name
             }
@@ -102,7 +409,7 @@ class AIManager:
         # Get base prompt
         base_prompt = self.prompts.get(prompt_name)
         if not base_prompt:
-            return {
+            return None, {
                 'error': f"Prompt '{prompt_name}' not found",
                 'prompt_name': prompt_name
             }
@@ -112,16 +419,20 @@ class AIManager:
             if 'user' in base_prompt:
                 base_user_prompt = base_prompt['user']
             else:
-                self.logger.warning(f"Dict prompt '{prompt_name}' missing 'user' key")
+                self.logger.warning("Dict prompt '%s' missing 'user' key", prompt_name)
                 base_user_prompt = str(base_prompt)
         else:
             base_user_prompt = base_prompt
 
+        # The combined prompt is formatted with the request data, so braces
+        # in JSON schema examples must not be read as placeholders
+        schema_text = str(schema_content).replace('{', '{{').replace('}', '}}')
+
         # Get template from config or use default
         template = getattr(self.config, 'schema_prompt_template', None)
         combined_prompt = self.schema_validator.create_schema_prompt(
             base_user_prompt,
-            schema_content,
+            schema_text,
             template
         )
 
@@ -132,33 +443,129 @@ class AIManager:
         else:
             modified_prompt = combined_prompt
 
+        return modified_prompt, None
+
+    def _get_validation_prompt(self, prompt_name):
+        """
+        Get the schema-augmented prompt and its required keys.
+
+        Prompts with a schema are built at init; schemas added later are
+        built on first use.
+
+        Args:
+            prompt_name: Name of the prompt
+
+        Returns:
+            Tuple of (modified prompt, required keys, error dict); the error is
+            None on success, the other two are None on failure
+        """
+        cached = self._validation_prompts.get(prompt_name)
+        if cached is None:
+            modified_prompt, error = self._build_validation_prompt(prompt_name)
+            if error:
+                return None, None, error
+            cached = (modified_prompt, get_required_keys(modified_prompt))
+            self._validation_prompts[prompt_name] = cached
+        return cached[0], cached[1], None
+
+    def _chat_with_validation(self, prompt_name, data, model, max_retries):
+        """
+        Internal method to handle validated chat with retries.
+
+        Args:
+            prompt_name: Name of the prompt
+            data: Data for prompt formatting
+            model: OpenAI model
+            max_retries: Maximum retry attempts
+
+        Returns:
+            Structured data or error dict
+        """
+        # Let the API enforce real JSON schemas, keep the retry loop as fallback
+        schema = self.schema_validator.get_schema(prompt_name)
+        if (isinstance(schema, dict) and getattr(self.config, 'structured_outputs', True)
+                and self._structured_rejected.get(prompt_name) is not schema):
+            result = self._chat_structured(prompt_name, data, model, schema)
+            if result is not None:
+                return result
+            self.logger.warning("Structured output failed for prompt '%s', falling back to retries", prompt_name)
+
+        modified_prompt, required_keys, error = self._get_validation_prompt(prompt_name)
+        if error:
+            return error
+        validator = self.schema_validator.get_validator(prompt_name)
+
+        # Optionally ask for several candidates in one round trip
+        candidates = getattr(self.config, 'validation_candidates', 1)
+        if candidates > 1:
+            result = self._chat_candidates(prompt_name, data, model, modified_prompt, required_keys,
+                                           validator, candidates)
+            if result is not None:
+                return result
+            self.logger.warning("Candidate request failed for prompt '%s', falling back to retries", prompt_name)
+
+        attempt_prompt = modified_prompt
+        # Fail fast on a broken model call or a model repeating itself
+        seen_responses = set()
+        empty_count = 0
+
         # Retry loop
         for attempt in range(max_retries + 1):
             try:
-                # Use temporary prompts dict
-                temp_prompts = self.prompts.copy()
-                temp_prompts[prompt_name] = modified_prompt
-
-                response = chat(
+                response = self._chat(
                     prompt_name=prompt_name,
                     data=data,
                     model=model,
                     client=self.client,
-                    prompts=temp_prompts
+                    prompts=self.prompts,
+                    required_keys=required_keys,
+                    prompt_override=attempt_prompt
                 )
 
                 if not response:
-                    self.logger.error(f"Empty response on attempt {attempt + 1}")
+                    self.logger.error("Empty response on attempt %s", attempt + 1)
+                    empty_count += 1
+                    if empty_count >= 2:
+                        return {
+                            'error': 'Validation stopped after consecutive empty responses',
+                            'attempts': attempt + 1,
+                            'prompt_name': prompt_name
+                        }
                     continue
+                empty_count = 0
 
                 # Validate and sanitize response
-                validation_result = self.schema_validator.validate_structured_response(response)
+                validation_result = self.schema_validator.validate_structured_response(response, validator)
 
                 if validation_result['valid']:
-                    self.logger.info(f"Validation successful on attempt {attempt + 1}")
+                    self.logger.info("Validation successful on attempt %s", attempt + 1)
                     return validation_result['data']
                 else:
-                    self.logger.warning(f"Validation failed on attempt {attempt + 1}: {validation_result['errors']}")
+                    self.logger.warning("Validation failed on attempt %s: %s", attempt + 1, validation_result['errors'])
+                    classification = self.schema_validator.classify_errors(validation_result['errors'])
+
+                    # A structural failure will not fix itself on retry
+                    if not classification['retriable']:
+                        self.logger.warning("Non-retriable validation error for prompt '%s'", prompt_name)
+                        return {
+                            'error': 'Validation failed with a non-retriable error',
+                            'attempts': attempt + 1,
+                            'last_response': response,
+                            'validation_result': validation_result,
+                            'prompt_name': prompt_name
+                        }
+
+                    # The same invalid output again means retrying will not help
+                    if response in seen_responses:
+                        self.logger.warning("Repeated invalid response for prompt '%s'", prompt_name)
+                        return {
+                            'error': 'Validation failed with a repeated response',
+                            'attempts': attempt + 1,
+                            'last_response': response,
+                            'validation_result': validation_result,
+                            'prompt_name': prompt_name
+                        }
+                    seen_responses.add(response)
 
                     # If this is the last attempt, return the failure details
                     if attempt == max_retries:
@@ -170,8 +577,11 @@ class AIManager:
                             'prompt_name': prompt_name
                         }
 
+                    # Tell the next attempt what was wrong
+                    attempt_prompt = self._add_retry_hints(modified_prompt, classification['hints'])
+
             except Exception as e:
-                self.logger.error(f"Exception on attempt {attempt + 1}: {e}")
+                self.logger.error("Exception on attempt %s: %s", attempt + 1, e)
                 if attempt == max_retries:
                     return {
                         'error': f'Exception after all retries: {str(e)}',
@@ -184,6 +594,438 @@ class AIManager:
             'prompt_name': prompt_name
         }
 
+    def _chat_candidates(self, prompt_name, data, model, prompt, required_keys, validator, candidates):
+        """
+        Request several completions in one call and return the first valid one.
+
+        Args:
+            prompt_name: Name of the prompt
+            data: Data for prompt formatting
+            model: OpenAI model
+            prompt: Schema-augmented prompt
+            required_keys: Required data keys of the prompt
+            validator: Compiled validator for the prompt's schema, or None
+            candidates: Number of completions to request
+
+        Returns:
+            Structured data, error dict if no candidate validates, or None if
+            the request itself failed (e.g. the model does not support n > 1)
+        """
+        responses = self._chat(
+            prompt_name=prompt_name,
+            data=data,
+            model=model,
+            client=self.client,
+            prompts=self.prompts,
+            required_keys=required_keys,
+            prompt_override=prompt,
+            n_candidates=candidates
+        )
+        if not responses:
+            return None
+
+        validation_result = None
+        for response in responses:
+            validation_result = self.schema_validator.validate_structured_response(response, validator)
+            if validation_result['valid']:
+                self.logger.info("Validation successful with %s candidates", len(responses))
+                return validation_result['data']
+
+        self.logger.warning("No valid candidate among %s for prompt '%s'", len(responses), prompt_name)
+        return {
+            'error': 'Validation failed for all candidates',
+            'attempts': len(responses),
+            'last_response': responses[-1],
+            'validation_result': validation_result,
+            'prompt_name': prompt_name
+        }
+
+    @staticmethod
+    def _add_retry_hints(prompt, hints):
+        """
+        Append validation hints from a failed attempt to the user prompt.
+
+        Args:
+            prompt: Schema-augmented prompt (string or system/user dict)
+            hints: Hint strings from SchemaValidator.classify_errors
+
+        Returns:
+            Prompt for the next attempt
+        """
+        if not hints:
+            return prompt
+        # Hints quote response values, escape braces so str.format leaves them alone
+        text = "\n\nYour previous response was invalid:\n" + "\n".join(f"- {hint}" for hint in hints)
+        text = text.replace('{', '{{').replace('}', '}}')
+        if isinstance(prompt, dict):
+            prompt = prompt.copy()
+            prompt['user'] = prompt['user'] + text
+            return prompt
+        return prompt + text
+
+    def _chat_structured(self, prompt_name, data, model, schema):
+        """
+        Request schema-conforming JSON using OpenAI structured outputs.
+
+        The schema is enforced server-side, so a single call replaces the
+        prompt-injected schema and client-side retry loop. A schema the API
+        rejects as invalid for strict mode is remembered, and later calls for
+        it go straight to the retry loop until the schema is replaced; any
+        other failure only falls back for this call.
+
+        Args:
+            prompt_name: Name of the prompt
+            data: Data for prompt formatting
+            model: OpenAI model
+            schema: JSON schema dictionary
+
+        Returns:
+            Structured data or None if the request or validation failed
+        """
+        response_format = {
+            "type": "json_schema",
+            "json_schema": {
+                "name": _SCHEMA_NAME_RE.sub('_', prompt_name)[:64],
+                "schema": schema,
+                "strict": True
+            }
+        }
+
+        try:
+            response = self._chat(
+                prompt_name=prompt_name,
+                data=data,
+                model=model,
+                client=self.client,
+                prompts=self.prompts,
+                required_keys=self.prompt_required_keys.get(prompt_name),
+                template=self.prompt_templates.get(prompt_name),
+                response_format=response_format,
+                raise_bad_request=True
+            )
+        except BadRequestError as e:
+            if _is_schema_rejection(e):
+                # A schema outside strict mode's rules (every property required,
+                # additionalProperties false) fails the same way every time
+                self._structured_rejected[prompt_name] = schema
+                self.logger.warning("Strict mode rejected the schema for prompt '%s', not retrying it: %s",
+                                    prompt_name, e)
+            else:
+                self.logger.warning("Structured output request rejected for prompt '%s': %s", prompt_name, e)
+            return None
+        if not response:
+            return None
+
+        validation_result = self.schema_validator.validate_json_string(response, prompt_name)
+        if not validation_result['valid']:
+            self.logger.warning("Structured output failed validation: %s", validation_result['errors'])
+            return None
+
+        self.logger.info("Structured output successful for prompt '%s'", prompt_name)
+        return validation_result['data']
+
+    def _chat(self, **kwargs):
+        """
+        Call chat() once the OpenAI rate limiter allows another request.
+
+        Args:
+            **kwargs: chat() keyword arguments
+
+        Returns:
+            chat() result
+        """
+        self._openai_limiter.acquire()
+        return chat(**kwargs)
+
+    async def _achat(self, **kwargs):
+        """
+        Call achat() once the OpenAI rate limiter allows another request.
+
+        Args:
+            **kwargs: achat() keyword arguments
+
+        Returns:
+            achat() result
+        """
+        await self._openai_limiter.acquire_async()
+        return await achat(**kwargs)
+
+    def _get_async_client(self):
+        """
+        Get the async OpenAI client for the running event loop.
+
+        Its connection pool is bound to the loop it is first used on, so
+        each loop gets its own client, created on first use.
+
+        Returns:
+            AsyncOpenAI client or None on failure
+        """
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = init_async_openai_client(self.config)
+            if not client:
+                self.logger.error("Failed to initialize async OpenAI client")
+                return None
+            self._async_clients[loop] = client
+        return client
+
+    def _get_batcher(self):
+        """
+        Get the request batcher for the running event loop when
+        config.autobatch is enabled.
+
+        Returns:
+            ChatBatcher or None if batching is disabled
+        """
+        if not getattr(self.config, 'autobatch', False):
+            return None
+        loop = asyncio.get_running_loop()
+        batcher = self._batchers.get(loop)
+        if batcher is None:
+            batcher = ChatBatcher(
+                self._get_async_client(),
+                self.prompts,
+                max_batch=getattr(self.config, 'autobatch_max_batch', 32),
+                max_wait_ms=getattr(self.config, 'autobatch_max_wait_ms', 10)
+            )
+            self._batchers[loop] = batcher
+        return batcher
+
+    async def achat_with_validation(self, prompt_name, data=None, model=None, attempts=None):
+        """
+        Validated chat that issues attempts speculatively in parallel.
+
+        Instead of retrying sequentially after each validation failure, all
+        attempts are sent at once and the first response that validates wins;
+        the remaining requests are cancelled.
+
+        Args:
+            prompt_name: Name of the prompt to use
+            data: Dictionary of data to format the prompt with
+            model: OpenAI model to use (defaults to config value)
+            attempts: Number of parallel attempts (defaults to
+                config.speculative_validation_attempts or max_validation_retries + 1)
+
+        Returns:
+            Structured data or error dict on failure
+        """
+        if not model:
+            model = self.config.openai.chat_model
+
+        if not self.schema_validator.has_schema_for_prompt(prompt_name):
+            self.logger.error("Validation requested but no schema found for prompt '%s'", prompt_name)
+            return {
+                'error': f"No schema available for prompt '{prompt_name}'",
+                'prompt_name': prompt_name
+            }
+
+        modified_prompt, required_keys, error = self._get_validation_prompt(prompt_name)
+        if error:
+            return error
+        validator = self.schema_validator.get_validator(prompt_name)
+
+        if not attempts:
+            max_retries = getattr(self.config, 'max_validation_retries', 3)
+            attempts = getattr(self.config, 'speculative_validation_attempts', max_retries + 1)
+
+        client = self._get_async_client()
+
+        tasks = [
+            asyncio.ensure_future(self._achat(
+                prompt_name=prompt_name,
+                data=data,
+                model=model,
+                client=client,
+                prompts=self.prompts,
+                required_keys=required_keys,
+                prompt_override=modified_prompt
+            ))
+            for _ in range(attempts)
+        ]
+
+        last_response = None
+        validation_result = None
+        try:
+            for completed in asyncio.as_completed(tasks):
+                response = await completed
+                if not response:
+                    continue
+
+                last_response = response
+                validation_result = self.schema_validator.validate_structured_response(response, validator)
+                if validation_result['valid']:
+                    self.logger.info("Speculative validation successful for prompt '%s'", prompt_name)
+                    return validation_result['data']
+
+                self.logger.warning("Speculative attempt failed validation: %s", validation_result['errors'])
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return {
+            'error': 'Validation failed for all speculative attempts',
+            'attempts': attempts,
+            'last_response': last_response,
+            'validation_result': validation_result,
+            'prompt_name': prompt_name
+        }
+
+    def chat_speculative(self, prompt_name, data=None, model=None, attempts=None):
+        """
+        Synchronous wrapper around achat_with_validation.
+
+        Must not be called from a running event loop; await
+        achat_with_validation there instead.
+
+        Args:
+            prompt_name: Name of the prompt to use
+            data: Dictionary of data to format the prompt with
+            model: OpenAI model to use (defaults to config value)
+            attempts: Number of parallel attempts
+
+        Returns:
+            Structured data or error dict on failure
+        """
+        return self._run_sync(self.achat_with_validation(prompt_name, data, model, attempts))
+
+    async def achat(self, prompt_name, data=None, model=None, validate=False, use_cache=True):
+        """
+        Generate a chat completion without blocking the event loop.
+
+        Unvalidated requests use the async OpenAI client and the exact-match
+        response cache. With config.autobatch enabled, concurrent unvalidated
+        requests for the same prompt and model are sent as one batched call.
+        Validated requests run chat() in a worker thread so they keep the
+        same retry and structured-output behaviour.
+
+        Args:
+            prompt_name: Name of the prompt to use
+            data: Dictionary of data to format the prompt with
+            model: OpenAI model to use (defaults to config value)
+            validate: Whether to use schema validation with retries
+            use_cache: Whether to serve identical requests from the response cache
+
+        Returns:
+            Generated text, structured data if validate=True, or error dict on failure
+        """
+        if validate:
+            return await self._run_in_thread(
+                self.chat, prompt_name, data, model, validate=True, use_cache=use_cache
+            )
+
+        if data is None:
+            data = {}
+
+        if not model:
+            model = self.config.openai.chat_model
+
+        cache_key = None
+        if use_cache:
+            cache_key = self._request_cache_key(prompt_name, data, model, False)
+            cached = self._cache_get(cache_key, prompt_name)
+            if cached is not None:
+                return cached
+
+        batcher = self._get_batcher()
+        if batcher:
+            # Batched requests take a token each, an upper bound on the API calls made
+            await self._openai_limiter.acquire_async()
+            result = await batcher.submit(
+                prompt_name,
+                data,
+                model,
+                required_keys=self.prompt_required_keys.get(prompt_name),
+                template=self.prompt_templates.get(prompt_name)
+            )
+        else:
+            result = await self._achat(
+                prompt_name=prompt_name,
+                data=data,
+                model=model,
+                client=self._get_async_client(),
+                prompts=self.prompts,
+                required_keys=self.prompt_required_keys.get(prompt_name),
+                template=self.prompt_templates.get(prompt_name)
+            )
+
+        if cache_key and not self._is_error_result(result):
+            self._cache_put(cache_key, result)
+
+        return result
+
+    async def achat_batch(self, requests):
+        """
+        Run many chat requests concurrently.
+
+        At most config.max_concurrent_requests (default 20) requests are in
+        flight at once to stay within API rate limits.
+
+        Args:
+            requests: List of dicts with achat() keyword arguments
+                (prompt_name, data, model, validate, use_cache)
+
+        Returns:
+            List of results in request order; a failed request yields its exception
+        """
+        semaphore = asyncio.Semaphore(getattr(self.config, 'max_concurrent_requests', 20))
+
+        async def run(request):
+            async with semaphore:
+                return await self.achat(**request)
+
+        return await asyncio.gather(*(run(request) for request in requests), return_exceptions=True)
+
+    def chat_batch(self, requests):
+        """
+        Synchronous wrapper around achat_batch.
+
+        Must not be called from a running event loop; await achat_batch
+        there instead.
+
+        Args:
+            requests: List of dicts with chat() keyword arguments
+                (prompt_name, data, model, validate, use_cache)
+
+        Returns:
+            List of results in request order; a failed request yields its exception
+        """
+        return self._run_sync(self.achat_batch(requests))
+
+    def _run_sync(self, coroutine):
+        """
+        Run a coroutine to completion from synchronous code.
+
+        A private event loop is reused across calls so connections pooled by
+        its async client stay bound to a live loop. A loop can only run in
+        one thread at a time, so concurrent callers take turns.
+
+        Args:
+            coroutine: Coroutine to run
+
+        Returns:
+            The coroutine's result
+        """
+        with self._loop_lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+            return self._loop.run_until_complete(coroutine)
+
+    async def _run_in_thread(self, func, *args, **kwargs):
+        """
+        Run a blocking call in the default executor.
+
+        Args:
+            func: Function to call
+            *args: Positional arguments for func
+            **kwargs: Keyword arguments for func
+
+        Returns:
+            The function's result
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
     def get_schema_prompts(self):
         """
         Get list of prompts that have corresponding .schema.txt files.
@@ -191,9 +1033,16 @@ class AIManager:
         Returns:
             List of prompt names that have schema examples available
         """
-        available_schemas = set(self.schema_validator.list_schemas())
-        available_prompts = set(self.prompts.keys())
-        return list(available_schemas.intersection(available_prompts))
+        return list(self._schema_prompts)
+
+    def _find_schema_prompts(self):
+        """
+        Find the prompts that have a schema, computed once at init.
+
+        Returns:
+            Tuple of prompt names with schema examples available
+        """
+        return tuple(name for name in self.prompts if self.schema_validator.has_schema_for_prompt(name))
 
     def validate_response_for_prompt(self, response, prompt_name):
         """
@@ -242,6 +1091,8 @@ class AIManager:
             schema: JSON schema dictionary
         """
         self.schema_validator.add_schema(name, schema)
+        self._schema_prompts = self._find_schema_prompts()
+        self._validation_prompts.pop(name, None)
 
     def get_available_schemas(self):
         """
@@ -260,29 +1111,36 @@ class AIManager:
             text: Text to convert to speech
             voice: Voice to use (defaults to config value)
             model: TTS model to use (defaults to config value)
-            output_path: Path where to save WAV file (optional)
+            output_path: Path where to save WAV file (optional). Without it the
+                file is named after a hash of the text, voice and model, and an
+                existing file for the same input is returned without an API call.
 
         Returns:
-            True on success or None on failure
+            Output path on success or None on failure
         """
+        from .text_to_speech import generate_speech
+
         if not voice:
             voice = self.config.openai.tts_voice
 
         if not model:
             model = self.config.openai.tts_model
 
+        overwrite = True
         if not output_path:
-            # Generate a default output path if none provided
-            output_dir = Path(self.config.output_dir) / "speech"
-            output_dir.mkdir(parents=True, exist_ok=True)
-            output_path = output_dir / f"speech_{os.urandom(4).hex()}.wav"
+            # Name default outputs by content so repeated text reuses the file
+            output_dir = self._output_dir('speech')
+            key = hashlib.sha256(f"{model}|{voice}|{text}".encode('utf-8')).hexdigest()
+            output_path = output_dir / f"speech_{key}.wav"
+            overwrite = False
 
         return generate_speech(
             text=text,
             voice=voice,
             model=model,
             output_path=str(output_path),
-            client=self.client
+            client=self.client,
+            overwrite=overwrite
         )
 
     def transcribe_audio(self, audio_data=None, audio_path=None):
@@ -296,9 +1154,12 @@ class AIManager:
         Returns:
             Transcribed text or None on failure
         """
+        from .transcribe import transcribe_audio
+
         return transcribe_audio(
             audio_data=audio_data,
             audio_path=audio_path,
+            config=self.config,
             client=self.client
         )
 
@@ -320,18 +1181,40 @@ class AIManager:
         Returns:
             Path to generated image or None on failure
         """
+        from .image_generation import build_flux_request, create_flux_pro_image
+
         if not self.replicate_client:
             self.logger.error("Replicate client not initialized. Check configuration.")
             return None
         
+        # Identical requests reuse the stored image instead of paying again
+        cache_key = None
+        cached_path = None
+        if self._disk_cache is not None:
+            model_name, flux_config = build_flux_request(prompt, width, height, self.config)
+            cache_key = make_cache_key(kind='image', model=model_name, params=flux_config,
+                                       file_type=file_type.lower(), crop=crop, resize=resize)
+            cached_path = self._disk_cache.get(cache_key)
+            if cached_path and not os.path.exists(cached_path):
+                cached_path = None
+        
+        if cached_path and not file_name and not folder:
+            self.logger.debug("Disk cache hit for image: %s", cached_path)
+            return cached_path
+        
         # Set defaults
         if not file_name:
-            file_name = f"flux_image_{os.urandom(4).hex()}"
+            file_name = f"flux_image_{_unique_suffix()}"
         
         if not folder:
-            folder = os.path.join(getattr(self.config, 'output_dir', '.'), 'images')
+            folder = self._output_dir('images')
         
-        return create_flux_pro_image(
+        if cached_path:
+            self.logger.debug("Disk cache hit for image: %s", cached_path)
+            output_path = os.path.join(folder, f"{os.path.splitext(file_name)[0]}.{file_type.lower()}")
+            return self._reuse_output(cached_path, output_path)
+        
+        result = create_flux_pro_image(
             file_name=file_name,
             folder=folder,
             prompt=prompt,
@@ -343,6 +1226,48 @@ class AIManager:
             client=self.replicate_client,
             config=self.config
         )
+        
+        if cache_key and result:
+            self._disk_cache.put(cache_key, os.path.abspath(result))
+        return result
+
+    def _output_dir(self, kind):
+        """
+        Get the default output folder for a kind of media, created on first use.
+
+        Args:
+            kind: Subfolder of config.output_dir ('speech', 'images', 'videos', 'music')
+
+        Returns:
+            Path: Existing output folder
+        """
+        output_dir = self._output_dirs.get(kind)
+        if output_dir is None:
+            output_dir = Path(getattr(self.config, 'output_dir', '.')) / kind
+            output_dir.mkdir(parents=True, exist_ok=True)
+            self._output_dirs[kind] = output_dir
+        return output_dir
+
+    def _reuse_output(self, cached_path, output_path):
+        """
+        Place a previously generated file at the requested output path.
+
+        Args:
+            cached_path: Path of the cached file
+            output_path: Path the caller asked for
+
+        Returns:
+            Output path or None on failure
+        """
+        if os.path.abspath(cached_path) == os.path.abspath(output_path):
+            return output_path
+        try:
+            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+            copy_file(cached_path, output_path)
+            return output_path
+        except OSError as e:
+            self.logger.error("Failed to copy cached file %s to %s: %s", cached_path, output_path, e)
+            return None
 
     def generate_video(self, prompt, file_name=None, folder=None, duration=5, 
                       aspect_ratio="16:9"):
@@ -359,16 +1284,18 @@ class AIManager:
         Returns:
             Path to generated video or None on failure
         """
+        from .video_generation import create_veo_video
+
         if not self.replicate_client:
             self.logger.error("Replicate client not initialized. Check configuration.")
             return None
         
         # Set defaults
         if not file_name:
-            file_name = f"veo_video_{os.urandom(4).hex()}"
+            file_name = f"veo_video_{_unique_suffix()}"
         
         if not folder:
-            folder = os.path.join(getattr(self.config, 'output_dir', '.'), 'videos')
+            folder = self._output_dir('videos')
         
         return create_veo_video(
             prompt=prompt,
@@ -396,16 +1323,18 @@ class AIManager:
         Returns:
             Path to generated video or None on failure
         """
+        from .video_generation import create_veo_video_from_image
+
         if not self.replicate_client:
             self.logger.error("Replicate client not initialized. Check configuration.")
             return None
         
         # Set defaults
         if not file_name:
-            file_name = f"veo_video_{os.urandom(4).hex()}"
+            file_name = f"veo_video_{_unique_suffix()}"
         
         if not folder:
-            folder = os.path.join(getattr(self.config, 'output_dir', '.'), 'videos')
+            folder = self._output_dir('videos')
         
         return create_veo_video_from_image(
             image_path=image_path,
@@ -439,16 +1368,18 @@ class AIManager:
         Returns:
             Path to generated music file or None on failure
         """
+        from .music_generation import create_music
+
         if not self.replicate_client:
             self.logger.error("Replicate client not initialized. Check configuration.")
             return None
         
         # Set defaults
         if not file_name:
-            file_name = f"music_{os.urandom(4).hex()}"
+            file_name = f"music_{_unique_suffix()}"
         
         if not folder:
-            folder = os.path.join(getattr(self.config, 'output_dir', '.'), 'music')
+            folder = self._output_dir('music')
         
         return create_music(
             prompt=prompt,
@@ -479,12 +1410,14 @@ class AIManager:
         Returns:
             List of generated file paths
         """
+        from .music_generation import create_music_continuation_chain
+
         if not self.replicate_client:
             self.logger.error("Replicate client not initialized.")
             return []
         
         if not folder:
-            folder = os.path.join(getattr(self.config, 'output_dir', '.'), 'music')
+            folder = self._output_dir('music')
         
         return create_music_continuation_chain(
             prompts=prompts,
@@ -496,7 +1429,7 @@ class AIManager:
         )
     
     def generate_music_variations(self, base_prompt, variations, folder=None,
-                                base_file_name="variation", duration=30):
+                                base_file_name="variation", duration=30, parallel=True):
         """
         Generate music variations based on a base prompt.
         
@@ -506,16 +1439,19 @@ class AIManager:
             folder: Output folder
             base_file_name: Base name for files
             duration: Duration for each variation
+            parallel: Generate up to replicate.max_concurrency variations at once
             
         Returns:
             List of generated file paths
         """
+        from .music_generation import create_music_variations
+
         if not self.replicate_client:
             self.logger.error("Replicate client not initialized.")
             return []
         
         if not folder:
-            folder = os.path.join(getattr(self.config, 'output_dir', '.'), 'music')
+            folder = self._output_dir('music')
         
         return create_music_variations(
             base_prompt=base_prompt,
@@ -524,7 +1460,99 @@ class AIManager:
             base_file_name=base_file_name,
             duration=duration,
             client=self.replicate_client,
-            config=self.config
+            config=self.config,
+            parallel=parallel
+        )
+
+    async def agenerate_speech(self, text, **kwargs):
+        """
+        Async counterpart of generate_speech for use with asyncio.gather.
+
+        Args:
+            text: Text to convert to speech
+            **kwargs: generate_speech() keyword arguments
+
+        Returns:
+            Output path on success or None on failure
+        """
+        return await self._run_in_thread(self.generate_speech, text, **kwargs)
+
+    async def agenerate_image(self, prompt, **kwargs):
+        """
+        Async counterpart of generate_image for use with asyncio.gather.
+
+        Args:
+            prompt: Text prompt for image generation
+            **kwargs: generate_image() keyword arguments
+
+        Returns:
+            Path to generated image or None on failure
+        """
+        return await self._run_in_thread(self.generate_image, prompt, **kwargs)
+
+    async def agenerate_video(self, prompt, **kwargs):
+        """
+        Async counterpart of generate_video for use with asyncio.gather.
+
+        Args:
+            prompt: Text prompt for video generation
+            **kwargs: generate_video() keyword arguments
+
+        Returns:
+            Path to generated video or None on failure
+        """
+        return await self._run_in_thread(self.generate_video, prompt, **kwargs)
+
+    async def agenerate_music(self, prompt, **kwargs):
+        """
+        Async counterpart of generate_music for use with asyncio.gather.
+
+        Args:
+            prompt: Text prompt for music generation
+            **kwargs: generate_music() keyword arguments
+
+        Returns:
+            Path to generated music file or None on failure
+        """
+        return await self._run_in_thread(self.generate_music, prompt, **kwargs)
+
+    async def agenerate_music_variations(self, base_prompt, variations, folder=None,
+                                         base_file_name="variation", duration=30):
+        """
+        Generate music variations concurrently.
+
+        Up to replicate.max_concurrency (default 4) variations are generated
+        at once. Chains stay sequential in generate_music_chain, since each
+        segment continues from the previous one.
+
+        Args:
+            base_prompt: Base music description
+            variations: List of variation descriptions
+            folder: Output folder
+            base_file_name: Base name for files
+            duration: Duration for each variation
+
+        Returns:
+            List of generated file paths
+        """
+        from .music_generation import create_music_variations_async
+
+        if not self.replicate_client:
+            self.logger.error("Replicate client not initialized.")
+            return []
+
+        if not folder:
+            folder = self._output_dir('music')
+
+        return await create_music_variations_async(
+            base_prompt=base_prompt,
+            variation_prompts=variations,
+            folder=folder,
+            base_file_name=base_file_name,
+            duration=duration,
+            client=self.replicate_client,
+            config=self.config,
+            max_concurrency=self.config.replicate.get('max_concurrency', 4)
         )
 
     def get_prompts(self):
@@ -0,0 +1,241 @@
+"""
+Micro-batching module for ai_manager.
+Coalesces concurrent chat requests for the same prompt and model into a
+single API call whose answer is a JSON array, one element per request.
+"""
+
+import asyncio
+import logging
+
+import orjson
+
+from .chat import achat, build_messages, prompt_cache_key
+
+logger = logging.getLogger(__name__)
+
+_BATCH_INSTRUCTIONS = (
+    "Answer each of the following {count} requests independently.\n"
+    "Respond with only a JSON array of {count} strings, where element i is the "
+    "complete answer to request i.\n\n"
+)
+
+
+def build_batch_messages(messages_list):
+    """
+    Combine the messages of several requests into one batched request.
+
+    All requests come from the same prompt, so the shared system message is
+    sent once and the user messages are numbered in a single user message.
+
+    Args:
+        messages_list: Chat messages of each request, from build_messages
+
+    Returns:
+        list: Chat messages for the combined request
+    """
+    messages = [message for message in messages_list[0] if message['role'] == 'system']
+
+    parts = [_BATCH_INSTRUCTIONS.format(count=len(messages_list))]
+    for index, request_messages in enumerate(messages_list, 1):
+        user = next((m['content'] for m in request_messages if m['role'] == 'user'), '')
+        parts.append(f"Request {index}:\n{user}\n\n")
+
+    messages.append({"role": "user", "content": "".join(parts).rstrip()})
+    return messages
+
+
+def parse_batch_response(text, count):
+    """
+    Split a batched response into the answers of each request.
+
+    Args:
+        text: Response text of the combined request
+        count: Number of requests in the batch
+
+    Returns:
+        list: One answer string per request or None if the response is unusable
+    """
+    try:
+        answers = orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return None
+
+    if not isinstance(answers, list) or len(answers) != count:
+        return None
+    return [answer if isinstance(answer, str) else orjson.dumps(answer).decode('utf-8')
+            for answer in answers]
+
+
+class _Batch:
+    """
+    Requests waiting to be sent together.
+    """
+
+    __slots__ = ('items', 'timer')
+
+    def __init__(self):
+        self.items = []
+        self.timer = None
+
+
+class ChatBatcher:
+    """
+    Coalesce concurrent async chat requests into batched API calls.
+
+    Requests for the same prompt and model that arrive within max_wait_ms
+    of each other are sent as one request, up to max_batch at a time. A
+    batch of one, or a batched answer that cannot be split, falls back to
+    individual requests.
+    """
+
+    def __init__(self, client, prompts, max_batch=32, max_wait_ms=10):
+        """
+        Initialize the batcher.
+
+        Args:
+            client: Initialized AsyncOpenAI client
+            prompts: Dictionary of loaded prompts
+            max_batch: Maximum number of requests per API call
+            max_wait_ms: How long the first request waits for others to join
+        """
+        self.client = client
+        self.prompts = prompts
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._batches = {}
+
+    async def submit(self, prompt_name, data, model, required_keys=None, template=None):
+        """
+        Queue a chat request and wait for its answer.
+
+        Args:
+            prompt_name: Name of the prompt to use
+            data: Dictionary of data to format the prompt with
+            model: OpenAI model to use
+            required_keys: Precomputed placeholder names for the prompt (optional)
+            template: Pre-parsed user template from parse_template (optional)
+
+        Returns:
+            str: Generated text or None on failure
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (prompt_name, model)
+
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _Batch()
+            batch.timer = loop.call_later(self.max_wait, self._flush, key, batch)
+        batch.items.append((data, required_keys, template, future))
+
+        if len(batch.items) >= self.max_batch:
+            batch.timer.cancel()
+            self._flush(key, batch)
+
+        return await future
+
+    def _flush(self, key, batch):
+        """
+        Send a batch once it is full or its wait window has passed.
+
+        Args:
+            key: (prompt_name, model) the batch belongs to
+            batch: Batch to send
+        """
+        if self._batches.get(key) is batch:
+            del self._batches[key]
+        asyncio.ensure_future(self._send(key[0], key[1], batch.items))
+
+    async def _send(self, prompt_name, model, items):
+        """
+        Send a batch and resolve the futures of its requests.
+
+        Args:
+            prompt_name: Name of the prompt
+            model: OpenAI model
+            items: (data, required_keys, template, future) tuples
+        """
+        try:
+            if len(items) == 1:
+                results = [await self._send_single(prompt_name, model, items[0])]
+            else:
+                results = await self._send_batch(prompt_name, model, items)
+        except Exception as e:
+            logger.error("Error sending chat batch for prompt '%s': %s", prompt_name, e)
+            results = [None] * len(items)
+
+        for (_, _, _, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _send_single(self, prompt_name, model, item):
+        """
+        Send one request on its own.
+
+        Args:
+            prompt_name: Name of the prompt
+            model: OpenAI model
+            item: (data, required_keys, template, future) tuple
+
+        Returns:
+            str: Generated text or None on failure
+        """
+        data, required_keys, template, _ = item
+        return await achat(
+            prompt_name=prompt_name,
+            data=data,
+            model=model,
+            client=self.client,
+            prompts=self.prompts,
+            required_keys=required_keys,
+            template=template
+        )
+
+    async def _send_batch(self, prompt_name, model, items):
+        """
+        Send several requests as one combined API call.
+
+        Args:
+            prompt_name: Name of the prompt
+            model: OpenAI model
+            items: (data, required_keys, template, future) tuples
+
+        Returns:
+            list: Generated text (or None) for each item
+        """
+        results = [None] * len(items)
+        batched = []
+        for index, (data, required_keys, template, _) in enumerate(items):
+            try:
+                messages = build_messages(prompt_name, data, self.prompts, required_keys,
+                                          template=template)
+            except KeyError as key_err:
+                logger.error("KeyError: Missing data for formatting - %s", key_err)
+                continue
+            if messages:
+                batched.append((index, messages))
+
+        if len(batched) < 2:
+            for index, _ in batched:
+                results[index] = await self._send_single(prompt_name, model, items[index])
+            return results
+
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=build_batch_messages([messages for _, messages in batched]),
+            extra_body={"prompt_cache_key": prompt_cache_key(prompt_name)}
+        )
+        answers = parse_batch_response(response.choices[0].message.content.strip(), len(batched))
+
+        if answers is None:
+            logger.warning("Could not split batched response for prompt '%s', sending %s requests individually",
+                           prompt_name, len(batched))
+            answers = await asyncio.gather(*(
+                self._send_single(prompt_name, model, items[index]) for index, _ in batched
+            ))
+        else:
+            logger.info("Batched %s requests for prompt '%s' into one call", len(batched), prompt_name)
+
+        for (index, _), answer in zip(batched, answers):
+            results[index] = answer
+        return results
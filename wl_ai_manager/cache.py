@@ -0,0 +1,386 @@
+"""
+Response caching module for ai_manager.
+Provides an in-memory LRU cache and a persistent SQLite cache for AI
+responses keyed by request content, and a file store for generated media.
+"""
+
+import copy
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_CACHE_DIR = Path.home() / ".cache" / "wl_ai_manager"
+
+
+def get_cache_dir(config):
+    """
+    Get the directory for on-disk caches.
+
+    Args:
+        config: Configuration object, cache_dir overrides the default
+
+    Returns:
+        Path: config.cache_dir or ~/.cache/wl_ai_manager
+    """
+    return Path(getattr(config, 'cache_dir', None) or _DEFAULT_CACHE_DIR).expanduser()
+
+
+def make_cache_key(**parts):
+    """
+    Build a stable cache key from request parts.
+
+    Args:
+        **parts: Values identifying the request (prompt name, data, model, ...)
+
+    Returns:
+        str: Hex digest uniquely identifying the request
+    """
+    payload = orjson.dumps(parts, default=str,
+                           option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """
+    Thread-safe exact-match LRU cache for AI responses.
+    """
+
+    def __init__(self, maxsize=256):
+        """
+        Initialize the response cache.
+
+        Args:
+            maxsize: Maximum number of cached responses (0 disables caching)
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Get a cached response.
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            Cached response or None if not cached
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            value = self._entries[key]
+
+        # Structured responses are mutable, hand out a private copy
+        if isinstance(value, str):
+            return value
+        return copy.deepcopy(value)
+
+    def put(self, key, value):
+        """
+        Store a response in the cache.
+
+        Args:
+            key: Cache key from make_cache_key
+            value: Response to cache
+        """
+        if self.maxsize <= 0 or value is None:
+            return
+
+        if not isinstance(value, str):
+            value = copy.deepcopy(value)
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove all cached responses.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache:
+    """
+    Thread-safe persistent cache backed by SQLite.
+
+    Values are stored as JSON, so cached responses survive restarts and
+    re-running a batch job does not pay for identical requests twice.
+    """
+
+    def __init__(self, path):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path: Path to the SQLite database file
+        """
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value BLOB NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, key):
+        """
+        Get a cached value.
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            Cached value or None if not cached
+        """
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+            return orjson.loads(row[0]) if row else None
+        except Exception as e:
+            logger.warning("Failed to read disk cache: %s", e)
+            return None
+
+    def put(self, key, value):
+        """
+        Store a value in the cache.
+
+        Args:
+            key: Cache key from make_cache_key
+            value: JSON-serializable value to cache
+        """
+        if value is None:
+            return
+
+        try:
+            payload = orjson.dumps(value)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value) VALUES (?, ?)", (key, payload)
+                )
+                self._conn.commit()
+        except Exception as e:
+            logger.warning("Failed to write disk cache: %s", e)
+
+    def delete(self, key):
+        """
+        Remove a cached value.
+
+        Args:
+            key: Cache key from make_cache_key
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        """
+        Remove all cached values.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self):
+        """
+        Close the database connection.
+        """
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+# copy_file_range errors that mean "not possible here", not a failed copy
+_COPY_RANGE_UNSUPPORTED = frozenset({errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP})
+
+
+def copy_file(source, destination):
+    """
+    Copy a file without moving its bytes through user space.
+
+    Uses os.copy_file_range where available (Linux), which stays in the
+    kernel and lets filesystems such as Btrfs and XFS share extents instead
+    of copying them. Falls back to shutil.copyfile (sendfile on Linux) when
+    the call is unsupported, e.g. across filesystems on newer kernels, or
+    returns 0 before the whole file is copied.
+
+    Args:
+        source: Path of the file to copy
+        destination: Path to write, replaced if it exists
+    """
+    if hasattr(os, 'copy_file_range'):
+        try:
+            with open(source, 'rb') as src, open(destination, 'wb') as dst:
+                remaining = os.fstat(src.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                    if not copied:
+                        # Some filesystems stop short of EOF; copyfile redoes it
+                        break
+                    remaining -= copied
+            if remaining <= 0:
+                return
+            logger.debug("copy_file_range stopped early, falling back to copyfile")
+        except OSError as e:
+            if e.errno not in _COPY_RANGE_UNSUPPORTED:
+                raise
+            logger.debug("copy_file_range unavailable (%s), falling back to copyfile", e)
+    shutil.copyfile(source, destination)
+
+
+class FileCache:
+    """
+    Content-addressed store for generated media files.
+
+    Files are named by their request key, so an identical request is served
+    by copying the stored file instead of calling the model again. When
+    max_bytes is set, the least recently used files are evicted once the
+    store grows past it.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        """
+        Initialize the file cache.
+
+        Args:
+            directory: Folder holding the cached files (created if missing)
+            max_bytes: Size cap for the folder (optional)
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def get(self, key, suffix):
+        """
+        Get the cached file for a request.
+
+        Args:
+            key: Cache key from make_cache_key
+            suffix: File extension including the dot, e.g. ".wav"
+
+        Returns:
+            Path of the cached file or None if not cached
+        """
+        path = self.directory / f"{key}{suffix}"
+        try:
+            # Touch on hit so eviction sees it as recently used
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, key, source, suffix):
+        """
+        Store a copy of a generated file.
+
+        Args:
+            key: Cache key from make_cache_key
+            source: Path of the generated file
+            suffix: File extension including the dot, e.g. ".wav"
+
+        Returns:
+            Path of the cached file or None on failure
+        """
+        path = self.directory / f"{key}{suffix}"
+        # Unique per put, so threads storing the same key never share a temp file
+        temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            copy_file(source, temp_path)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.error("Failed to cache %s: %s", source, e)
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            return None
+        if self.max_bytes:
+            self._evict()
+        return path
+
+    def _evict(self):
+        """
+        Delete least recently used files until the folder fits max_bytes.
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.is_file() and not entry.name.endswith(".tmp"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(entries):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                total -= size
+                logger.debug("Evicted cached file %s", path)
+                if total <= self.max_bytes:
+                    break
+
+
+_media_caches = {}
+_media_caches_lock = threading.Lock()
+
+
+def get_media_cache(config, kind):
+    """
+    Get the shared media cache for one kind of generated file.
+
+    Enabled by config.cache_enabled. Files live in <cache_dir>/<kind>,
+    capped at config.media_cache_max_mb (default 1024) per kind with least
+    recently used files evicted first.
+
+    Args:
+        config: Configuration object
+        kind: Media type and folder name, e.g. "music" or "video"
+
+    Returns:
+        FileCache or None if caching is disabled or unavailable
+    """
+    if not getattr(config, 'cache_enabled', False):
+        return None
+    directory = get_cache_dir(config) / kind
+    with _media_caches_lock:
+        cache = _media_caches.get(directory)
+        if cache is None:
+            try:
+                cache = FileCache(directory, getattr(config, 'media_cache_max_mb', 1024) * 1024 * 1024)
+            except OSError as e:
+                logger.error("Failed to open %s cache %s: %s", kind, directory, e)
+                return None
+            _media_caches[directory] = cache
+    return cache
@@ -1,90 +1,255 @@
-import re
-import os
-import io
-import requests
-from datetime import datetime
-import openai
+import hashlib
 import logging
 
+from openai import BadRequestError
+
+from .prompts import format_template, get_required_keys
+
 logger = logging.getLogger(__name__)
 
-def chat(prompt_name, data={}, model=None, client=None,prompts=None):
+def prompt_cache_key(prompt_name):
+    """
+    Build the OpenAI prompt cache key for a prompt.
+
+    Args:
+        prompt_name: Name of the prompt
+
+    Returns:
+        str: Stable key shared by every request using this prompt
+    """
+    return hashlib.sha1(prompt_name.encode('utf-8')).hexdigest()
+
+
+def build_messages(prompt_name, data, prompts, required_keys=None, prompt_override=None,
+                   template=None):
+    """
+    Build the chat messages for a named prompt.
+
+    Args:
+        prompt_name: Name of the prompt to use
+        data: Dictionary of data to format the prompt with
+        prompts: Dictionary of loaded prompts
+        required_keys: Precomputed placeholder names for the prompt (optional)
+        prompt_override: Prompt to use instead of prompts[prompt_name] (optional)
+        template: Pre-parsed user template from parse_template (optional)
+
+    Returns:
+        list: Chat messages or None if the prompt cannot be built
+
+    Raises:
+        KeyError: If formatting references data that is not available
+    """
     messages = []
+
+    if prompt_override is not None:
+        prompt = prompt_override
+    else:
+        # Validate prompt existence
+        if prompt_name not in prompts:
+            logger.error("Prompt '%s' not found in available prompts.", prompt_name)
+            return None
+        prompt = prompts[prompt_name]
+
+    if prompt is None:
+        logger.error("Prompt '%s' exists but is None.", prompt_name)
+        return None
+
+    # Placeholders are normally precomputed when prompts are loaded
+    if required_keys is None:
+        required_keys = get_required_keys(prompt)
+
+    # Check if all required keys are present in the data
+    missing_keys = required_keys - data.keys()
+    if missing_keys:
+        logger.error("Missing required data keys for formatting: %s", missing_keys)
+        return None
+
+    # Build messages based on prompt structure
+    if isinstance(prompt, dict):
+        if 'system' in prompt and prompt['system']:
+            messages.append({
+                "role": "system",
+                "content": prompt['system']
+            })
+        user_prompt = prompt.get('user')
+    else:
+        user_prompt = prompt
+
+    if user_prompt:  # Only process if prompt is not None or empty
+        messages.append({
+            "role": "user",
+            "content": (format_template(template, data) if template is not None
+                        else user_prompt.format(**data))
+        })
+
+    # Check if messages is empty
+    if not messages:
+        logger.error("No messages created from prompt")
+        return None
+
+    return messages
+
+
+def _stream_content(response, prompt_name):
+    """
+    Yield the text of a streamed chat completion as it arrives.
+
+    Args:
+        response: Streaming response from chat.completions.create
+        prompt_name: Name of the prompt (for logging purposes)
+
+    Yields:
+        str: Text chunks of the completion
+    """
+    try:
+        for chunk in response:
+            if chunk.choices:
+                yield chunk.choices[0].delta.content or ""
+        logger.info("Streamed content generation successful.")
+    except Exception as ex:
+        logger.error("Error while streaming content for prompt '%s': %s", prompt_name, ex)
+
+
+def chat(prompt_name, data=None, model=None, client=None, prompts=None, required_keys=None,
+         prompt_override=None, template=None, stream=False, response_format=None, n_candidates=None,
+         raise_bad_request=False):
+    """
+    Generate a chat completion from a named prompt.
+
+    The static system prompt is always sent first and the formatted user
+    prompt last, and every request carries a per-prompt prompt_cache_key, so
+    OpenAI can reuse the cached prefix across calls. For long system prompts
+    this cuts time-to-first-token (by up to ~80%) and prefill token cost.
+
+    With stream=True the completion is returned as a generator of text
+    chunks, so interactive callers can show output as soon as the first
+    token arrives; use "".join(...) to collect the full text.
+
+    Args:
+        prompt_name: Name of the prompt to use
+        data: Dictionary of data to format the prompt with
+        model: OpenAI model to use
+        client: Initialized OpenAI client
+        prompts: Dictionary of loaded prompts
+        required_keys: Precomputed placeholder names for the prompt (optional)
+        prompt_override: Prompt to use instead of prompts[prompt_name] (optional)
+        template: Pre-parsed user template from parse_template (optional)
+        stream: Whether to return a generator of text chunks
+        response_format: OpenAI response_format, e.g. a strict json_schema (optional)
+        n_candidates: Number of completions to request in one call (optional);
+            the result is then a list of their texts
+        raise_bad_request: Re-raise openai.BadRequestError instead of
+            returning None, so the caller can tell a rejected request apart
+            from a transient failure
+
+    Returns:
+        str: Generated text (generator of str if stream=True, list of str if
+        n_candidates is set) or None on failure
+
+    Raises:
+        openai.BadRequestError: If the API rejects the request and
+            raise_bad_request is set
+    """
     try:
-        if not data:
+        if data is None:
             data = {}
-        logging.info(f"Generating content with data: {data}")
+        logger.info("Generating content with data: %s", data)
 
         if not client:
             logger.error("No OpenAI client available")
             return None
 
-        # Validate prompt existence
-        if prompt_name not in prompts:
-            logging.error(f"Prompt '{prompt_name}' not found in available prompts.")
+        messages = build_messages(prompt_name, data, prompts, required_keys, prompt_override, template)
+        if not messages:
             return None
 
-        prompt = prompts[prompt_name]
-        if prompt is None:
-            logging.error(f"Prompt '{prompt_name}' exists but is None.")
-            return None
+        request = {
+            "model": model,
+            "messages": messages,
+            "extra_body": {"prompt_cache_key": prompt_cache_key(prompt_name)}
+        }
+        if stream:
+            request["stream"] = True
+        if response_format:
+            request["response_format"] = response_format
+        if n_candidates:
+            request["n"] = n_candidates
 
-        # Extract placeholders from the prompt
-        def extract_placeholders(prompt_text):
-            if not prompt_text:  # Handle None or empty string
-                return []
-            return re.findall(r'{(.*?)}', prompt_text)
-
-        required_keys = set()
-        if isinstance(prompt, dict):
-            if 'user' in prompt and prompt['user']:
-                required_keys.update(extract_placeholders(prompt['user']))
-        elif prompt:  # Only process if prompt is not None or empty
-            required_keys.update(extract_placeholders(prompt))
-
-        # Check if all required keys are present in the data
-        missing_keys = required_keys - set(data.keys())
-        if missing_keys:
-            logging.error(f"Missing required data keys for formatting: {missing_keys}")
-            return None
+        # Send request to the OpenAI client
+        response = client.chat.completions.create(**request)
 
-        # Build messages based on prompt structure
-        if isinstance(prompt, dict):
-            if 'system' in prompt and prompt['system']:
-                messages.append({
-                    "role": "system",
-                    "content": prompt['system']
-                })
-            if 'user' in prompt and prompt['user']:
-                messages.append({
-                    "role": "user",
-                    "content": prompt['user'].format(**data)
-                })
-        elif prompt:  # Only process if prompt is not None or empty
-            messages.append({
-                "role": "user",
-                "content": prompt.format(**data)
-            })
+        if stream:
+            return _stream_content(response, prompt_name)
+
+        if n_candidates:
+            results = [choice.message.content.strip() for choice in response.choices
+                       if choice.message.content]
+            logger.info("Generated %s candidate completions.", len(results))
+            return results
 
-        # Check if messages is empty
+        result = response.choices[0].message.content.strip()
+        logger.info("Content generation successful.")
+        return result
+
+    except KeyError as key_err:
+        logger.error("KeyError: Missing data for formatting - %s", key_err)
+    except BadRequestError as ex:
+        if raise_bad_request:
+            raise
+        logger.error("Error during content generation: %s", ex)
+    except Exception as ex:
+        logger.error("Error during content generation: %s", ex)
+
+    return None
+
+
+async def achat(prompt_name, data=None, model=None, client=None, prompts=None, required_keys=None,
+                prompt_override=None, template=None):
+    """
+    Generate a chat completion from a named prompt without blocking.
+
+    Async counterpart of chat() for use with an AsyncOpenAI client, so many
+    requests can wait on the network concurrently.
+
+    Args:
+        prompt_name: Name of the prompt to use
+        data: Dictionary of data to format the prompt with
+        model: OpenAI model to use
+        client: Initialized AsyncOpenAI client
+        prompts: Dictionary of loaded prompts
+        required_keys: Precomputed placeholder names for the prompt (optional)
+        prompt_override: Prompt to use instead of prompts[prompt_name] (optional)
+        template: Pre-parsed user template from parse_template (optional)
+
+    Returns:
+        str: Generated text or None on failure
+    """
+    try:
+        if data is None:
+            data = {}
+        logger.info("Generating content asynchronously with data: %s", data)
+
+        if not client:
+            logger.error("No async OpenAI client available")
+            return None
+
+        messages = build_messages(prompt_name, data, prompts, required_keys, prompt_override, template)
         if not messages:
-            logging.error("No messages created from prompt")
             return None
 
-        # Send request to the OpenAI client
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=model,
-            messages=messages
+            messages=messages,
+            extra_body={"prompt_cache_key": prompt_cache_key(prompt_name)}
         )
 
         result = response.choices[0].message.content.strip()
-        logging.info("Content generation successful.")
+        logger.info("Async content generation successful.")
         return result
 
     except KeyError as key_err:
-        logging.error(f"KeyError: Missing data for formatting - {key_err}")
+        logger.error("KeyError: Missing data for formatting - %s", key_err)
     except Exception as ex:
-        logging.error(f"Error during content generation: {ex}")
+        logger.error("Error during async content generation: %s", ex)
 
     return None
-
@@ -0,0 +1,180 @@
+"""
+Download module for ai_manager.
+Provides a shared, pooled HTTP session for fetching generated media,
+resumable downloads to disk and an async download for event-loop callers.
+"""
+
+import io
+import logging
+import os
+import shutil
+import threading
+
+import httpx
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _create_session():
+    """
+    Build a requests session with connection pooling and retries.
+
+    Returns:
+        requests.Session: Configured session
+    """
+    retry = Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=(429, 500, 502, 503, 504)
+    )
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """
+    Get the download session shared by all media downloads.
+
+    Reusing one session keeps TCP/TLS connections to the Replicate CDN
+    alive between downloads instead of paying a new handshake per file.
+
+    Returns:
+        requests.Session: Shared session
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _create_session()
+                logger.debug("Created shared download session")
+    return _session
+
+
+def download_to_file(url, output_path, timeout=60, chunk_size=1024 * 1024, attempts=3):
+    """
+    Download a URL to a file, resuming an interrupted transfer.
+
+    The body is written to "<output_path>.part" and moved into place once
+    complete. If the connection drops, the download continues from the
+    bytes already on disk with an HTTP Range request; a server that ignores
+    Range gets a restart. A .part file left over from an earlier call may
+    belong to a different URL, so it is overwritten rather than resumed.
+
+    Args:
+        url: URL to download
+        output_path: Destination file path
+        timeout: Request timeout in seconds (or a (connect, read) tuple)
+        chunk_size: Copy buffer size in bytes
+        attempts: Connection attempts before giving up
+
+    Returns:
+        str: Output path
+
+    Raises:
+        requests.RequestException: If the download fails on every attempt
+    """
+    output_path = str(output_path)
+    part_path = output_path + ".part"
+    session = get_session()
+
+    for attempt in range(1, attempts + 1):
+        # Only resume bytes this call wrote itself
+        offset = os.path.getsize(part_path) if attempt > 1 and os.path.exists(part_path) else 0
+        # Byte offsets only line up without content encoding
+        headers = {'Accept-Encoding': 'identity'}
+        if offset:
+            headers['Range'] = f"bytes={offset}-"
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 416:
+                    # Nothing left to fetch, the part file is complete
+                    break
+                response.raise_for_status()
+                resumed = offset and response.status_code == 206
+                if offset and not resumed:
+                    logger.debug("Server ignored Range for %s, restarting download", url)
+                with open(part_path, 'ab' if resumed else 'wb') as f:
+                    shutil.copyfileobj(response.raw, f, chunk_size)
+            break
+        except (requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError, urllib3.exceptions.HTTPError) as e:
+            if attempt == attempts:
+                raise
+            logger.warning("Download of %s interrupted (%s), resuming", url, e)
+
+    os.replace(part_path, output_path)
+    return output_path
+
+
+async def adownload_to_file(url, output_path, client=None, timeout=60, chunk_size=1024 * 1024):
+    """
+    Download a URL to a file without blocking the event loop on the network.
+
+    The body is streamed to "<output_path>.part" and moved into place once
+    complete. Chunks are written with plain file writes; at 1 MiB per write
+    the disk time is small next to the network wait.
+
+    Args:
+        url: URL to download
+        output_path: Destination file path
+        client: httpx.AsyncClient to reuse across downloads (optional)
+        timeout: Request timeout in seconds
+        chunk_size: Read size in bytes
+
+    Returns:
+        str: Output path
+
+    Raises:
+        httpx.HTTPError: If the download fails
+    """
+    output_path = str(output_path)
+    part_path = output_path + ".part"
+
+    if client is None:
+        async with httpx.AsyncClient(follow_redirects=True) as owned_client:
+            return await adownload_to_file(url, output_path, owned_client, timeout, chunk_size)
+
+    async with client.stream('GET', url, timeout=timeout) as response:
+        response.raise_for_status()
+        with open(part_path, 'wb') as f:
+            async for chunk in response.aiter_bytes(chunk_size):
+                f.write(chunk)
+
+    os.replace(part_path, output_path)
+    return output_path
+
+
+def save_file_output(output, output_path, chunk_size=1024 * 1024):
+    """
+    Stream a readable model output to a file without buffering it whole.
+
+    Replicate's FileOutput.read() takes no size and returns the entire
+    body, so it is iterated instead, which streams the response in chunks.
+    Ordinary file objects are copied with shutil.copyfileobj.
+
+    Args:
+        output: replicate FileOutput or binary file object
+        output_path: Destination file path
+        chunk_size: Copy buffer size in bytes for file objects
+
+    Returns:
+        str: Output path
+    """
+    with open(output_path, 'wb') as f:
+        if isinstance(output, io.IOBase):
+            shutil.copyfileobj(output, f, chunk_size)
+        else:
+            for chunk in output:
+                f.write(chunk)
+    return str(output_path)
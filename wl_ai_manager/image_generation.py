@@ -3,15 +3,128 @@ Image generation module for ai_manager.
 Provides image generation functionality using Replicate's FLUX PRO.
 """
 
-import io
 import logging
 import os
+import shutil
+from math import gcd
 from pathlib import Path
-from PIL import Image
-import replicate
+
+from .downloads import get_session, save_file_output
 
 logger = logging.getLogger(__name__)
 
+# Bytes fed to the incremental decoder at a time
+_DECODE_CHUNK_SIZE = 64 * 1024
+
+# FLUX aspect ratio names keyed by the reduced (width, height) pair
+_ASPECT_RATIOS = {
+    (1, 1): "1:1",
+    (16, 9): "16:9",
+    (3, 2): "3:2",
+    (2, 3): "2:3",
+    (4, 5): "4:5",
+    (5, 4): "5:4",
+    (9, 16): "9:16",
+    (3, 4): "3:4",
+    (4, 3): "4:3"
+}
+
+# PIL format name for each supported file type
+_PIL_FORMAT = {
+    "png": "PNG",
+    "jpeg": "JPEG",
+    "jpg": "JPEG",
+    "bmp": "BMP",
+    "webp": "WEBP"
+}
+
+# Encoder options per PIL format, on top of Pillow's defaults. At the default
+# quality, optimized progressive JPEG is smaller for little extra time; WEBP
+# (quality 80, method 4) and PNG (compress_level 6) are already the better
+# size/speed trade-off at their defaults
+_SAVE_KWARGS = {
+    "JPEG": {"optimize": True, "progressive": True}
+}
+
+
+def _open_image_url(url):
+    """
+    Decode an image while it downloads.
+
+    Chunks are fed to an incremental PIL parser as they arrive, so decoding
+    overlaps the network wait instead of starting after the whole body is
+    buffered. Formats without an incremental decoder are buffered by the
+    parser and decoded at the end.
+
+    Args:
+        url: Image URL
+
+    Returns:
+        PIL.Image.Image: Fully loaded image
+    """
+    from PIL import ImageFile
+
+    parser = ImageFile.Parser()
+    with get_session().get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(_DECODE_CHUNK_SIZE):
+            parser.feed(chunk)
+    return parser.close()
+
+
+def _download_image_url(url, output_path):
+    """
+    Stream an image to disk as-is, without decoding it.
+
+    Args:
+        url: Image URL
+        output_path: Destination file path
+    """
+    with get_session().get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        with open(output_path, 'wb') as f:
+            shutil.copyfileobj(response.raw, f)
+
+
+def build_flux_request(prompt, target_width, target_height, config):
+    """
+    Build the FLUX model name and input for an image request.
+
+    Also used to key the image cache, so a change of model or generation
+    settings is not served an image made with the old ones.
+
+    Args:
+        prompt: Text prompt for image generation
+        target_width: Target width for the image
+        target_height: Target height for the image
+        config: Configuration object with replicate settings
+
+    Returns:
+        tuple: (model name, input dict for client.run)
+    """
+    # Calculate aspect ratio
+    divisor = gcd(target_width, target_height) or 1
+    closest_ratio = _ASPECT_RATIOS.get((target_width // divisor, target_height // divisor), "custom")
+    
+    # Get configuration
+    replicate_config = config.get('replicate', {}) if config else {}
+    
+    flux_config = {
+        "prompt": prompt,
+        "width": target_width,
+        "height": target_height,
+        "aspect_ratio": closest_ratio,
+        "prompt_upsampling": replicate_config.get('prompt_upsampling', True),
+        "output_format": replicate_config.get('output_format', 'png'),
+        "num_inference_steps": replicate_config.get('num_inference_steps', 50),
+        "guidance_scale": replicate_config.get('guidance_scale', 7.5),
+    }
+    
+    # Get model name from config or use default
+    model_name = replicate_config.get('image_model', 'black-forest-labs/flux-pro')
+    return model_name, flux_config
+
 
 def create_flux_pro_image(file_name, folder, prompt, file_type="webp", target_width=512, target_height=512, 
                          crop=False, resize=False, client=None, config=None):
@@ -33,60 +146,40 @@ def create_flux_pro_image(file_name, folder, prompt, file_type="webp", target_wi
     Returns:
         str: Path to saved image or None on failure
     """
+    # PIL and replicate are only imported once an image is actually requested
+    from PIL import Image, ImageOps
+    from .replicate_client import get_replicate_client_from_config
+
     try:
         logger.info(f"Creating image with FLUX PRO: '{prompt[:50]}...'")
         
-        aspect_ratios = {
-            "1:1": (1, 1),
-            "16:9": (16, 9),
-            "3:2": (3, 2),
-            "2:3": (2, 3),
-            "4:5": (4, 5),
-            "5:4": (5, 4),
-            "9:16": (9, 16),
-            "3:4": (3, 4),
-            "4:3": (4, 3)
-        }
-        
-        # Calculate aspect ratio
-        aspect = target_width / target_height
-        closest_ratio = "custom"
-        
-        for ratio, dims in aspect_ratios.items():
-            ratio_value = dims[0] / dims[1]
-            if abs(ratio_value - aspect) < 1e-10:
-                closest_ratio = ratio
-                break
-        
-        # Get configuration
-        replicate_config = config.get('replicate', {}) if config else {}
-        
-        flux_config = {
-            "prompt": prompt,
-            "width": target_width,
-            "height": target_height,
-            "aspect_ratio": closest_ratio,
-            "prompt_upsampling": replicate_config.get('prompt_upsampling', True),
-            "output_format": replicate_config.get('output_format', 'png'),
-            "num_inference_steps": replicate_config.get('num_inference_steps', 50),
-            "guidance_scale": replicate_config.get('guidance_scale', 7.5),
-        }
-        
-        # Use provided client or create new one
+        model_name, flux_config = build_flux_request(prompt, target_width, target_height, config)
+        
+        # Validate file type and prepare the output path
+        file_type = file_type.lower()
+        if file_type not in _PIL_FORMAT:
+            raise ValueError(f"Unsupported file type: {file_type}. Supported types are: {', '.join(_PIL_FORMAT)}")
+        
+        # Create output directory
+        output_dir = Path(folder)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Ensure correct file extension
+        base_name = os.path.splitext(file_name)[0]
+        output_path = output_dir / f"{base_name}.{file_type}"
+        
+        # Convert file type for PIL save
+        pil_format = _PIL_FORMAT[file_type]
+        
+        # Use provided client or the shared one for this API key
         if not client:
             if not config or 'replicate' not in config:
                 logger.error("No Replicate configuration available")
                 return None
             
-            api_key = replicate_config.get('api_key')
-            if not api_key:
-                logger.error("No Replicate API key found in configuration")
+            client = get_replicate_client_from_config(config)
+            if not client:
                 return None
-                
-            client = replicate.Client(api_token=api_key)
-        
-        # Get model name from config or use default
-        model_name = replicate_config.get('image_model', 'black-forest-labs/flux-pro')
         
         logger.debug(f"Running Replicate model: {model_name}")
         logger.debug(f"FLUX config: {flux_config}")
@@ -98,30 +191,39 @@ def create_flux_pro_image(file_name, folder, prompt, file_type="webp", target_wi
         )
         
         # Handle different output types from Replicate
+        if isinstance(output, list) and len(output) > 0:
+            # Sometimes Replicate returns a list of URLs
+            output = output[0]
+        
+        # Without transforms or format conversion, keep the model's encoded bytes
+        if not resize and not crop and pil_format == _PIL_FORMAT.get(flux_config["output_format"].lower()):
+            if hasattr(output, 'read'):
+                logger.info(f"Saving image to: {output_path}")
+                return save_file_output(output, output_path)
+            if isinstance(output, str):
+                logger.info(f"Downloading image to: {output_path}")
+                _download_image_url(output, output_path)
+                return str(output_path)
+        
         if hasattr(output, 'read'):
-            image_data = output.read()
+            image = Image.open(output)
+            image.load()
         elif isinstance(output, str):
-            # If output is a URL, download it
-            import requests
-            response = requests.get(output)
-            response.raise_for_status()
-            image_data = response.content
-        elif isinstance(output, list) and len(output) > 0:
-            # Sometimes Replicate returns a list of URLs
-            import requests
-            response = requests.get(output[0])
-            response.raise_for_status()
-            image_data = response.content
+            # If output is a URL, decode it while it downloads
+            image = _open_image_url(output)
         else:
             logger.error(f"Unexpected output type from Replicate: {type(output)}")
             return None
         
-        # Open image
-        image = Image.open(io.BytesIO(image_data))
         logger.info(f"Generated image size: {image.width}x{image.height}")
         
-        # Resize if flag is enabled
-        if resize:
+        if resize and crop:
+            # Scale to cover and center-crop in a single resampling pass
+            logger.debug(f"Fitting image to: {target_width}x{target_height}")
+            image = ImageOps.fit(image, (target_width, target_height), method=Image.LANCZOS,
+                                 centering=(0.5, 0.5))
+        elif resize:
+            # Resize only, keeping the aspect ratio
             current_ratio = image.width / image.height
             target_ratio = target_width / target_height
             
@@ -135,36 +237,20 @@ def create_flux_pro_image(file_name, folder, prompt, file_type="webp", target_wi
                 new_height = int(target_width / current_ratio)
             
             logger.debug(f"Resizing image to: {new_width}x{new_height}")
-            image = image.resize((new_width, new_height), Image.LANCZOS)
-        
-        # Crop if flag is enabled
-        if crop:
+            if new_width <= image.width and new_height <= image.height:
+                # Downscale in place
+                image.thumbnail((new_width, new_height), Image.LANCZOS)
+            else:
+                image = image.resize((new_width, new_height), Image.LANCZOS)
+        elif crop:
+            # Crop only, from the center
             left = (image.width - target_width) // 2
             top = (image.height - target_height) // 2
             logger.debug(f"Cropping image from ({left}, {top}) to size {target_width}x{target_height}")
             image = image.crop((left, top, left + target_width, top + target_height))
         
-        # Validate file type and save image
-        valid_file_types = ["png", "jpeg", "jpg", "bmp", "webp"]
-        file_type = file_type.lower()
-        if file_type not in valid_file_types:
-            raise ValueError(f"Unsupported file type: {file_type}. Supported types are: {', '.join(valid_file_types)}")
-        
-        # Create output directory
-        output_dir = Path(folder)
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Ensure correct file extension
-        base_name = os.path.splitext(file_name)[0]
-        output_path = output_dir / f"{base_name}.{file_type}"
-        
-        # Convert file type for PIL save
-        pil_format = file_type.upper()
-        if pil_format == 'JPG':
-            pil_format = 'JPEG'
-        
         logger.info(f"Saving image to: {output_path}")
-        image.save(str(output_path), pil_format)
+        image.save(str(output_path), pil_format, **_SAVE_KWARGS.get(pil_format, {}))
         
         return str(output_path)
         
@@ -183,17 +269,16 @@ def init_replicate_client(config):
     Returns:
         replicate.Client or None on failure
     """
+    from .replicate_client import get_replicate_client_from_config
+
     try:
         if not hasattr(config, 'replicate'):
             logger.error("No 'replicate' section in configuration")
             return None
             
-        api_key = config.replicate.get('api_key')
-        if not api_key:
-            logger.error("No Replicate API key found in configuration")
+        client = get_replicate_client_from_config(config)
+        if not client:
             return None
-            
-        client = replicate.Client(api_token=api_key)
         logger.info("Initialized Replicate client successfully")
         return client
         
@@ -3,21 +3,372 @@ Music generation module for ai_manager.
 Provides music generation functionality using Replicate's music models.
 """
 
+import asyncio
+import hashlib
 import io
 import logging
 import os
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from typing import Optional, Dict, List
-import replicate
+import httpx
 from replicate.exceptions import ModelError
-import requests
 import re
+import threading
+
+from .cache import copy_file, get_media_cache, make_cache_key
+from .downloads import adownload_to_file, download_to_file
+from .rate_limit import RateLimitedClient, TokenBucket
+from .replicate_client import get_replicate_client
 
 logger = logging.getLogger(__name__)
 
+# Copy downloads in 1 MiB blocks rather than many small chunks
+_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Throttled clients shared by every create_music call using the same API key
+_throttled_clients = {}
+_throttled_clients_lock = threading.Lock()
+
+
+def _throttle_client(client, replicate_config):
+    """
+    Pace Replicate predictions for callers that pass a plain client.
+
+    AIManager already hands out a rate-limited client, which is used as-is.
+    Otherwise one throttled client is kept per API key, limited to
+    replicate.qpm (default 60) predictions per minute and
+    replicate.max_in_flight (default 8) concurrent predictions.
+
+    Args:
+        client: replicate.Client or RateLimitedClient
+        replicate_config: Replicate section of the configuration
+
+    Returns:
+        RateLimitedClient wrapping the client
+    """
+    if isinstance(client, RateLimitedClient):
+        return client
+
+    key = getattr(replicate_config, 'api_key', None) or id(client)
+    with _throttled_clients_lock:
+        throttled = _throttled_clients.get(key)
+        if throttled is None or throttled._client is not client:
+            throttled = RateLimitedClient(
+                client,
+                TokenBucket(getattr(replicate_config, 'qpm', 60), 60),
+                max_in_flight=getattr(replicate_config, 'max_in_flight', 8)
+            )
+            _throttled_clients[key] = throttled
+    return throttled
+
+
+def _file_digest(path):
+    """
+    Hash a file's contents.
+
+    Args:
+        path: File path
+
+    Returns:
+        str: SHA-256 hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _prepare_music(prompt, file_name, folder, duration, continuation_audio, temperature, top_k,
+                   top_p, classifier_free_guidance, output_format, config, continuation_key=None):
+    """
+    Build the request shared by create_music and create_music_async.
+
+    Creates the output folder and checks the media cache; on a cache hit the
+    cached file has already been copied to the output path. A continuation
+    is identified in the cache key by continuation_key when given (the key
+    of the segment it continues), otherwise by a digest of the local file
+    or by its URL.
+
+    Args:
+        prompt: Text prompt for music generation
+        file_name: Name for the output file
+        folder: Folder path where to save the music
+        duration: Duration in seconds
+        continuation_audio: Path or URL of audio to continue from (optional)
+        temperature: Generation temperature
+        top_k: Top K sampling parameter
+        top_p: Top P sampling parameter
+        classifier_free_guidance: Guidance scale
+        output_format: Output format (wav or mp3)
+        config: Configuration object with replicate settings
+        continuation_key: Cache key of the segment being continued (optional)
+
+    Returns:
+        dict: generation_params, output_path, model_name, cache, cache_key
+            and cached (True when the output was served from the cache)
+    """
+    # Get configuration - config IS already ai_manager
+    replicate_config = getattr(config, 'replicate', {}) if config else {}
+    
+    # Build generation parameters
+    generation_params = {
+        "prompt": prompt[:200] if len(prompt) > 200 else prompt,
+        "duration": duration,
+        "output_format": output_format,
+        "temperature": temperature,
+        "top_k": top_k,
+        "top_p": top_p,
+        "classifier_free_guidance": classifier_free_guidance,
+        "normalization_strategy": "loudness"
+    }
+    
+    # Create output directory
+    output_dir = Path(folder)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    
+    # Save audio file
+    file_extension = output_format.lower()
+    if file_extension not in ['wav', 'mp3']:
+        file_extension = 'wav'
+    
+    output_path = output_dir / f"{file_name}.{file_extension}"
+    
+    # Get model name from config or use default
+    model_name = getattr(replicate_config, 'music_model', 'meta/musicgen')
+    
+    request = {
+        'generation_params': generation_params,
+        'output_path': output_path,
+        'model_name': model_name,
+        'cache': None,
+        'cache_key': None,
+        'cached': False
+    }
+    
+    # Identical requests are served from the media cache
+    cache = get_media_cache(config, 'music')
+    if cache is not None:
+        continuation_digest = continuation_key
+        if continuation_digest is None and continuation_audio:
+            # Replicate output URLs are unique per generation, so the URL itself identifies the audio
+            if os.path.exists(continuation_audio):
+                continuation_digest = _file_digest(continuation_audio)
+            else:
+                continuation_digest = continuation_audio
+        cache_key = make_cache_key(kind='music', model=model_name, params=generation_params,
+                                   continuation=continuation_digest)
+        request['cache'] = cache
+        request['cache_key'] = cache_key
+        cached_path = cache.get(cache_key, output_path.suffix)
+        if cached_path:
+            logger.info(f"Music cache hit, copying to: {output_path}")
+            copy_file(cached_path, output_path)
+            request['cached'] = True
+    
+    return request
+
+
+def _open_continuation(generation_params, continuation_audio):
+    """
+    Add continuation audio to the generation parameters.
+
+    Args:
+        generation_params: Parameters to update in place
+        continuation_audio: Path or URL of audio to continue from (optional)
+
+    Returns:
+        Open file handle the caller must close, or None
+    """
+    audio_file_handle = None
+    if isinstance(continuation_audio, str) and continuation_audio.startswith(('http://', 'https://')):
+        # Replicate fetches URL inputs itself, nothing to upload
+        logger.info(f"Using continuation from: {continuation_audio}")
+        generation_params["continuation"] = True
+        generation_params["input_audio"] = continuation_audio
+    elif continuation_audio and os.path.exists(continuation_audio):
+        logger.info(f"Using continuation from: {continuation_audio}")
+        generation_params["continuation"] = True
+        try:
+            audio_file_handle = open(continuation_audio, "rb")
+            generation_params["input_audio"] = audio_file_handle
+        except Exception as e:
+            logger.error(f"Failed to open continuation audio: {e}")
+            generation_params["continuation"] = False
+    else:
+        generation_params["continuation"] = False
+        if continuation_audio:
+            logger.warning(f"Continuation audio not found: {continuation_audio}")
+    return audio_file_handle
+
+
+def _resolve_client(client, config):
+    """
+    Get the throttled Replicate client for a request.
+
+    Args:
+        client: Replicate client instance (optional)
+        config: Configuration object with replicate settings
+
+    Returns:
+        RateLimitedClient or None if no client can be created
+    """
+    replicate_config = getattr(config, 'replicate', {}) if config else {}
+    
+    # Use provided client or the shared one for this API key
+    if not client:
+        if not config or not hasattr(config, 'replicate'):
+            logger.error("No replicate configuration available")
+            return None
+        
+        api_key = getattr(replicate_config, 'api_key', None)
+        
+        if not api_key:
+            logger.error("No Replicate API key found in configuration")
+            return None
+        
+        # One pooled client per API key, so generations reuse connections
+        client = get_replicate_client(
+            api_key,
+            getattr(replicate_config, 'max_connections', 32),
+            getattr(replicate_config, 'max_keepalive_connections', 16)
+        )
+    
+    return _throttle_client(client, replicate_config)
+
+
+def _audio_url(output):
+    """
+    Extract the audio URL from a Replicate prediction output.
+
+    Args:
+        output: Output returned by run/async_run
+
+    Returns:
+        str or None if the output holds no URL
+    """
+    logger.debug("Replicate output type: %s", type(output))
+    
+    audio_url = None
+    if isinstance(output, (list, tuple)) and len(output) > 0:
+        audio_url = output[0]
+    elif isinstance(output, str) and output.startswith('http'):
+        audio_url = output
+    elif hasattr(output, '__iter__') and not isinstance(output, (str, bytes)):
+        try:
+            audio_url = next(iter(output))
+        except StopIteration:
+            logger.error("Output iterator was empty")
+    
+    if not audio_url:
+        logger.error("No audio URL received from Replicate")
+        return None
+    
+    logger.debug("Got audio URL: %s", audio_url)
+    return str(audio_url)
+
+
+def _log_music_error(e):
+    """
+    Log a failed generation, with prediction status and logs for model errors.
+
+    Args:
+        e: Exception raised while generating or saving music
+    """
+    if not isinstance(e, ModelError):
+        logger.error(f"Error generating music: {e}")
+        logger.exception("Full traceback:")
+        return
+    logger.error(f"Replicate model error: {e}")
+    if hasattr(e, 'args') and e.args:
+        err = e.args[0]
+        if hasattr(err, 'status'):
+            logger.error(f"Status: {err.status}, Error: {err.error}")
+            if hasattr(err, 'logs'):
+                logger.error(f"Model logs: {err.logs}")
+
+
+def _run_music(prompt, file_name, folder, duration, continuation_audio, temperature, top_k, top_p,
+               classifier_free_guidance, output_format, client, config, continuation_key=None):
+    """
+    Run a music prediction without downloading its output.
+
+    Args:
+        See create_music; continuation_key as in _prepare_music
+
+    Returns:
+        dict: _prepare_music request plus 'audio_url' (None on a cache hit),
+            or None on failure
+    """
+    request = _prepare_music(prompt, file_name, folder, duration, continuation_audio, temperature,
+                             top_k, top_p, classifier_free_guidance, output_format, config,
+                             continuation_key)
+    request['audio_url'] = None
+    if request['cached']:
+        return request
+    
+    client = _resolve_client(client, config)
+    if not client:
+        return None
+    
+    generation_params = request['generation_params']
+    model_name = request['model_name']
+    audio_file_handle = _open_continuation(generation_params, continuation_audio)
+    
+    logger.debug("Running Replicate model: %s", model_name)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Generation params: %s", list(generation_params.keys()))
+    
+    try:
+        # Run the model
+        logger.debug("Calling Replicate API for music generation...")
+        start_time = time.time()
+        
+        output = client.run(
+            model_name,
+            input=generation_params
+        )
+        
+        generation_time = time.time() - start_time
+        logger.info(f"Music generation took {generation_time:.2f} seconds")
+        
+    finally:
+        # Always close the file handle
+        if audio_file_handle:
+            audio_file_handle.close()
+    
+    request['audio_url'] = _audio_url(output)
+    if not request['audio_url']:
+        return None
+    return request
+
+
+def _save_music(request):
+    """
+    Download a prediction's audio and add it to the media cache.
+
+    Args:
+        request: Request returned by _run_music
+
+    Returns:
+        str: Path to saved audio file
+    """
+    output_path = request['output_path']
+    if request['audio_url']:
+        # Download the audio, resuming if the transfer is interrupted
+        logger.info("Downloading generated music...")
+        download_to_file(request['audio_url'], output_path, timeout=60, chunk_size=_DOWNLOAD_CHUNK_SIZE)
+        
+        if request['cache_key']:
+            request['cache'].put(request['cache_key'], output_path, output_path.suffix)
+        
+        logger.info(f"Successfully saved music: {output_path}")
+    return str(output_path)
+
 
 def create_music(prompt, file_name, folder, duration=30, continuation_audio=None, 
                 temperature=1.0, top_k=250, top_p=0, classifier_free_guidance=3,
@@ -45,132 +396,91 @@ def create_music(prompt, file_name, folder, duration=30, continuation_audio=None
     try:
         logger.info(f"Creating music: '{prompt[:50]}...'")
         
-        # Get configuration - config IS already ai_manager
-        replicate_config = getattr(config, 'replicate', {}) if config else {}
-        
-        # Build generation parameters
-        generation_params = {
-            "prompt": prompt[:200] if len(prompt) > 200 else prompt,
-            "duration": duration,
-            "output_format": output_format,
-            "temperature": temperature,
-            "top_k": top_k,
-            "top_p": top_p,
-            "classifier_free_guidance": classifier_free_guidance,
-            "normalization_strategy": "loudness"
-        }
-        
-        # Handle continuation
-        audio_file_handle = None
-        if continuation_audio and os.path.exists(continuation_audio):
-            logger.info(f"Using continuation from: {continuation_audio}")
-            generation_params["continuation"] = True
-            try:
-                audio_file_handle = open(continuation_audio, "rb")
-                generation_params["input_audio"] = audio_file_handle
-            except Exception as e:
-                logger.error(f"Failed to open continuation audio: {e}")
-                generation_params["continuation"] = False
-        else:
-            generation_params["continuation"] = False
-            if continuation_audio:
-                logger.warning(f"Continuation audio not found: {continuation_audio}")
+        request = _run_music(prompt, file_name, folder, duration, continuation_audio, temperature,
+                             top_k, top_p, classifier_free_guidance, output_format, client, config)
+        if not request:
+            return None
+        return _save_music(request)
         
-        # Use provided client or create new one
+    except Exception as e:
+        _log_music_error(e)
+        return None
+
+
+async def create_music_async(prompt, file_name, folder, duration=30, continuation_audio=None,
+                             temperature=1.0, top_k=250, top_p=0, classifier_free_guidance=3,
+                             output_format="wav", client=None, config=None, http_client=None):
+    """
+    Async counterpart of create_music.
+
+    The prediction runs through the client's async_run and the audio is
+    streamed with httpx, so many generations can wait on one event loop
+    instead of each holding a worker thread.
+
+    Args:
+        prompt: Text prompt for music generation
+        file_name: Name for the output file
+        folder: Folder path where to save the music
+        duration: Duration in seconds (default 30)
+        continuation_audio: Path to audio file to continue from (optional)
+        temperature: Generation temperature (default 1.0)
+        top_k: Top K sampling parameter (default 250)
+        top_p: Top P sampling parameter (default 0)
+        classifier_free_guidance: Guidance scale (default 3)
+        output_format: Output format (wav or mp3)
+        client: Replicate client instance
+        config: Configuration object with replicate settings
+        http_client: httpx.AsyncClient shared for downloads (optional)
+
+    Returns:
+        str: Path to saved audio file or None on failure
+    """
+    try:
+        logger.info(f"Creating music: '{prompt[:50]}...'")
+
+        request = _prepare_music(prompt, file_name, folder, duration, continuation_audio, temperature,
+                                 top_k, top_p, classifier_free_guidance, output_format, config)
+        output_path = request['output_path']
+        if request['cached']:
+            return str(output_path)
+
+        client = _resolve_client(client, config)
         if not client:
-            if not config or not hasattr(config, 'replicate'):
-                logger.error("No replicate configuration available")
-                return None
-            
-            replicate_config = config.replicate
-            api_key = getattr(replicate_config, 'api_key', None)
-            
-            if not api_key:
-                logger.error("No Replicate API key found in configuration")
-                return None
-                
-            client = replicate.Client(api_token=api_key)
-        
-        # Get model name from config or use default
-        model_name = getattr(replicate_config, 'music_model', 'meta/musicgen')
-        
-        logger.debug(f"Running Replicate model: {model_name}")
-        logger.debug(f"Generation params: {list(generation_params.keys())}")
-        
+            return None
+
+        generation_params = request['generation_params']
+        model_name = request['model_name']
+        audio_file_handle = _open_continuation(generation_params, continuation_audio)
+
+        logger.debug("Running Replicate model: %s", model_name)
+
         try:
-            # Run the model
-            logger.debug("Calling Replicate API for music generation...")
             start_time = time.time()
-            
-            output = client.run(
+            output = await client.async_run(
                 model_name,
                 input=generation_params
             )
-            
-            generation_time = time.time() - start_time
-            logger.info(f"Music generation took {generation_time:.2f} seconds")
-            
+            logger.info(f"Music generation took {time.time() - start_time:.2f} seconds")
         finally:
-            # Always close the file handle
             if audio_file_handle:
                 audio_file_handle.close()
-        
-        # Handle output
-        logger.debug(f"Replicate output type: {type(output)}")
-        
-        # Extract URL from output
-        audio_url = None
-        if isinstance(output, (list, tuple)) and len(output) > 0:
-            audio_url = output[0]
-        elif isinstance(output, str) and output.startswith('http'):
-            audio_url = output
-        elif hasattr(output, '__iter__') and not isinstance(output, (str, bytes)):
-            try:
-                audio_url = next(iter(output))
-            except StopIteration:
-                logger.error("Output iterator was empty")
-        
+
+        audio_url = _audio_url(output)
         if not audio_url:
-            logger.error("No audio URL received from Replicate")
             return None
-        
-        logger.debug(f"Got audio URL: {audio_url}")
-        
-        # Download the audio
+
         logger.info("Downloading generated music...")
-        response = requests.get(audio_url, timeout=60, stream=True)
-        response.raise_for_status()
-        
-        # Create output directory
-        output_dir = Path(folder)
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Save audio file
-        file_extension = output_format.lower()
-        if file_extension not in ['wav', 'mp3']:
-            file_extension = 'wav'
-        
-        output_path = output_dir / f"{file_name}.{file_extension}"
-        
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        
+        await adownload_to_file(audio_url, output_path, http_client, timeout=60,
+                                chunk_size=_DOWNLOAD_CHUNK_SIZE)
+
+        if request['cache_key']:
+            request['cache'].put(request['cache_key'], output_path, output_path.suffix)
+
         logger.info(f"Successfully saved music: {output_path}")
         return str(output_path)
-        
-    except ModelError as e:
-        logger.error(f"Replicate model error: {e}")
-        if hasattr(e, 'args') and e.args:
-            err = e.args[0]
-            if hasattr(err, 'status'):
-                logger.error(f"Status: {err.status}, Error: {err.error}")
-                if hasattr(err, 'logs'):
-                    logger.error(f"Model logs: {err.logs}")
-        return None
+
     except Exception as e:
-        logger.error(f"Error generating music: {e}")
-        logger.exception("Full traceback:")
+        _log_music_error(e)
         return None
 
 
@@ -180,6 +490,11 @@ def create_music_continuation_chain(prompts, folder, base_file_name="music",
     Generate a chain of music continuations from a list of prompts.
     Each generation continues from the previous one.
     
+    Generation is sequential, but downloads are not on the critical path:
+    each segment continues from the previous segment's output URL, and the
+    previous file is downloaded in the background while the next segment
+    generates.
+    
     Args:
         prompts: List of text prompts for music generation
         folder: Folder path where to save the music files
@@ -193,46 +508,67 @@ def create_music_continuation_chain(prompts, folder, base_file_name="music",
     """
     logger.info(f"Starting music continuation chain with {len(prompts)} prompts")
     
-    generated_files = []
+    # Last successful segment: (audio URL or local path, cache key)
     last_audio = None
+    last_key = None
+    downloads = []
     
-    for i, prompt in enumerate(prompts):
-        logger.info(f"\nGenerating segment {i+1}/{len(prompts)}")
-        logger.info(f"Prompt: {prompt[:80]}...")
-        
-        file_name = f"{base_file_name}_{i:03d}"
-        
-        result = create_music(
-            prompt=prompt,
-            file_name=file_name,
-            folder=folder,
-            duration=duration,
-            continuation_audio=last_audio,
-            client=client,
-            config=config
-        )
-        
-        if result:
-            generated_files.append(result)
-            last_audio = result
-            logger.info(f"✓ Segment {i+1} generated successfully")
-        else:
-            logger.error(f"✗ Failed to generate segment {i+1}")
-            # Continue with the last successful audio if available
+    with ThreadPoolExecutor(max_workers=1) as download_executor:
+        for i, prompt in enumerate(prompts):
+            logger.info(f"\nGenerating segment {i+1}/{len(prompts)}")
+            logger.info(f"Prompt: {prompt[:80]}...")
+            
+            file_name = f"{base_file_name}_{i:03d}"
+            
+            try:
+                request = _run_music(
+                    prompt=prompt,
+                    file_name=file_name,
+                    folder=folder,
+                    duration=duration,
+                    continuation_audio=last_audio,
+                    temperature=1.0,
+                    top_k=250,
+                    top_p=0,
+                    classifier_free_guidance=3,
+                    output_format="wav",
+                    client=client,
+                    config=config,
+                    continuation_key=last_key
+                )
+            except Exception as e:
+                _log_music_error(e)
+                request = None
+            
+            if request:
+                downloads.append((i, download_executor.submit(_save_music, request)))
+                last_audio = request['audio_url'] or str(request['output_path'])
+                last_key = request['cache_key']
+            else:
+                logger.error(f"✗ Failed to generate segment {i+1}")
+                # Continue with the last successful audio if available
         
-        # Add delay between generations to avoid rate limiting
-        if i < len(prompts) - 1:
-            time.sleep(2)
+        generated_files = []
+        for i, future in downloads:
+            try:
+                generated_files.append(future.result())
+                logger.info(f"✓ Segment {i+1} generated successfully")
+            except Exception as e:
+                _log_music_error(e)
+                logger.error(f"✗ Failed to download segment {i+1}")
     
     logger.info(f"\nChain complete: {len(generated_files)}/{len(prompts)} segments generated")
     return generated_files
 
 
 def create_music_variations(base_prompt, variation_prompts, folder, base_file_name="variation",
-                          duration=30, client=None, config=None):
+                          duration=30, client=None, config=None, parallel=True):
     """
     Generate variations of music based on a base prompt with modifications.
     
+    Variations do not depend on each other, so by default they are generated
+    concurrently, at most replicate.max_concurrency (default 4) at a time.
+    
     Args:
         base_prompt: Base music prompt
         variation_prompts: List of variation descriptions to append
@@ -241,42 +577,96 @@ def create_music_variations(base_prompt, variation_prompts, folder, base_file_na
         duration: Duration for each variation
         client: Replicate client
         config: Configuration
+        parallel: Generate variations concurrently (default True)
         
     Returns:
         List of generated file paths
     """
     logger.info(f"Generating {len(variation_prompts)} variations of base prompt")
     
-    generated_files = []
-    
-    for i, variation in enumerate(variation_prompts):
-        full_prompt = f"{base_prompt}, {variation}"
-        file_name = f"{base_file_name}_{i:03d}"
-        
-        logger.info(f"\nVariation {i+1}: {variation}")
-        
-        result = create_music(
-            prompt=full_prompt,
-            file_name=file_name,
+    def generate(indexed_variation):
+        i, variation = indexed_variation
+        logger.info(f"Variation {i+1}: {variation}")
+        return create_music(
+            prompt=f"{base_prompt}, {variation}",
+            file_name=f"{base_file_name}_{i:03d}",
             folder=folder,
             duration=duration,
             client=client,
             config=config
         )
-        
+    
+    replicate_config = getattr(config, 'replicate', {}) if config else {}
+    max_workers = getattr(replicate_config, 'max_concurrency', 4) if parallel else 1
+    
+    # map() keeps results in variation order
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = list(executor.map(generate, enumerate(variation_prompts)))
+    
+    generated_files = []
+    for i, result in enumerate(results):
         if result:
             generated_files.append(result)
             logger.info(f"✓ Variation {i+1} generated")
         else:
             logger.error(f"✗ Failed variation {i+1}")
-        
-        # Delay between generations
-        if i < len(variation_prompts) - 1:
-            time.sleep(2)
     
     return generated_files
 
 
+async def create_music_variations_async(base_prompt, variation_prompts, folder, base_file_name="variation",
+                                        duration=30, client=None, config=None, max_concurrency=4):
+    """
+    Generate music variations concurrently.
+
+    Variations are independent of each other, so they are submitted together
+    with create_music_async instead of one after another, with at most
+    max_concurrency Replicate calls in flight at once.
+
+    Args:
+        base_prompt: Base music prompt
+        variation_prompts: List of variation descriptions to append
+        folder: Output folder
+        base_file_name: Base name for files
+        duration: Duration for each variation
+        client: Replicate client
+        config: Configuration
+        max_concurrency: Maximum number of simultaneous generations
+
+    Returns:
+        List of generated file paths, in variation order
+    """
+    logger.info(f"Generating {len(variation_prompts)} variations of base prompt concurrently")
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def generate(i, variation, http_client):
+        async with semaphore:
+            logger.info(f"Variation {i+1}: {variation}")
+            return await create_music_async(
+                prompt=f"{base_prompt}, {variation}",
+                file_name=f"{base_file_name}_{i:03d}",
+                folder=folder,
+                duration=duration,
+                client=client,
+                config=config,
+                http_client=http_client
+            )
+
+    # One connection pool for every download in the batch
+    async with httpx.AsyncClient(follow_redirects=True) as http_client:
+        results = await asyncio.gather(*(generate(i, variation, http_client)
+                                         for i, variation in enumerate(variation_prompts)))
+
+    generated_files = []
+    for i, result in enumerate(results):
+        if result:
+            generated_files.append(result)
+        else:
+            logger.error(f"✗ Failed variation {i+1}")
+    return generated_files
+
+
 def save_music_metadata(file_path, prompt, duration, continuation_from=None, metadata=None):
     """
     Save metadata for generated music file.
@@ -305,4 +695,4 @@ def save_music_metadata(file_path, prompt, duration, continuation_from=None, met
     with open(metadata_path, 'w') as f:
         json.dump(meta, f, indent=2)
     
-    logger.debug(f"Saved metadata to: {metadata_path}")
\ No newline at end of file
+    logger.debug("Saved metadata to: %s", metadata_path)
\ No newline at end of file
@@ -1,8 +1,41 @@
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI, Timeout
+import importlib.util
 import logging
 
+import httpx
+
 logger = logging.getLogger(__name__)
 
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def _http_client_options(config):
+    """
+    Build the shared connection pool settings for OpenAI HTTP clients.
+
+    Only the pool and, when configured, the timeout are set; the SDK's
+    other defaults (a 600 second timeout, following redirects) are kept.
+
+    Args:
+        config: Configuration object with openai settings
+
+    Returns:
+        dict: Keyword arguments for DefaultHttpxClient / DefaultAsyncHttpxClient
+    """
+    openai_config = config.openai
+    options = {
+        'http2': HTTP2_AVAILABLE,
+        'limits': httpx.Limits(
+            max_keepalive_connections=getattr(openai_config, 'max_keepalive_connections', 100),
+            max_connections=getattr(openai_config, 'max_connections', 200)
+        )
+    }
+    timeout = getattr(openai_config, 'timeout', None)
+    if timeout is not None:
+        # The SDK's own Timeout type, which matches the HTTP client it builds on
+        options['timeout'] = Timeout(timeout, connect=getattr(openai_config, 'connect_timeout', 5.0))
+    return options
 
 
 def init_openai_client(config):
@@ -19,9 +52,32 @@ def init_openai_client(config):
         # Access configuration using dot notation
         client = OpenAI(
             api_key=config.openai.api_key,
-            organization=config.openai.organization_id
+            organization=config.openai.organization_id,
+            http_client=DefaultHttpxClient(**_http_client_options(config))
+        )
+        return client
+    except Exception as e:
+        logger.error("Error initializing OpenAI client: %s", e)
+        return None
+
+
+def init_async_openai_client(config):
+    """
+    Initialize the async OpenAI client using configuration.
+
+    Args:
+        config: Configuration object with openai settings
+
+    Returns:
+        AsyncOpenAI: Initialized async OpenAI client or None on failure
+    """
+    try:
+        client = AsyncOpenAI(
+            api_key=config.openai.api_key,
+            organization=config.openai.organization_id,
+            http_client=DefaultAsyncHttpxClient(**_http_client_options(config))
         )
         return client
     except Exception as e:
-        logger.error(f"Error initializing OpenAI client: {e}")
-        return None
\ No newline at end of file
+        logger.error("Error initializing async OpenAI client: %s", e)
+        return None
@@ -1,8 +1,171 @@
+import hashlib
 import os
+import pickle
+import re
+import string
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import get_cache_dir
 
 logger = logging.getLogger(__name__)
 
+_PLACEHOLDER_RE = re.compile(r'{(.*?)}')
+_FIELD_BASE_RE = re.compile(r'[.\[]')
+_FORMATTER = string.Formatter()
+
+# Prompt files are small, loading is dominated by open/read latency
+_MAX_LOAD_WORKERS = 32
+
+
+def extract_placeholders(prompt_text):
+    """
+    Extract the placeholder names used in a prompt template.
+
+    Args:
+        prompt_text: Prompt template text
+
+    Returns:
+        frozenset: Placeholder names required to format the template
+    """
+    if not prompt_text:  # Handle None or empty string
+        return frozenset()
+    try:
+        return frozenset(
+            _FIELD_BASE_RE.split(field, 1)[0]
+            for _, field, _, _ in _FORMATTER.parse(prompt_text)
+            if field is not None
+        )
+    except ValueError:
+        # Malformed template, fall back to a plain brace scan
+        return frozenset(_PLACEHOLDER_RE.findall(prompt_text))
+
+
+def parse_template(prompt_text):
+    """
+    Pre-parse a prompt template for format_template.
+
+    Only templates made of plain {name} and {name:spec} fields are parsed;
+    anything else (conversions, attribute or index access, nested specs)
+    is left to str.format.
+
+    Args:
+        prompt_text: Prompt template text
+
+    Returns:
+        tuple: (literal, field, spec) parts or None if not supported
+    """
+    if not prompt_text:
+        return None
+    try:
+        parsed = tuple(_FORMATTER.parse(prompt_text))
+    except ValueError:
+        return None
+
+    for _, field, spec, conversion in parsed:
+        if field is not None and (conversion or not field.isidentifier() or '{' in spec):
+            return None
+    return tuple((literal, field, spec) for literal, field, spec, _ in parsed)
+
+
+def format_template(parsed, data):
+    """
+    Format a template pre-parsed by parse_template.
+
+    Equivalent to str.format(**data) without re-parsing the template.
+
+    Args:
+        parsed: Parts returned by parse_template
+        data: Dictionary of data to format the template with
+
+    Returns:
+        str: Formatted text
+
+    Raises:
+        KeyError: If a field is missing from data
+    """
+    parts = []
+    for literal, field, spec in parsed:
+        parts.append(literal)
+        if field is not None:
+            parts.append(format(data[field], spec))
+    return "".join(parts)
+
+
+def get_required_keys(prompt):
+    """
+    Get the data keys needed to format a loaded prompt.
+
+    Only the user part of system/user prompts is formatted.
+
+    Args:
+        prompt: Prompt string or dict with 'system'/'user' parts
+
+    Returns:
+        frozenset: Required data keys
+    """
+    if isinstance(prompt, dict):
+        return extract_placeholders(prompt.get('user'))
+    return extract_placeholders(prompt)
+
+
+def get_prompt_required_keys(prompts):
+    """
+    Precompute the required data keys for every loaded prompt.
+
+    Args:
+        prompts: Dictionary of prompt templates from get_prompts
+
+    Returns:
+        dict: Prompt name to frozenset of required data keys
+    """
+    return {name: get_required_keys(prompt) for name, prompt in prompts.items()}
+
+
+def get_prompt_templates(prompts):
+    """
+    Pre-parse the formatted part of every loaded prompt.
+
+    Args:
+        prompts: Dictionary of prompt templates from get_prompts
+
+    Returns:
+        dict: Prompt name to parsed template (None when str.format is needed)
+    """
+    return {
+        name: parse_template(prompt.get('user') if isinstance(prompt, dict) else prompt)
+        for name, prompt in prompts.items()
+    }
+
+
+def _load_prompt_file(file_path):
+    """
+    Read a single prompt file.
+
+    Args:
+        file_path: Path to the prompt file
+
+    Returns:
+        str: File content or None if the file is unreadable or empty
+    """
+    try:
+        with open(file_path, 'r') as file:
+            content = file.read()
+    except PermissionError:
+        logger.warning("Cannot read prompt file (permission denied): %s", file_path)
+        return None
+    except UnicodeDecodeError as e:
+        logger.error("Failed to decode file %s: %s", file_path, e)
+        return None
+    except Exception as e:
+        logger.error("Error processing prompt file %s: %s", file_path, e)
+        return None
+
+    if not content.strip():
+        logger.warning("Empty prompt file: %s", file_path)
+        return None
+    return content
+
 
 def get_prompts(config):
     """
@@ -23,69 +186,139 @@ def get_prompts(config):
     try:
         # Check if directory exists
         if not os.path.exists(directory_path):
-            logging.error(f"Prompt directory not found: {directory_path}")
+            logger.error("Prompt directory not found: %s", directory_path)
             return prompts
             
         if not os.path.isdir(directory_path):
-            logging.error(f"Prompt path is not a directory: {directory_path}")
+            logger.error("Prompt path is not a directory: %s", directory_path)
             return prompts
             
-        file_list = os.listdir(directory_path)
-        logging.info(f"Found {len(file_list)} files in prompt directory")
-        
-        for filename in file_list:
-            try:
-                if not filename.endswith('.txt'):
-                    logging.debug(f"Skipping non-txt file: {filename}")
-                    continue
-                    
-                basename = filename.split('.')[0]
-                file_path = os.path.join(directory_path, filename)
-                
-                # Check if file is readable
-                if not os.access(file_path, os.R_OK):
-                    logging.warning(f"Cannot read prompt file (permission denied): {file_path}")
-                    continue
-                
-                with open(file_path, 'r') as file:
-                    try:
-                        content = file.read()
-                        if not content.strip():
-                            logging.warning(f"Empty prompt file: {file_path}")
-                            continue
-                            
-                        if '.system.txt' in filename:
-                            if basename not in prompts:
-                                prompts[basename] = {}
-                            prompts[basename]['system'] = content
-                            system_count += 1
-                            logging.debug(f"Loaded system prompt: {basename}")
-                        elif '.user.txt' in filename:
-                            if basename not in prompts:
-                                prompts[basename] = {}
-                            prompts[basename]['user'] = content
-                            user_count += 1
-                            logging.debug(f"Loaded user prompt: {basename}")
-                        else:
-                            prompts[basename] = content
-                            standard_count += 1
-                            logging.debug(f"Loaded standard prompt: {basename}")
-                    except UnicodeDecodeError as e:
-                        logging.error(f"Failed to decode file {file_path}: {str(e)}")
-            except Exception as e:
-                logging.error(f"Error processing prompt file {filename}: {str(e)}")
-                
-        logging.info(f"Loaded {len(prompts)} prompt templates (system: {system_count}, user: {user_count}, standard: {standard_count})")
+        with os.scandir(directory_path) as it:
+            entries = list(it)
+        logger.info("Found %s files in prompt directory", len(entries))
+
+        prompt_files = []
+        for entry in entries:
+            if not entry.name.endswith('.txt') or not entry.is_file():
+                logger.debug("Skipping non-txt file: %s", entry.name)
+                continue
+            prompt_files.append(entry.path)
+
+        # Read files concurrently, but build the dict here so no locking is needed
+        workers = max(1, min(_MAX_LOAD_WORKERS, len(prompt_files)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            loaded = list(executor.map(_load_prompt_file, prompt_files))
+
+        for file_path, content in zip(prompt_files, loaded):
+            if content is None:
+                continue
+
+            filename = os.path.basename(file_path)
+            basename = filename.split('.')[0]
+            if '.system.txt' in filename:
+                if basename not in prompts:
+                    prompts[basename] = {}
+                prompts[basename]['system'] = content
+                system_count += 1
+                logger.debug("Loaded system prompt: %s", basename)
+            elif '.user.txt' in filename:
+                if basename not in prompts:
+                    prompts[basename] = {}
+                prompts[basename]['user'] = content
+                user_count += 1
+                logger.debug("Loaded user prompt: %s", basename)
+            else:
+                prompts[basename] = content
+                standard_count += 1
+                logger.debug("Loaded standard prompt: %s", basename)
+
+        logger.info("Loaded %s prompt templates (system: %s, user: %s, standard: %s)",
+                    len(prompts), system_count, user_count, standard_count)
         
         # Validate that prompts with 'system' also have 'user' parts
         for name, prompt in prompts.items():
             if isinstance(prompt, dict):
                 if 'system' in prompt and 'user' not in prompt:
-                    logging.warning(f"Prompt {name} has system part but missing user part")
+                    logger.warning("Prompt %s has system part but missing user part", name)
                 if 'user' in prompt and 'system' not in prompt:
-                    logging.warning(f"Prompt {name} has user part but missing system part")
+                    logger.warning("Prompt %s has user part but missing system part", name)
                     
     except Exception as e:
-        logging.error(f"Failed to load prompts: {str(e)}")
+        logger.error("Failed to load prompts: %s", e)
         
-    return prompts
\ No newline at end of file
+    return prompts
+
+
+def _prompt_cache_path(config):
+    """
+    Get the cache file for the current state of the prompt folder.
+
+    The key covers every file name, size and modification time, so any
+    change in the folder selects a new cache file.
+
+    Args:
+        config: Configuration object containing prompt_folder path
+
+    Returns:
+        Path: Cache file path
+    """
+    directory_path = os.path.abspath(config.prompt_folder)
+    with os.scandir(directory_path) as it:
+        state = sorted(
+            (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+            for entry in it if entry.name.endswith('.txt')
+        )
+
+    digest = hashlib.blake2b(repr((directory_path, state)).encode('utf-8'), digest_size=16)
+    return get_cache_dir(config) / f"prompts_{digest.hexdigest()}.pickle"
+
+
+def load_prompts(config):
+    """
+    Load prompt templates with their required data keys and parsed form.
+
+    When config.prompt_cache is enabled the result is stored in
+    config.cache_dir (default ~/.cache/wl_ai_manager) and reused on later
+    startups until a prompt file changes.
+
+    Args:
+        config: Configuration object containing prompt_folder path
+
+    Returns:
+        tuple: (prompts, required keys, parsed templates) dicts keyed by prompt name
+    """
+    if not getattr(config, 'prompt_cache', False) or not os.path.isdir(config.prompt_folder):
+        prompts = get_prompts(config)
+        return prompts, get_prompt_required_keys(prompts), get_prompt_templates(prompts)
+
+    cache_path = None
+    try:
+        cache_path = _prompt_cache_path(config)
+        if cache_path.exists():
+            with open(cache_path, 'rb') as f:
+                cached = pickle.load(f)
+            logger.info("Loaded %s prompt templates from cache: %s", len(cached['prompts']), cache_path)
+            return cached['prompts'], cached['required_keys'], cached['templates']
+    except Exception as e:
+        logger.warning("Failed to read prompt cache: %s", e)
+
+    prompts = get_prompts(config)
+    required_keys = get_prompt_required_keys(prompts)
+    templates = get_prompt_templates(prompts)
+
+    if cache_path and prompts:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(temp_path, 'wb') as f:
+                pickle.dump({
+                    'prompts': prompts,
+                    'required_keys': required_keys,
+                    'templates': templates
+                }, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, cache_path)
+            logger.debug("Saved prompt cache: %s", cache_path)
+        except Exception as e:
+            logger.warning("Failed to write prompt cache: %s", e)
+
+    return prompts, required_keys, templates
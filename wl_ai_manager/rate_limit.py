@@ -0,0 +1,124 @@
+"""
+Rate limiting module for ai_manager.
+Provides a token bucket shared by sync and async callers, so concurrent
+requests are paced below the provider's rate limit instead of triggering
+429 responses and retries.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Token bucket limiter, usable as a sync or async context manager.
+
+    Up to max_rate requests may start at once; after that requests are
+    spaced to max_rate per time_period. Each caller reserves a token under a
+    lock and then sleeps outside it, so waiting threads and coroutines are
+    served in arrival order without holding the lock.
+    """
+
+    def __init__(self, max_rate, time_period=60.0):
+        """
+        Initialize the bucket, full.
+
+        Args:
+            max_rate: Requests allowed per time_period (also the burst size)
+            time_period: Length of the rate window in seconds
+        """
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._rate = max_rate / time_period
+        self._tokens = float(max_rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """
+        Take a token, borrowing against future refills when empty.
+
+        Returns:
+            float: Seconds to wait before the reserved token may be used
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.max_rate, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self._rate
+
+    def acquire(self):
+        """
+        Wait until a request may start.
+        """
+        delay = self._reserve()
+        if delay > 0:
+            logger.debug("Rate limit reached, waiting %.2fs", delay)
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        """
+        Wait until a request may start without blocking the event loop.
+        """
+        delay = self._reserve()
+        if delay > 0:
+            logger.debug("Rate limit reached, waiting %.2fs", delay)
+            await asyncio.sleep(delay)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    async def __aenter__(self):
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class RateLimitedClient:
+    """
+    Proxy for a Replicate client that takes a token before every prediction.
+
+    Optionally also caps how many sync predictions are in flight at once.
+    Everything other than run/async_run is passed through unchanged, so the
+    proxy can be handed to any function that expects the client.
+    """
+
+    def __init__(self, client, limiter, max_in_flight=None):
+        """
+        Wrap a client.
+
+        Args:
+            client: replicate.Client instance
+            limiter: TokenBucket shared by all predictions
+            max_in_flight: Maximum concurrent run() calls (optional)
+        """
+        self._client = client
+        self._limiter = limiter
+        self._in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+
+    def run(self, *args, **kwargs):
+        if self._in_flight is None:
+            with self._limiter:
+                return self._client.run(*args, **kwargs)
+        with self._in_flight, self._limiter:
+            return self._client.run(*args, **kwargs)
+
+    async def async_run(self, *args, **kwargs):
+        async with self._limiter:
+            return await self._client.async_run(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
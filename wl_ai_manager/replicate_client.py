@@ -0,0 +1,102 @@
+"""
+Replicate client module for ai_manager.
+Provides one pooled Replicate client per API key, shared by image, video
+and music generation.
+"""
+
+import functools
+import importlib.util
+import logging
+
+import httpx
+import replicate
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class _PooledTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Sized, HTTP/2-capable connection pool for both of replicate's clients.
+
+    replicate passes the same ``transport`` to its sync and async httpx
+    clients, so this keeps one pool of each kind and hands requests to the
+    matching one.
+    """
+
+    def __init__(self, limits):
+        self._sync = httpx.HTTPTransport(http2=HTTP2_AVAILABLE, limits=limits)
+        self._async = httpx.AsyncHTTPTransport(http2=HTTP2_AVAILABLE, limits=limits)
+
+    def handle_request(self, request):
+        return self._sync.handle_request(request)
+
+    async def handle_async_request(self, request):
+        return await self._async.handle_async_request(request)
+
+    def close(self):
+        self._sync.close()
+
+    async def aclose(self):
+        await self._async.aclose()
+
+
+@functools.lru_cache(maxsize=None)
+def _create_client(api_key, max_connections, max_keepalive_connections):
+    """
+    Create a pooled Replicate client, once per distinct set of arguments.
+
+    Args:
+        api_key: Replicate API token
+        max_connections: Maximum open connections in the pool
+        max_keepalive_connections: Idle connections kept alive for reuse
+
+    Returns:
+        replicate.Client: New client
+    """
+    logger.debug("Creating Replicate client (http2=%s)", HTTP2_AVAILABLE)
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections)
+    return replicate.Client(api_token=api_key, transport=_PooledTransport(limits))
+
+
+def get_replicate_client(api_key, max_connections=32, max_keepalive_connections=16):
+    """
+    Get the Replicate client for an API key, creating it on first use.
+
+    Every caller with the same key shares one connection pool, so
+    concurrent generations reuse connections instead of each paying a
+    TCP/TLS handshake.
+
+    Args:
+        api_key: Replicate API token
+        max_connections: Maximum open connections in the pool
+        max_keepalive_connections: Idle connections kept alive for reuse
+
+    Returns:
+        replicate.Client: Shared client
+    """
+    return _create_client(api_key, max_connections, max_keepalive_connections)
+
+
+def get_replicate_client_from_config(config):
+    """
+    Get the shared Replicate client for a configuration.
+
+    Args:
+        config: Configuration object with replicate settings
+
+    Returns:
+        replicate.Client or None if no API key is configured
+    """
+    replicate_config = config.get('replicate', {}) if config else {}
+    api_key = replicate_config.get('api_key')
+    if not api_key:
+        logger.error("No Replicate API key found in configuration")
+        return None
+    return get_replicate_client(
+        api_key,
+        replicate_config.get('max_connections', 32),
+        replicate_config.get('max_keepalive_connections', 16)
+    )
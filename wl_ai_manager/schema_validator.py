@@ -3,13 +3,183 @@ Schema validation module for ai_manager.
 Provides JSON schema validation for AI responses and data structures.
 """
 
-import json
+import functools
+import hashlib
+import io
 import logging
+import os
+import pickle
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import Dict, Any, Optional, Union
-from jsonschema import validate, ValidationError, Draft7Validator
+
+import orjson
+import yaml
+from jsonschema import Draft7Validator
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
+
+from .cache import get_cache_dir
+from .prompts import format_template, parse_template
 
 logger = logging.getLogger(__name__)
 
+# Use the libyaml C parser when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# Wrapper text LLMs put around structured output, matched in one pass per line
+_SKIP_PATTERNS = (
+    'here is the',
+    'here\'s the',
+    'the json is',
+    'the yaml is',
+    'response:',
+    'result:',
+    'output:',
+    '```json',
+    '```yaml',
+    '```'
+)
+_SKIP_RE = re.compile('|'.join(map(re.escape, _SKIP_PATTERNS)), re.IGNORECASE)
+
+# Prose lead-in such as "The response is:" before the data starts; only
+# dropped when a JSON document or code fence follows, since a YAML key
+# with a space in it looks the same
+_INTRO_RE = re.compile(r'[^\s{}\[\]"]+(?:[ \t]+[^\s{}\[\]"]+)+[ \t]*:')
+
+# First characters of a JSON document other than the bare literals
+_JSON_START_CHARS = frozenset('{["-0123456789')
+
+# Schema keywords whose failures mean the response has the wrong shape
+# altogether; the model rarely fixes these on a blind retry
+_STRUCTURAL_KEYWORDS = frozenset(('additionalProperties', 'propertyNames'))
+
+# Longest validation message quoted back to the model
+_MAX_HINT_LENGTH = 200
+
+# Ad-hoc schemas whose compiled validators are kept between calls
+_MAX_ADHOC_VALIDATORS = 64
+
+
+# Schema files are small, loading is dominated by open/read latency
+_MAX_LOAD_WORKERS = 8
+_MIN_PARALLEL_SCHEMA_FILES = 4
+
+# Default template for create_schema_prompt
+_DEFAULT_SCHEMA_TEMPLATE = """{base_prompt}
+
+Please respond with structured data in the following format:
+
+{schema_example}
+
+Return only the structured data without any additional text or explanations."""
+
+
+def _split_default_template():
+    """
+    Split the default schema template around its two placeholders.
+
+    Returns:
+        tuple: (prefix, middle, suffix) literal text
+    """
+    prefix, rest = _DEFAULT_SCHEMA_TEMPLATE.split('{base_prompt}', 1)
+    middle, suffix = rest.split('{schema_example}', 1)
+    return prefix, middle, suffix
+
+
+_DEFAULT_TEMPLATE_PARTS = _split_default_template()
+
+
+@functools.lru_cache(maxsize=32)
+def _parse_schema_template(template: str):
+    """
+    Parse a custom schema prompt template once.
+
+    Args:
+        template: Template with {base_prompt} and {schema_example} fields
+
+    Returns:
+        Parts for format_template, or None if str.format must be used
+    """
+    return parse_template(template)
+
+
+def _read_schema_file(path: str) -> str:
+    """
+    Read one .schema.txt file.
+
+    Args:
+        path: Schema file path
+
+    Returns:
+        str: Schema content without surrounding whitespace
+    """
+    with open(path, 'r') as f:
+        return f.read().strip()
+
+
+def _drop_lead_in(response: str):
+    """
+    Yield the lines of a response without a prose lead-in before the data.
+
+    A multi-word line ending in a colon such as "The response is:" is held
+    until the first data line shows what it was: it is dropped when a code
+    fence or an unindented JSON document follows, and kept otherwise since
+    a YAML key with a space in it looks the same.
+
+    Lines are read one at a time from a StringIO, which only splits on
+    line feeds, unlike str.splitlines(), so a raw U+2028 inside a JSON
+    string survives.
+
+    Args:
+        response: Raw LLM response
+
+    Yields:
+        str: Lines without their newline
+    """
+    lines = (line.rstrip('\n') for line in io.StringIO(response))
+    pending = []
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith('```'):
+            # Everything before an opening fence is prose
+            yield line
+            break
+        if not stripped or _SKIP_RE.search(line) or _INTRO_RE.fullmatch(stripped):
+            pending.append(line)
+            continue
+        if line[0] not in '{[':
+            yield from pending
+        yield line
+        break
+    else:
+        yield from pending
+    yield from lines
+
+
+def _iter_kept_lines(lines):
+    """
+    Yield the lines that sanitize_response keeps.
+
+    Args:
+        lines: Response lines without their newline
+
+    Yields:
+        str: Lines that are not wrapper text or leading blank lines
+    """
+    started = False
+    for line in lines:
+        # Skip lines that match wrapper patterns
+        if _SKIP_RE.search(line):
+            continue
+        # Skip empty lines at start
+        if not started:
+            if not line.strip():
+                continue
+            started = True
+        yield line
+
 
 class SchemaValidator:
     """
@@ -25,6 +195,8 @@ class SchemaValidator:
         """
         self.config = config
         self.schemas = {}
+        self._validators = {}
+        self._adhoc_validators = {}
         self.logger = logging.getLogger(__name__)
         
         if config and hasattr(config, 'schema_folder'):
@@ -38,30 +210,105 @@ class SchemaValidator:
         Args:
             schema_folder: Path to folder containing .schema.txt files
         """
-        import os
-        
         if not os.path.exists(schema_folder):
             self.logger.warning(f"Schema folder not found: {schema_folder}")
             return
             
         try:
-            for filename in os.listdir(schema_folder):
-                if filename.endswith('.schema.txt'):
+            with os.scandir(schema_folder) as it:
+                entries = [entry for entry in it
+                           if entry.name.endswith('.schema.txt') and entry.is_file()]
+            
+            cache_path = None
+            if getattr(self.config, 'prompt_cache', False):
+                cache_path = self._schema_cache_path(schema_folder, entries)
+                cached = self._read_schema_cache(cache_path)
+                if cached is not None:
+                    self.schemas.update(cached)
+                    self.logger.info(f"Loaded {len(cached)} schemas from cache: {cache_path}")
+                    return
+            
+            # Reads are I/O bound, so threads help on slow or network storage;
+            # a handful of files is quicker to read inline
+            paths = [entry.path for entry in entries]
+            if len(paths) >= _MIN_PARALLEL_SCHEMA_FILES:
+                with ThreadPoolExecutor(max_workers=min(_MAX_LOAD_WORKERS, len(paths))) as executor:
+                    contents = list(executor.map(_read_schema_file, paths))
+            else:
+                contents = [_read_schema_file(path) for path in paths]
+            
+            loaded = {}
+            for entry, schema_content in zip(entries, contents):
+                if schema_content:
                     # Remove .schema.txt to get base prompt name
-                    schema_name = filename.replace('.schema.txt', '')
-                    schema_path = os.path.join(schema_folder, filename)
-                    
-                    with open(schema_path, 'r') as f:
-                        schema_content = f.read().strip()
-                        if schema_content:
-                            self.schemas[schema_name] = schema_content
-                            self.logger.debug(f"Loaded schema for prompt: {schema_name}")
-                        
+                    schema_name = entry.name[:-len('.schema.txt')]
+                    loaded[schema_name] = schema_content
+                    self.logger.debug("Loaded schema for prompt: %s", schema_name)
+            
+            self.schemas.update(loaded)
             self.logger.info(f"Loaded {len(self.schemas)} schemas from {schema_folder}")
             
+            if cache_path and loaded:
+                self._write_schema_cache(cache_path, loaded)
+            
         except Exception as e:
             self.logger.error(f"Error loading schemas from folder: {e}")
     
+    def _schema_cache_path(self, schema_folder: str, entries) -> Path:
+        """
+        Get the cache file for the current state of a schema folder.
+
+        The key covers every schema file name, size and modification time,
+        so any change in the folder selects a new cache file.
+
+        Args:
+            schema_folder: Path to folder containing .schema.txt files
+            entries: os.DirEntry objects for the schema files
+
+        Returns:
+            Path: Cache file path
+        """
+        state = sorted((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size) for entry in entries)
+        key = repr((os.path.abspath(schema_folder), state)).encode('utf-8')
+        digest = hashlib.blake2b(key, digest_size=16)
+        return get_cache_dir(self.config) / f"schemas_{digest.hexdigest()}.pickle"
+    
+    def _read_schema_cache(self, cache_path: Path) -> Optional[Dict[str, str]]:
+        """
+        Read schemas saved by _write_schema_cache.
+
+        Args:
+            cache_path: Cache file path
+
+        Returns:
+            Dict of schema contents by name, or None on a miss
+        """
+        try:
+            if cache_path.exists():
+                with open(cache_path, 'rb') as f:
+                    return pickle.load(f)
+        except Exception as e:
+            self.logger.warning(f"Failed to read schema cache: {e}")
+        return None
+    
+    def _write_schema_cache(self, cache_path: Path, schemas: Dict[str, str]) -> None:
+        """
+        Save loaded schemas so later startups read one file instead of many.
+
+        Args:
+            cache_path: Cache file path
+            schemas: Dict of schema contents by name
+        """
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(temp_path, 'wb') as f:
+                pickle.dump(schemas, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, cache_path)
+            self.logger.debug("Saved schema cache: %s", cache_path)
+        except Exception as e:
+            self.logger.warning(f"Failed to write schema cache: {e}")
+    
     def create_schema_prompt(self, base_prompt: str, schema_content: str, template: str = None) -> str:
         """
         Create a prompt that includes schema example for structured output.
@@ -75,25 +322,16 @@ class SchemaValidator:
             Combined prompt with schema instructions
         """
         if template:
-            # Use custom template if provided
-            return template.format(
-                base_prompt=base_prompt,
-                schema_example=schema_content
-            )
+            # Use custom template if provided, parsed once per distinct template
+            parsed = _parse_schema_template(template)
+            data = {'base_prompt': base_prompt, 'schema_example': schema_content}
+            if parsed is None:
+                return template.format(**data)
+            return format_template(parsed, data)
         
-        # Default template
-        default_template = """{base_prompt}
-
-Please respond with structured data in the following format:
-
-{schema_example}
-
-Return only the structured data without any additional text or explanations."""
-        
-        return default_template.format(
-            base_prompt=base_prompt,
-            schema_example=schema_content
-        )
+        # Default template, split around its placeholders at import
+        prefix, middle, suffix = _DEFAULT_TEMPLATE_PARTS
+        return f"{prefix}{base_prompt}{middle}{schema_content}{suffix}"
     
     def add_schema(self, name: str, schema: Dict[str, Any]) -> None:
         """
@@ -107,11 +345,28 @@ Return only the structured data without any additional text or explanations."""
             # Validate that the schema itself is valid
             Draft7Validator.check_schema(schema)
             self.schemas[name] = schema
-            self.logger.debug(f"Added schema: {name}")
+            # Compile once, validate_data reuses it for every response
+            self._validators[name] = (schema, validator_for(schema)(schema))
+            self.logger.debug("Added schema: %s", name)
         except Exception as e:
             self.logger.error(f"Invalid schema for '{name}': {e}")
             raise
     
+    def get_validator(self, schema_name: str):
+        """
+        Get the compiled validator for a schema added with add_schema.
+
+        Args:
+            schema_name: Name of the schema
+
+        Returns:
+            jsonschema validator or None if the schema is not a compiled JSON schema
+        """
+        compiled = self._validators.get(schema_name)
+        if compiled and compiled[0] is self.schemas.get(schema_name):
+            return compiled[1]
+        return None
+
     def validate_data(self, data: Any, schema_name: str) -> Dict[str, Any]:
         """
         Validate data against a named schema.
@@ -131,6 +386,10 @@ Return only the structured data without any additional text or explanations."""
                 'errors': [error_msg]
             }
         
+        validator = self.get_validator(schema_name)
+        if validator is not None:
+            return self._run_validator(validator, data)
+
         return self.validate_data_with_schema(data, self.schemas[schema_name])
     
     def validate_data_with_schema(self, data: Any, schema: Dict[str, Any]) -> Dict[str, Any]:
@@ -145,22 +404,40 @@ Return only the structured data without any additional text or explanations."""
             Dict with 'valid' bool and 'errors' list
         """
         try:
-            validate(instance=data, schema=schema)
-            return {
-                'valid': True,
-                'errors': []
-            }
-        except ValidationError as e:
-            error_details = {
-                'message': e.message,
-                'path': list(e.path) if e.path else [],
-                'invalid_value': e.instance
-            }
-            self.logger.debug(f"Validation error: {error_details}")
+            # Callers usually pass the same schema object on every retry,
+            # so compile it once; the identity check guards against id reuse
+            cached = self._adhoc_validators.get(id(schema))
+            if cached and cached[0] is schema:
+                validator = cached[1]
+            else:
+                validator_class = validator_for(schema)
+                validator_class.check_schema(schema)
+                validator = validator_class(schema)
+                if len(self._adhoc_validators) >= _MAX_ADHOC_VALIDATORS:
+                    self._adhoc_validators.clear()
+                self._adhoc_validators[id(schema)] = (schema, validator)
+            return self._run_validator(validator, data)
+        except Exception as e:
+            error_msg = f"Schema validation failed: {str(e)}"
+            self.logger.error(error_msg)
             return {
                 'valid': False,
-                'errors': [error_details]
+                'errors': [error_msg]
             }
+
+    def _run_validator(self, validator, data: Any) -> Dict[str, Any]:
+        """
+        Validate data with a compiled validator.
+
+        Args:
+            validator: jsonschema validator instance
+            data: Data to validate
+
+        Returns:
+            Dict with 'valid' bool and 'errors' list
+        """
+        try:
+            error = best_match(validator.iter_errors(data))
         except Exception as e:
             error_msg = f"Schema validation failed: {str(e)}"
             self.logger.error(error_msg)
@@ -168,6 +445,24 @@ Return only the structured data without any additional text or explanations."""
                 'valid': False,
                 'errors': [error_msg]
             }
+
+        if error is None:
+            return {
+                'valid': True,
+                'errors': []
+            }
+
+        error_details = {
+            'message': error.message,
+            'path': list(error.path) if error.path else [],
+            'invalid_value': error.instance,
+            'validator': error.validator
+        }
+        self.logger.debug("Validation error: %s", error_details)
+        return {
+            'valid': False,
+            'errors': [error_details]
+        }
     
     def validate_json_string(self, json_string: str, schema_name: str) -> Dict[str, Any]:
         """
@@ -181,12 +476,12 @@ Return only the structured data without any additional text or explanations."""
             Dict with 'valid' bool, 'errors' list, and 'data' if valid
         """
         try:
-            data = json.loads(json_string)
+            data = orjson.loads(json_string)
             result = self.validate_data(data, schema_name)
             if result['valid']:
                 result['data'] = data
             return result
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             error_msg = f"Invalid JSON: {str(e)}"
             self.logger.error(error_msg)
             return {
@@ -244,55 +539,23 @@ Return only the structured data without any additional text or explanations."""
         if not response:
             return response
             
-        # Remove common wrapper phrases
-        lines = response.strip().split('\n')
-        cleaned_lines = []
-        
-        skip_patterns = [
-            'here is the',
-            'here\'s the', 
-            'the json is',
-            'the yaml is',
-            'response:',
-            'result:',
-            'output:',
-            '```json',
-            '```yaml',
-            '```'
-        ]
-        
-        for line in lines:
-            line_lower = line.lower().strip()
-            
-            # Skip lines that match wrapper patterns
-            if any(pattern in line_lower for pattern in skip_patterns):
-                continue
-                
-            # Skip empty lines at start
-            if not cleaned_lines and not line.strip():
-                continue
-                
-            cleaned_lines.append(line)
-        
-        # Remove trailing empty lines and closing code blocks
-        while cleaned_lines and (not cleaned_lines[-1].strip() or cleaned_lines[-1].strip() == '```'):
-            cleaned_lines.pop()
-            
-        return '\n'.join(cleaned_lines).strip()
+        # Trailing blank lines go with the final strip; closing code
+        # fences already match _SKIP_RE
+        return '\n'.join(_iter_kept_lines(_drop_lead_in(response))).strip()
     
-    def validate_structured_response(self, response: str) -> Dict[str, Any]:
+    def validate_structured_response(self, response: str, validator=None) -> Dict[str, Any]:
         """
         Validate a structured response (JSON or YAML) and parse it.
         Automatically sanitizes the response first.
         
         Args:
             response: Response string to validate and parse
+            validator: Compiled jsonschema validator the parsed data must
+                satisfy, e.g. from get_validator (optional)
             
         Returns:
             Dict with validation results and parsed data
         """
-        import yaml
-        
         # First sanitize the response
         sanitized = self.sanitize_response(response)
         
@@ -304,36 +567,30 @@ Return only the structured data without any additional text or explanations."""
                 'errors': ['Empty response after sanitization']
             }
         
-        # Try JSON first
-        try:
-            data = json.loads(sanitized)
-            return {
-                'valid': True,
-                'data': data,
-                'format': 'json',
-                'errors': [],
-                'sanitized_response': sanitized
-            }
-        except json.JSONDecodeError as json_err:
-            pass
+        # Only text that can start a JSON document is worth a JSON parse
+        json_err = None
+        if sanitized[0] in _JSON_START_CHARS:
+            try:
+                data = orjson.loads(sanitized)
+            except orjson.JSONDecodeError as e:
+                json_err = e
+            else:
+                return self._structured_result(data, 'json', sanitized, validator)
         
         # Try YAML
         try:
-            data = yaml.safe_load(sanitized)
-            if data is not None:  # YAML can return None for empty strings
-                return {
-                    'valid': True,
-                    'data': data,
-                    'format': 'yaml',
-                    'errors': [],
-                    'sanitized_response': sanitized
-                }
+            data = yaml.load(sanitized, Loader=_YAML_LOADER)
+            # Plain text loads as a YAML scalar, which is not structured data
+            if isinstance(data, (dict, list)):
+                return self._structured_result(data, 'yaml', sanitized, validator)
         except yaml.YAMLError as yaml_err:
+            errors = [f"JSON error: {str(json_err)}"] if json_err else []
+            errors.append(f"YAML error: {str(yaml_err)}")
             return {
                 'valid': False,
                 'data': None,
                 'format': 'unknown',
-                'errors': [f"JSON error: {str(json_err)}", f"YAML error: {str(yaml_err)}"],
+                'errors': errors,
                 'sanitized_response': sanitized
             }
         
@@ -345,6 +602,69 @@ Return only the structured data without any additional text or explanations."""
             'sanitized_response': sanitized
         }
     
+    def _structured_result(self, data: Any, data_format: str, sanitized: str, validator=None) -> Dict[str, Any]:
+        """
+        Build the validate_structured_response result for parsed data.
+
+        Args:
+            data: Parsed response data
+            data_format: 'json' or 'yaml'
+            sanitized: Sanitized response text
+            validator: Compiled jsonschema validator to check the data with (optional)
+
+        Returns:
+            Dict with validation results and parsed data
+        """
+        if validator is not None:
+            result = self._run_validator(validator, data)
+            if not result['valid']:
+                return {
+                    'valid': False,
+                    'data': None,
+                    'format': data_format,
+                    'errors': result['errors'],
+                    'sanitized_response': sanitized
+                }
+
+        return {
+            'valid': True,
+            'data': data,
+            'format': data_format,
+            'errors': [],
+            'sanitized_response': sanitized
+        }
+    
+    def classify_errors(self, errors: list) -> Dict[str, Any]:
+        """
+        Decide whether a failed structured response is worth retrying.
+
+        Content errors (a missing field, a wrong leaf type, a bad enum value)
+        and unparseable output are retriable, and each gets a hint the next
+        attempt can be told about. Structural errors (unexpected properties,
+        the wrong top-level type, a broken schema) are not.
+
+        Args:
+            errors: 'errors' list from a validation result
+
+        Returns:
+            Dict with 'retriable' bool and 'hints' list of strings
+        """
+        hints = []
+        for error in errors:
+            if isinstance(error, dict):
+                keyword = error.get('validator')
+                path = error.get('path') or []
+                if keyword in _STRUCTURAL_KEYWORDS or (keyword == 'type' and not path):
+                    return {'retriable': False, 'hints': []}
+                location = '/'.join(map(str, path)) or 'top level'
+                hints.append(f"{location}: {error.get('message', '')[:_MAX_HINT_LENGTH]}")
+            elif str(error).startswith('Schema validation failed'):
+                # The schema itself could not be applied
+                return {'retriable': False, 'hints': []}
+            else:
+                hints.append("Respond with only valid JSON or YAML matching the schema, with no other text.")
+        return {'retriable': True, 'hints': hints}
+    
     def list_schemas(self) -> list:
         """
         Get list of available schema names.
@@ -367,14 +687,14 @@ Return only the structured data without any additional text or explanations."""
         """
         if expected_format == 'json':
             try:
-                data = json.loads(response)
+                data = orjson.loads(response)
                 return {
                     'valid': True,
                     'data': data,
                     'format': 'json',
                     'errors': []
                 }
-            except json.JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 return {
                     'valid': False,
                     'data': None,
@@ -0,0 +1,181 @@
+"""
+Semantic response caching module for ai_manager.
+Serves near-duplicate requests from cache using OpenAI embeddings.
+"""
+
+import copy
+import logging
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """
+    Embedding-based response cache for rephrased but equivalent requests.
+
+    Entries are grouped in buckets (prompt name, model, ...) so only requests
+    for the same prompt are ever compared against each other.
+    """
+
+    def __init__(self, client, threshold=0.95, model="text-embedding-3-small",
+                 max_entries=1000, path=None):
+        """
+        Initialize the semantic cache.
+
+        Args:
+            client: OpenAI client used to create embeddings
+            threshold: Minimum cosine similarity for a cache hit
+            model: Embedding model to use
+            max_entries: Maximum entries kept per bucket
+            path: Optional JSON file used to persist the cache
+        """
+        self.client = client
+        self.threshold = threshold
+        self.model = model
+        self.max_entries = max_entries
+        self.path = Path(path) if path else None
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+        if self.path and self.path.exists():
+            self.load()
+
+    def embed(self, text):
+        """
+        Create a normalized embedding for text.
+
+        Args:
+            text: Text to embed
+
+        Returns:
+            numpy array or None on failure
+        """
+        try:
+            response = self.client.embeddings.create(model=self.model, input=text)
+            vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            return vector / norm if norm else vector
+        except Exception as e:
+            logger.error("Error creating embedding: %s", e)
+            return None
+
+    def lookup(self, bucket, embedding):
+        """
+        Find the cached response most similar to an embedding.
+
+        Args:
+            bucket: Bucket key the request belongs to
+            embedding: Normalized embedding from embed()
+
+        Returns:
+            Cached response or None if nothing is similar enough
+        """
+        with self._lock:
+            entry = self._buckets.get(bucket)
+            if not entry or not entry['responses']:
+                return None
+            similarities = entry['vectors'] @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            logger.debug("Semantic cache hit with similarity %.3f", similarities[best])
+            response = entry['responses'][best]
+
+        # Structured responses are mutable, hand out a private copy
+        if isinstance(response, str):
+            return response
+        return copy.deepcopy(response)
+
+    def add(self, bucket, embedding, response):
+        """
+        Add a response to the cache.
+
+        Args:
+            bucket: Bucket key the request belongs to
+            embedding: Normalized embedding from embed()
+            response: Response to cache
+        """
+        if not isinstance(response, str):
+            response = copy.deepcopy(response)
+
+        with self._lock:
+            entry = self._buckets.get(bucket)
+            if entry is None:
+                entry = {'vectors': embedding[np.newaxis, :], 'responses': [response]}
+                self._buckets[bucket] = entry
+            else:
+                entry['vectors'] = np.vstack([entry['vectors'], embedding])
+                entry['responses'].append(response)
+
+            # Drop the oldest entries once the bucket is full
+            overflow = len(entry['responses']) - self.max_entries
+            if overflow > 0:
+                entry['vectors'] = entry['vectors'][overflow:]
+                del entry['responses'][:overflow]
+
+    def clear(self):
+        """
+        Remove all cached entries.
+        """
+        with self._lock:
+            self._buckets.clear()
+
+    def save(self):
+        """
+        Persist the cache to its JSON file.
+        """
+        if not self.path:
+            return
+
+        with self._lock:
+            payload = {
+                'model': self.model,
+                'buckets': {
+                    bucket: {
+                        'vectors': entry['vectors'],
+                        'responses': list(entry['responses'])
+                    }
+                    for bucket, entry in self._buckets.items()
+                }
+            }
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.path.with_suffix('.tmp')
+            with open(temp_path, 'wb') as f:
+                f.write(orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY))
+            os.replace(temp_path, self.path)
+            logger.debug("Saved semantic cache to: %s", self.path)
+        except Exception as e:
+            logger.error("Error saving semantic cache: %s", e)
+
+    def load(self):
+        """
+        Load the cache from its JSON file.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                payload = orjson.loads(f.read())
+
+            # Embeddings from another model are not comparable
+            if payload.get('model') != self.model:
+                logger.warning("Ignoring semantic cache built with model %s", payload.get('model'))
+                return
+
+            with self._lock:
+                self._buckets = {
+                    bucket: {
+                        'vectors': np.asarray(entry['vectors'], dtype=np.float32),
+                        'responses': entry['responses']
+                    }
+                    for bucket, entry in payload['buckets'].items()
+                }
+            logger.info("Loaded semantic cache from: %s", self.path)
+        except Exception as e:
+            logger.error("Error loading semantic cache: %s", e)
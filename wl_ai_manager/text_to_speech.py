@@ -15,7 +15,7 @@ logger = logging.getLogger(__name__)
 
 
 
-def generate_speech(text, voice, model, output_path, client=None):
+def generate_speech(text, voice, model, output_path, client=None, overwrite=True):
     """
     Generate speech using OpenAI's TTS API and save it as WAV file.
     
@@ -24,13 +24,19 @@ def generate_speech(text, voice, model, output_path, client=None):
         voice: Voice to use
         model: TTS model to use
         output_path: Path where to save WAV file
-        config: Configuration object with openai settings
+        client: Initialized OpenAI client
+        overwrite: Regenerate even if output_path already exists. Pass False
+            for content-addressed paths so an existing file is reused.
         
     Returns:
-        str: True on success or None on failure
+        str: Output path on success or None on failure
     """
+    temp_path = None
     try:
-        
+        if not overwrite and os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            logger.info("Reusing existing WAV file: %s", output_path)
+            return output_path
+
         # Ensure output directory exists
         if output_path:
             Path(output_path).parent.mkdir(parents=True, exist_ok=True)
@@ -40,22 +46,27 @@ def generate_speech(text, voice, model, output_path, client=None):
             return None
 
         # Generate speech using OpenAI API
-        logger.info(f"Generating TTS for: '{text[:50]}...' using voice: {voice}, model: {model}")
+        logger.info("Generating TTS for: '%s...' using voice: %s, model: %s", text[:50], voice, model)
         
-        response = client.audio.speech.create(
+        # Stream the WAV to disk as it arrives instead of buffering it in memory.
+        # Write to a temp file first so a crash never leaves a partial file behind.
+        temp_path = f"{output_path}.{uuid.uuid4().hex}.tmp"
+        with client.audio.speech.with_streaming_response.create(
             model=model,
             voice=voice,
             input=text,
             response_format="wav"
-        )
-        
-        # Save WAV file
-        with open(output_path, "wb") as f:
-            f.write(response.content)
+        ) as response:
+            response.stream_to_file(temp_path)
+        os.replace(temp_path, output_path)
+        temp_path = None
         
-        logger.info(f"Saved WAV file: {output_path}")
+        logger.info("Saved WAV file: %s", output_path)
         return output_path
         
     except Exception as e:
-        logger.error(f"Error generating speech: {e}")
-        return None
\ No newline at end of file
+        logger.error("Error generating speech: %s", e)
+        return None
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -3,17 +3,41 @@ Transcription module for audio_manager.
 Provides audio transcription functionality using OpenAI's Whisper API.
 """
 
+import io
 import os
 import logging
 import wave
-import tempfile
 from pathlib import Path
+import numpy as np
 import soundfile as sf
 import openai
 
 logger = logging.getLogger(__name__)
 
-def transcribe_audio(audio_data=None, audio_path=None, client=None):
+
+def _pcm16_wav(audio_data, sample_rate):
+    """
+    Frame int16 PCM samples as WAV without going through libsndfile.
+
+    Args:
+        audio_data: int16 numpy array, shape (frames,) or (frames, channels)
+        sample_rate: Sample rate in Hz
+
+    Returns:
+        io.BytesIO: WAV file positioned at the start
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1 if audio_data.ndim == 1 else audio_data.shape[1])
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        # WAV is little-endian; tobytes() is a single copy in native order
+        wav.writeframes(audio_data.astype('<i2', copy=False).tobytes())
+    buffer.seek(0)
+    return buffer
+
+
+def transcribe_audio(audio_data=None, audio_path=None, config=None, client=None):
     """
     Transcribe audio using OpenAI Whisper API
     
@@ -26,7 +50,7 @@ def transcribe_audio(audio_data=None, audio_path=None, client=None):
     Returns:
         The transcribed text or None on failure
     """
-    logger.debug(f"Transcribing audio, data type: {type(audio_data) if audio_data else 'None'}, path: {audio_path}")
+    logger.debug("Transcribing audio, data type: %s, path: %s", type(audio_data).__name__, audio_path)
 
   
     if audio_data is None and (not audio_path or not os.path.exists(audio_path)):
@@ -37,42 +61,38 @@ def transcribe_audio(audio_data=None, audio_path=None, client=None):
         logger.error("No OpenAI client available")
         return None
     
+    openai_config = getattr(config, "openai", None)
+    model = getattr(openai_config, "whisper_model", "whisper-1")
+    
     try:
         # If audio_path is provided and file exists, use it directly
         if audio_path and os.path.exists(audio_path):
-            logger.debug(f"Using existing audio file: {audio_path}")
+            logger.debug("Using existing audio file: %s", audio_path)
             with open(audio_path, "rb") as audio_file:
                 transcript = client.audio.transcriptions.create(
-                    model=config.openai.whisper_model,
+                    model=model,
                     file=audio_file
                 )
-        # Otherwise, create a temporary file
+        # Otherwise upload from memory, the API only needs a named file object
         else:
-            temp_dir = getattr(config, "temp_dir", "/tmp")
-            sample_rate = getattr(config, "sample_rate", 44100)
+            # If audio_data is binary, send it as is
+            if isinstance(audio_data, bytes):
+                audio_file = io.BytesIO(audio_data)
+            # 16-bit PCM only needs a WAV header, no encoding
+            elif getattr(audio_data, "dtype", None) == np.int16 and audio_data.ndim in (1, 2):
+                audio_file = _pcm16_wav(audio_data, getattr(config, "sample_rate", 44100))
+            # Otherwise assume it's a numpy array
+            else:
+                sample_rate = getattr(config, "sample_rate", 44100)
+                audio_file = io.BytesIO()
+                sf.write(audio_file, audio_data, sample_rate, format='WAV')
+                audio_file.seek(0)
+            audio_file.name = "audio.wav"
             
-            logger.debug(f"Creating temporary file for transcription in {temp_dir}")
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-                temp_path = f.name
-                
-                # If audio_data is binary, write directly
-                if isinstance(audio_data, bytes):
-                    f.write(audio_data)
-                # Otherwise assume it's a numpy array
-                else:
-                    sf.write(f.name, audio_data, sample_rate, format='WAV')
-                
-            try:
-                logger.debug(f"Opening temp file for transcription: {temp_path}")
-                with open(temp_path, "rb") as audio_file:
-                    transcript = client.audio.transcriptions.create(
-                        model=config.openai.whisper_model,
-                        file=audio_file
-                    )
-            finally:
-                # Clean up temp file
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
+            transcript = client.audio.transcriptions.create(
+                model=model,
+                file=audio_file
+            )
                     
         logger.info(f"Transcription result: {transcript.text}")
         return transcript.text
@@ -7,15 +7,152 @@ import io
 import logging
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import httpx
 import replicate
-import requests
+
+from .cache import copy_file, get_media_cache, make_cache_key
+from .downloads import adownload_to_file, download_to_file, save_file_output
+from .replicate_client import get_replicate_client
 
 logger = logging.getLogger(__name__)
 
+# Copy downloads in 1 MiB blocks rather than many small chunks
+_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Durations (seconds) and aspect ratios VEO-2 accepts
+_VALID_DURATIONS = frozenset((5, 10, 15, 20))
+_VALID_ASPECT_RATIOS = frozenset(("16:9", "9:16", "1:1", "4:3", "3:4"))
+
+
+def _prepare_video(prompt, file_name, folder, duration, aspect_ratio, config, use_cache):
+    """
+    Validate a video request and check the media cache.
+
+    Shared by create_veo_video and create_veo_video_async. On a cache hit
+    the cached file has already been copied to the output path.
+
+    Args:
+        prompt: Text prompt for video generation
+        file_name: Name for the output file
+        folder: Folder path where to save the video
+        duration: Video duration in seconds (5, 10, 15, 20)
+        aspect_ratio: Video aspect ratio ("16:9", "9:16", "1:1", "4:3", "3:4")
+        config: Configuration object with replicate settings
+        use_cache: Check the media cache when config.cache_enabled is set
+
+    Returns:
+        dict: veo_config, model_name, output_dir, output_path, cache,
+            cache_key and cached (True when served from the cache)
+    """
+    # Get configuration - config IS already ai_manager
+    replicate_config = getattr(config, 'replicate', {}) if config else {}
+    
+    # Validate duration
+    if duration not in _VALID_DURATIONS:
+        logger.warning(f"Invalid duration {duration}, using 5 seconds")
+        duration = 5
+    
+    # Validate aspect ratio
+    if aspect_ratio not in _VALID_ASPECT_RATIOS:
+        logger.warning(f"Invalid aspect ratio {aspect_ratio}, using 16:9")
+        aspect_ratio = "16:9"
+    
+    # VEO-2 configuration
+    veo_config = {
+        "prompt": prompt,
+        "duration": duration,
+        "aspect_ratio": aspect_ratio
+    }
+    
+    # Get model name from config or use default
+    model_name = getattr(replicate_config, 'video_model', 'google/veo-2')
+    
+    output_dir = Path(folder)
+    request = {
+        'veo_config': veo_config,
+        'model_name': model_name,
+        'output_dir': output_dir,
+        'output_path': output_dir / f"{file_name}.mp4",
+        'cache': None,
+        'cache_key': None,
+        'cached': False
+    }
+    
+    # Identical requests are served from the media cache
+    cache = get_media_cache(config, 'video') if use_cache else None
+    if cache is not None:
+        request['cache'] = cache
+        request['cache_key'] = make_cache_key(kind='video', model=model_name, params=veo_config)
+        cached_path = cache.get(request['cache_key'], '.mp4')
+        if cached_path:
+            logger.info(f"Video cache hit, copying to: {request['output_path']}")
+            output_dir.mkdir(parents=True, exist_ok=True)
+            copy_file(cached_path, request['output_path'])
+            request['cached'] = True
+    
+    return request
+
+
+def _resolve_video_client(client, config):
+    """
+    Get the Replicate client for a video request.
+
+    Args:
+        client: Replicate client instance (optional)
+        config: Configuration object with replicate settings
+
+    Returns:
+        replicate.Client or None if no client can be created
+    """
+    if client:
+        return client
+    
+    if not config or not hasattr(config, 'replicate'):
+        logger.error("No replicate configuration available")
+        return None
+    
+    replicate_config = config.replicate
+    api_key = getattr(replicate_config, 'api_key', None)
+    
+    if not api_key:
+        logger.error("No Replicate API key found in configuration")
+        return None
+    
+    # One pooled client per API key, so warm connections survive across videos
+    return get_replicate_client(
+        api_key,
+        getattr(replicate_config, 'max_connections', 32),
+        getattr(replicate_config, 'max_keepalive_connections', 16)
+    )
+
+
+def _to_url_or_stream(output):
+    """
+    Normalize the output of a VEO run.
+
+    Replicate returns a FileOutput, a URL, or a list or iterator of either
+    depending on the client version; only the first item is the video.
+
+    Args:
+        output: Value returned by client.run
+
+    Returns:
+        tuple: ("stream", file-like), ("url", str) or (None, None) if the
+            output is not recognized
+    """
+    if not hasattr(output, 'read') and hasattr(output, '__iter__') and not isinstance(output, (str, bytes)):
+        output = next(iter(output), None)
+    if hasattr(output, 'read'):
+        return "stream", output
+    if isinstance(output, str) and output.startswith('http'):
+        return "url", output
+    return None, None
+
 
 def create_veo_video(prompt, file_name, folder, duration=5, aspect_ratio="16:9", 
-                     client=None, config=None, data_url=None):
+                     client=None, config=None, data_url=None, use_cache=True):
     """
     Create a video using Google VEO-2 via Replicate API.
     
@@ -28,6 +165,8 @@ def create_veo_video(prompt, file_name, folder, duration=5, aspect_ratio="16:9",
         client: Replicate client instance
         config: Configuration object with replicate settings
         data_url: Base URL for serving local files to Replicate
+        use_cache: Reuse a cached video for an identical request when
+            config.cache_enabled is set (default True)
         
     Returns:
         str: Path to saved video or None on failure
@@ -35,52 +174,23 @@ def create_veo_video(prompt, file_name, folder, duration=5, aspect_ratio="16:9",
     try:
         logger.info(f"Creating video with VEO-2: '{prompt[:50]}...'")
         
-        # Get configuration - config IS already ai_manager
-        replicate_config = getattr(config, 'replicate', {}) if config else {}
-        
-        # Get data URL from config if not provided
-        if not data_url and replicate_config:
-            data_url = getattr(replicate_config, 'data_url', None)
-        
-        # Validate duration
-        valid_durations = [5, 10, 15, 20]
-        if duration not in valid_durations:
-            logger.warning(f"Invalid duration {duration}, using 5 seconds")
-            duration = 5
-        
-        # Validate aspect ratio
-        valid_ratios = ["16:9", "9:16", "1:1", "4:3", "3:4"]
-        if aspect_ratio not in valid_ratios:
-            logger.warning(f"Invalid aspect ratio {aspect_ratio}, using 16:9")
-            aspect_ratio = "16:9"
-        
-        # VEO-2 configuration
-        veo_config = {
-            "prompt": prompt,
-            "duration": duration,
-            "aspect_ratio": aspect_ratio
-        }
-        
-        # Use provided client or create new one
+        request = _prepare_video(prompt, file_name, folder, duration, aspect_ratio, config, use_cache)
+        output_dir = request['output_dir']
+        output_path = request['output_path']
+        if request['cached']:
+            return str(output_path)
+        
+        client = _resolve_video_client(client, config)
         if not client:
-            if not config or not hasattr(config, 'replicate'):
-                logger.error("No replicate configuration available")
-                return None
-            
-            replicate_config = config.replicate
-            api_key = getattr(replicate_config, 'api_key', None)
-            
-            if not api_key:
-                logger.error("No Replicate API key found in configuration")
-                return None
-                
-            client = replicate.Client(api_token=api_key)
+            return None
         
-        # Get model name from config or use default
-        model_name = getattr(replicate_config, 'video_model', 'google/veo-2')
+        veo_config = request['veo_config']
+        model_name = request['model_name']
+        cache = request['cache']
+        cache_key = request['cache_key']
         
-        logger.debug(f"Running Replicate model: {model_name}")
-        logger.debug(f"VEO config: {veo_config}")
+        logger.debug("Running Replicate model: %s", model_name)
+        logger.debug("VEO config: %s", veo_config)
         
         # Run the model
         logger.debug("Calling Replicate API for video generation...")
@@ -95,65 +205,106 @@ def create_veo_video(prompt, file_name, folder, duration=5, aspect_ratio="16:9",
         logger.info(f"Video generation took {generation_time:.2f} seconds")
         
         # Log the output type for debugging
-        logger.debug(f"Replicate output type: {type(output)}")
-        logger.debug(f"Replicate output: {output}")
-        
-        # Handle different output types from Replicate
-        video_url = None
-        
-        # Check if output is a FileOutput object
-        if hasattr(output, 'read'):
-            logger.debug("Output has read method, reading directly")
-            video_data = output.read()
-        # Check if it's a generator or iterator
-        elif hasattr(output, '__iter__') and not isinstance(output, (str, bytes)):
-            logger.debug("Output is iterable, getting first item")
-            try:
-                # Get the first item from the iterator
-                first_item = next(iter(output))
-                logger.debug(f"First item type: {type(first_item)}, value: {first_item}")
-                
-                if isinstance(first_item, str) and first_item.startswith('http'):
-                    video_url = first_item
-                else:
-                    logger.error(f"Unknown item type in iterator: {type(first_item)}")
-                    return None
-            except StopIteration:
-                logger.error("Iterator was empty")
-                return None
-        elif isinstance(output, str) and output.startswith('http'):
-            video_url = output
-        elif isinstance(output, list) and len(output) > 0:
-            first_item = output[0]
-            if isinstance(first_item, str) and first_item.startswith('http'):
-                video_url = first_item
-        else:
+        logger.debug("Replicate output type: %s", type(output))
+        logger.debug("Replicate output: %s", output)
+        
+        kind, payload = _to_url_or_stream(output)
+        if kind is None:
             logger.error(f"Unexpected output type from Replicate: {type(output)}")
             return None
         
-        # Download video if we have a URL
-        if video_url:
-            logger.debug(f"Downloading video from URL: {video_url}")
-            response = requests.get(video_url, timeout=60, stream=True)
-            response.raise_for_status()
-            
-            # Create output directory
-            output_dir = Path(folder)
-            output_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Save video file
-            output_path = output_dir / f"{file_name}.mp4"
-            
+        output_dir.mkdir(parents=True, exist_ok=True)
+        if kind == "stream":
+            logger.debug("Output has read method, streaming to file")
+            save_file_output(payload, output_path, _DOWNLOAD_CHUNK_SIZE)
+        else:
+            logger.debug("Downloading video from URL: %s", payload)
+            # Save video file over the shared, pooled session; generous read
+            # timeout for large files, resuming if the transfer is interrupted
+            download_to_file(payload, output_path, timeout=(10, 300), chunk_size=_DOWNLOAD_CHUNK_SIZE)
+        
+        if cache_key:
+            cache.put(cache_key, output_path, output_path.suffix)
+        
+        logger.info(f"Successfully saved video: {output_path}")
+        return str(output_path)
+        
+    except replicate.exceptions.ReplicateError as e:
+        logger.error(f"Replicate API error: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Error generating video with VEO-2: {e}")
+        logger.exception("Full traceback:")
+        return None
+
+
+async def create_veo_video_async(prompt, file_name, folder, duration=5, aspect_ratio="16:9",
+                                 client=None, config=None, data_url=None, use_cache=True, http_client=None):
+    """
+    Async counterpart of create_veo_video.
+
+    The prediction runs through the client's async_run and the video is
+    streamed with httpx, so many videos can be gathered on one event loop
+    without a thread each.
+
+    Args:
+        prompt: Text prompt for video generation
+        file_name: Name for the output file
+        folder: Folder path where to save the video
+        duration: Video duration in seconds (5, 10, 15, 20)
+        aspect_ratio: Video aspect ratio ("16:9", "9:16", "1:1", "4:3", "3:4")
+        client: Replicate client instance
+        config: Configuration object with replicate settings
+        data_url: Base URL for serving local files to Replicate
+        use_cache: Reuse a cached video for an identical request when
+            config.cache_enabled is set (default True)
+        http_client: httpx.AsyncClient shared for downloads (optional)
+
+    Returns:
+        str: Path to saved video or None on failure
+    """
+    try:
+        logger.info(f"Creating video with VEO-2: '{prompt[:50]}...'")
+
+        request = _prepare_video(prompt, file_name, folder, duration, aspect_ratio, config, use_cache)
+        output_path = request['output_path']
+        if request['cached']:
+            return str(output_path)
+
+        client = _resolve_video_client(client, config)
+        if not client:
+            return None
+
+        start_time = time.time()
+        output = await client.async_run(
+            request['model_name'],
+            input=request['veo_config']
+        )
+        logger.info(f"Video generation took {time.time() - start_time:.2f} seconds")
+
+        if isinstance(output, (list, tuple)):
+            output = output[0] if output else None
+        # FileOutput carries its URL; download it over the pooled client
+        video_url = getattr(output, 'url', output)
+
+        request['output_dir'].mkdir(parents=True, exist_ok=True)
+        if isinstance(video_url, str) and video_url.startswith('http'):
+            await adownload_to_file(video_url, output_path, http_client,
+                                    timeout=httpx.Timeout(300, connect=10), chunk_size=_DOWNLOAD_CHUNK_SIZE)
+        elif hasattr(output, '__aiter__'):
             with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
+                async for chunk in output:
                     f.write(chunk)
-            
-            logger.info(f"Successfully saved video: {output_path}")
-            return str(output_path)
         else:
-            logger.error("No video URL received from Replicate")
+            logger.error(f"Unexpected output type from Replicate: {type(output)}")
             return None
-        
+
+        if request['cache_key']:
+            request['cache'].put(request['cache_key'], output_path, output_path.suffix)
+
+        logger.info(f"Successfully saved video: {output_path}")
+        return str(output_path)
+
     except replicate.exceptions.ReplicateError as e:
         logger.error(f"Replicate API error: {e}")
         return None
@@ -163,8 +314,62 @@ def create_veo_video(prompt, file_name, folder, duration=5, aspect_ratio="16:9",
         return None
 
 
+def create_veo_videos_batch(specs, folder, duration=5, aspect_ratio="16:9", client=None, config=None,
+                            data_url=None, max_workers=None, use_cache=True):
+    """
+    Generate several videos concurrently.
+
+    Each video spends most of its time waiting on Replicate and the
+    download, so running them in a thread pool overlaps those waits.
+
+    Args:
+        specs: List of (prompt, file_name) tuples
+        folder: Folder path where to save the videos
+        duration: Video duration in seconds for every video
+        aspect_ratio: Video aspect ratio for every video
+        client: Replicate client instance, shared by all threads
+        config: Configuration object with replicate settings
+        data_url: Base URL for serving local files to Replicate
+        max_workers: Maximum simultaneous generations (default
+            replicate.max_concurrency, or 4)
+        use_cache: Reuse cached videos for identical requests (default True)
+
+    Returns:
+        List of saved video paths (None for failures), in spec order
+    """
+    replicate_config = getattr(config, 'replicate', {}) if config else {}
+    if max_workers is None:
+        max_workers = getattr(replicate_config, 'max_concurrency', 4)
+    
+    # Create the client once rather than once per video
+    if not client and config:
+        client = init_replicate_client_for_video(config)
+        if not client:
+            return [None] * len(specs)
+    
+    logger.info(f"Generating {len(specs)} videos, up to {max_workers} at a time")
+    
+    def generate(spec):
+        prompt, file_name = spec
+        return create_veo_video(
+            prompt=prompt,
+            file_name=file_name,
+            folder=folder,
+            duration=duration,
+            aspect_ratio=aspect_ratio,
+            client=client,
+            config=config,
+            data_url=data_url,
+            use_cache=use_cache
+        )
+    
+    # map() keeps results in spec order
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(specs) or 1))) as executor:
+        return list(executor.map(generate, specs))
+
+
 def create_veo_video_from_image(image_path, prompt, file_name, folder, duration=5, 
-                               aspect_ratio="16:9", client=None, config=None, data_url=None):
+                               aspect_ratio="16:9", client=None, config=None, data_url=None, validate=True):
     """
     Create a video from an image using VEO-2 (if supported) or fallback to prompt-only.
     
@@ -181,27 +386,29 @@ def create_veo_video_from_image(image_path, prompt, file_name, folder, duration=
         client: Replicate client instance
         config: Configuration object
         data_url: Base URL for serving files
+        validate: Check that image_path exists (default True); batch callers
+            that already validated their inputs can skip the stat
         
     Returns:
         str: Path to saved video or None on failure
     """
-    logger.info(f"Creating video from image: {image_path}")
+    logger.info("Creating video from image: %s", image_path)
     
     # Check if image exists
-    if not os.path.exists(image_path):
+    if validate and not os.path.exists(image_path):
         logger.error(f"Image file not found: {image_path}")
         return None
     
     # Get data URL from config if not provided
     if not data_url and config:
-        replicate_config = getattr(config, 'replicate', {}) if config else {}
+        replicate_config = getattr(config, 'replicate', {})
         data_url = getattr(replicate_config, 'data_url', None)
     
     if data_url:
         # Construct URL for the image
-        image_filename = os.path.basename(image_path)
-        image_url = f"{data_url.rstrip('/')}/{image_filename}"
-        logger.info(f"Image URL would be: {image_url}")
+        if logger.isEnabledFor(logging.INFO):
+            image_url = f"{data_url.rstrip('/')}/{os.path.basename(image_path)}"
+            logger.info("Image URL would be: %s", image_url)
         
         # Note: VEO-2 currently doesn't support image inputs
         # This is prepared for future updates
@@ -235,14 +442,9 @@ def init_replicate_client_for_video(config):
             logger.error("No 'replicate' section in configuration")
             return None
             
-        replicate_config = config.replicate
-        api_key = getattr(replicate_config, 'api_key', None)
-        
-        if not api_key:
-            logger.error("No Replicate API key found in configuration")
+        client = _resolve_video_client(None, config)
+        if not client:
             return None
-            
-        client = replicate.Client(api_token=api_key)
         logger.info("Initialized Replicate client for video generation")
         return client
         